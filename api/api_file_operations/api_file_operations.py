@@ -18,7 +18,11 @@
 # permissions and limitations under the Licence.
 # 
 
+from typing import Any
+from typing import Dict
 from typing import Optional
+from typing import Tuple
+from typing import Type
 
 from fastapi import APIRouter
 from fastapi import Header
@@ -27,10 +31,13 @@ from logger import LoggerFactory
 
 from api.api_file_operations.copy_dispatcher import CopyDispatcher
 from api.api_file_operations.delete_dispatcher import DeleteDispatcher
+from api.api_file_operations.dispatcher import BaseDispatcher
 from models import file_ops_models as models
 from models.base_models import APIResponse
 from models.base_models import EAPIResponseCode
 from resources.error_handler import catch_internal
+from resources.idempotency import RequestClaim
+from resources.idempotency import RequestInProgressError
 
 router = APIRouter()
 
@@ -52,6 +59,8 @@ class FileOperations:
         authorization: Optional[str] = Header(None),
         refresh_token: Optional[str] = Header(None),
     ):
+        """Dispatch the file operation, submissions repeated with the same request_id return the original jobs."""
+
         token = {
             'at': authorization,
             'rt': refresh_token,
@@ -71,10 +80,55 @@ class FileOperations:
             api_response.error_msg = 'Invalid operation'
             return api_response.json_response()
 
-        code, result = await job_dispatcher().execute(self._logger, data, token)
+        claim = None
+        request_id = data.payload.request_id
+        if request_id:
+            claim = RequestClaim(data.operator, str(request_id))
+            try:
+                submitted = await claim.acquire()
+            except RequestInProgressError as e:
+                api_response.code = EAPIResponseCode.conflict
+                api_response.error_msg = str(e)
+                return api_response.json_response()
+            if submitted is not None:
+                self._logger.info(f'Returning jobs of the earlier submission of request {request_id}')
+                api_response.code = EAPIResponseCode.accepted
+                api_response.result = submitted
+                return api_response.json_response()
+
+        code, result = await self.dispatch(job_dispatcher, data, token, claim)
+
         api_response.code = code
         if not api_response.code == EAPIResponseCode.accepted:
             api_response.error_msg = 'Error occurred'
         api_response.result = result
 
         return api_response.json_response()
+
+    async def dispatch(
+        self,
+        job_dispatcher: Type[BaseDispatcher],
+        data: models.FileOperationsPOST,
+        token: Dict[str, Optional[str]],
+        claim: Optional[RequestClaim],
+    ) -> Tuple[EAPIResponseCode, Any]:
+        """Execute the dispatcher and store the result of the accepted request in the claim.
+
+        The claim is released when the request is not accepted or the dispatch fails.
+        """
+
+        try:
+            code, result = await job_dispatcher().execute(self._logger, data, token)
+        except BaseException:
+            # the claim is released on the client disconnect too, which cancels the request
+            if claim:
+                await claim.release()
+            raise
+
+        if claim:
+            if code == EAPIResponseCode.accepted:
+                await claim.store(result)
+            else:
+                await claim.release()
+
+        return code, result
@@ -18,21 +18,22 @@
 # permissions and limitations under the Licence.
 # 
 
+import json
+
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
 
+from api.api_file_operations.validation_copy import copy_validation
 from api.api_file_operations.validation_copy import repeated_check
-from api.api_file_operations.validations import validate_operation
+from api.api_file_operations.validation_engine import FileOperationValidator
+from api.api_file_operations.validation_engine import InvalidTargetError
 from api.api_file_operations.validations import validate_project
-from config import ConfigClass
 from models import file_ops_models as models
 from models.base_models import APIResponse
 from models.base_models import EAPIResponseCode
 from resources.error_handler import catch_internal
-from resources.helpers import get_files_recursive
-from resources.helpers import get_resource_bygeid
-from resources.helpers import location_decoder
 from resources.redis import SrvAioRedisSingleton
 
 router = APIRouter()
@@ -63,125 +64,68 @@ class FileOperationsValidate:
 
     @router.post('/', summary='File operations api, validate file operation job')
     @catch_internal('api_file_operations_validate')
-    async def post(self, data: models.FileOperationsValidatePOST):
+    async def post(self, data: models.FileOperationsValidatePOST, stream: bool = False):
         """flatten targets => find unique_path(ingestion path)
 
         => find destination_path(copy only) => validate operation => validate repeated => return results
+
+        With stream=true results are returned as newline delimited JSON in the order they are validated.
+        Copy has to plan the destination names of all entries first, so its results are buffered before
+        streaming. The response status is sent before validation finishes, so the stream always ends with
+        a terminal record: {"status": "complete"} on success or {"status": "error", "error": "..."} on failure.
         """
         api_response = APIResponse()
         srv_redis = SrvAioRedisSingleton()
-        files_validation = []
-        to_validate_files = []
-        to_validate = []
-        '''
-        {
-            'geid': optional,
-            'full_path': ingestion_path
-        }
-        '''
+        validator = FileOperationValidator(data.operation, srv_redis)
         try:
             # validate project
             project_validation_code, validation_result = await validate_project(data.project_geid)
             if project_validation_code != EAPIResponseCode.success:
-                return project_validation_code, validation_result
+                api_response.code = project_validation_code
+                api_response.error_msg = validation_result
+                return api_response.json_response()
             project_info = validation_result
             targets = data.payload['targets']
             dest = data.payload.get('destination', None)
             # init validation
-            for target in targets:
-                if target.get('geid'):
-                    source = await get_resource_bygeid(target['geid'])
-                    if not source:
-                        raise Exception('Not found resource: ' + target['geid'])
-                    target['resource_type'] = get_resource_type(source['labels'])
-                    source['resource_type'] = target['resource_type']
-                    if not target['resource_type'] in ['File', 'Folder']:
-                        api_response.error_msg = '[Fatal]Invalid target, target must be Folder or File: ' + str(target)
-                        api_response.code = EAPIResponseCode.bad_request
-                        return api_response
-                    target['zone'] = get_zone(source['labels'])
-                    source['zone'] = target['zone']
-                    target['name'] = source['name']
-                    if source['resource_type'] == 'File':
-                        source['rename'] = target.get('rename')
-                        to_validate_files.append(source)
-                else:
-                    to_validate.append({'full_path': target['full_path']})
-            # flatten folders
-            for target in targets:
-                if target.get('resource_type') == 'Folder':
-                    child_files = await get_files_recursive(target['geid'], [])
-                    for source in child_files:
-                        source['resource_type'] = 'File'
-                        source['zone'] = get_zone(source['labels'])
-                        source['target_folder_geid'] = target['geid']
-                        source['source_folder_rename'] = target['rename'] if target.get('rename') else target['name']
-                        to_validate_files.append(source)
-            # generate validate objects
-            to_validate += [
-                {
-                    'geid': node.get('target_folder_geid')
-                    if 'target_folder_geid' in node
-                    else node.get('global_entity_id'),
-                    'full_path': get_ingestion_path(node),
-                    'entity_geid': node.get('global_entity_id'),
-                    'location': node.get('location'),
-                    'source_folder': node.get('target_folder_geid'),
-                    'source_folder_rename': node.get('source_folder_rename'),
-                    'copy_name': node['rename'] if node.get('rename') else node['name'],
-                }
-                for node in to_validate_files
-            ]
-            # # copy validation temporary disabled
-            # if data.operation == 'copy':
-            #     api_response.code = EAPIResponseCode.success
-            #     api_response.result = await copy_validation(project_info['code'],
-            #         to_validate, dest, data.operation, srv_redis)
-            #     return api_response
+            try:
+                to_validate, folders = await validator.resolve_targets(targets)
+            except InvalidTargetError as e:
+                api_response.error_msg = str(e)
+                api_response.code = EAPIResponseCode.bad_request
+                return api_response.json_response()
+            if data.operation == 'copy':
+                to_validate = await validator.get_all_entries(to_validate, folders)
+                api_response.result = await copy_validation(project_info['code'],
+                                                            to_validate, dest, data.operation, srv_redis)
+                if stream:
+                    return StreamingResponse(self.stream_results(api_response.result),
+                                             media_type='application/x-ndjson')
+                return api_response.json_response()
+            if stream:
+                return StreamingResponse(self.stream_validations(validator, to_validate, folders),
+                                         media_type='application/x-ndjson')
             # validate operation lock
-            for target in to_validate:
-                current_file_action = await srv_redis.file_get_status(target['full_path'])
-                is_valid = validate_operation(data.operation, current_file_action)
-                validation = {
-                    'is_valid': is_valid,
-                    'geid': target.get('geid', None),
-                    'full_path': target['full_path'],
-                    'current_file_action': current_file_action,
-                }
-                files_validation.append(validation)
-                if not is_valid:
-                    validation['error'] = 'operation-block'
-                files_validation.sort(key=lambda v: v['is_valid'])
-            api_response.result = files_validation
+            api_response.result = await validator.validate(to_validate, folders)
         except Exception as e:
             self._logger.info('Error in getting current action: ' + str(e))
             api_response.code = EAPIResponseCode.internal_error
             api_response.result = 'Error in getting current action: ' + str(e)
-            return api_response
-        return api_response
-
-
-def get_resource_type(labels: list):
-    """Get resource type by neo4j labels."""
-
-    resources = ['File', 'TrashFile', 'Folder', 'Container']
-    for label in labels:
-        if label in resources:
-            return label
-    return None
-
-
-def get_zone(labels: list):
-    """Get zone by neo4j labels."""
-
-    zones = [ConfigClass.GREEN_ZONE_LABEL, ConfigClass.CORE_ZONE_LABEL]
-    for label in labels:
-        if label in zones:
-            return label
-    return None
+            return api_response.json_response()
+        return api_response.json_response()
 
+    async def stream_results(self, validations):
+        for validation in validations:
+            yield json.dumps(validation) + '\n'
+        yield json.dumps({'status': 'complete'}) + '\n'
 
-def get_ingestion_path(source: dict):
-    location = source['location']
-    ingestion_type, ingestion_host, ingestion_path = location_decoder(location)
-    return ingestion_path
+    async def stream_validations(self, validator, to_validate, folders):
+        try:
+            async for batch in validator.iter_validations(to_validate, folders):
+                for validation in batch:
+                    yield json.dumps(validation) + '\n'
+        except Exception as e:
+            self._logger.info('Error in getting current action: ' + str(e))
+            yield json.dumps({'status': 'error', 'error': 'Error in getting current action: ' + str(e)}) + '\n'
+            return
+        yield json.dumps({'status': 'complete'}) + '\n'
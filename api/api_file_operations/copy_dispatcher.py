@@ -18,20 +18,18 @@
 # permissions and limitations under the Licence.
 # 
 
-import os
 import time
 from typing import Any
 from typing import Dict
 from typing import List
 from typing import Tuple
 from typing import Union
-import httpx
 from api.api_file_operations.dispatcher import BaseDispatcher
-from api.api_file_operations.validations import validate_project
+from api.api_file_operations.dispatcher import NodeList
+from api.api_file_operations.dispatcher import PreflightError
 from config import ConfigClass
 from models import file_ops_models as models
 from models.base_models import EAPIResponseCode
-from resources.helpers import fetch_geid
 from resources.redis_project_session_job import SessionJob
 
 
@@ -43,42 +41,35 @@ class CopyDispatcher(BaseDispatcher):
     ) -> Tuple[EAPIResponseCode, Union[str, List[Dict[str, Any]]]]:
         """Execute copy logic."""
 
-        project_validation_code, validation_result = await validate_project(data.project_geid)
-        if project_validation_code != EAPIResponseCode.success:
-            return project_validation_code, validation_result
-        project_info = validation_result
-
-        if not await self.is_valid_folder_node(data.payload.source):
-            return EAPIResponseCode.bad_request, f'Invalid source: {data.payload.source}'
-
-        if not await self.is_valid_folder_node(data.payload.destination):
-            return EAPIResponseCode.bad_request, f'Invalid destination: {data.payload.destination}'
-
         try:
-            targets = await self.validate_targets(data.payload.targets)
-        except ValueError as e:
-            return EAPIResponseCode.bad_request, str(e)
-
-        job_geid = fetch_geid()
-        session_job = SessionJob(
-            data.session_id, project_info['code'], 'data_transfer', data.operator, task_id=data.task_id
-        )
-
-        try:
-            await session_job.set_job_id(job_geid)
+            project_info, targets = await self.preflight(
+                data.project_geid,
+                {'source': data.payload.source, 'destination': data.payload.destination},
+                data.payload.targets,
+            )
+        except PreflightError as e:
+            return e.code, e.message
+
+        def create_job(nodes: NodeList) -> SessionJob:
+            session_job = SessionJob(
+                data.session_id, project_info['code'], 'data_transfer', data.operator, task_id=data.task_id
+            )
             session_job.set_progress(0)
-            session_job.set_source(', '.join(targets.names))
+            session_job.set_source(', '.join(nodes.names))
             session_job.set_status(models.EActionState.RUNNING.name)
             session_job.add_payload('source', data.payload.source)
             session_job.add_payload('destination', data.payload.destination)
-            session_job.add_payload('targets', list(targets.geids))
-            payload = {
+            session_job.add_payload('targets', [node.geid for node in nodes])
+            return session_job
+
+        def get_message(job_id: str, nodes: NodeList) -> Dict[str, Any]:
+            return {
                 'event_type': 'folder_copy',
                 'payload': {
                     'session_id': data.session_id,
-                    'job_id': job_geid,
+                    'job_id': job_id,
                     'source_geid': data.payload.source,
-                    'include_geids': list(targets.geids),
+                    'include_geids': [node.geid for node in nodes],
                     'project': project_info['code'],
                     'request_id': str(data.payload.request_id or ''),
                     'generic': True,
@@ -88,18 +79,9 @@ class CopyDispatcher(BaseDispatcher):
                 },
                 'create_timestamp': time.time(),
             }
-            _logger.info('Sending Message To Queue: ' + str(payload))
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url=ConfigClass.SEND_MESSAGE_URL, json=payload)
-            _logger.info(f'Message To Queue has been sent: {response.text}')
-            await session_job.save()
-        except Exception as e:
-            exception_message = str(e)
-            session_job.set_status(models.EActionState.TERMINATED.name)
-            session_job.add_payload('error', exception_message)
-            await session_job.save()
 
-        return EAPIResponseCode.accepted, [session_job.to_dict()]
+        jobs = await self.submit_jobs(_logger, targets, create_job, get_message)
+        return EAPIResponseCode.accepted, jobs
 
 
 def get_resource_type(labels: list) -> str:
@@ -120,20 +102,3 @@ def get_zone(labels: list) -> str:
         if label in zones:
             return label
     return None
-
-
-def get_output_payload(file_node, destination=None, ouput_relative_path=''):
-    ingestion_type = file_node['ingestion_type']
-    ingestion_path = file_node['ingestion_path']
-    if ingestion_type == 'minio':
-        splits_ingestion = ingestion_path.split('/', 1)
-        source_object_name = splits_ingestion[1]
-        path, source_name = os.path.split(source_object_name)
-        if destination and destination['resource_type'] == 'Folder':
-            path = os.path.join(destination['folder_relative_path'], destination['name'])
-        copied_name = file_node['rename'] if file_node.get('rename') else source_name
-        output_path = os.path.join(path, ouput_relative_path, copied_name)
-        root_folder = path.split('/')[0]
-        if not destination:
-            output_path = os.path.join(root_folder, ouput_relative_path, copied_name)
-        return source_object_name, output_path
@@ -0,0 +1,102 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+import os
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from resources.helpers import get_resource_type
+from resources.helpers import iter_folder_levels
+from resources.helpers import location_decoder
+
+
+class CopyPathPlanner:
+    """Compute input and output paths of files copied into the destination.
+
+    Every source folder subtree is fetched once, level by level, and relative paths of its files are built from
+    the folder names collected on the way, so no per-file ancestry lookups are needed.
+    """
+
+    def __init__(self, destination: Optional[Dict[str, Any]] = None) -> None:
+        self.destination = destination
+
+    async def get_folder_files(self, folder_geid: str, output_folder_name: str) -> List[Dict[str, Any]]:
+        """Return all files under the folder with their paths relative to the source and output folder."""
+
+        relative_paths = {folder_geid: ''}
+        files = []
+        async for parent_geid, children in iter_folder_levels(folder_geid):
+            parent_path = relative_paths[parent_geid]
+            for node in children:
+                if 'File' in node['labels']:
+                    node['path_relative_to_source_path'] = parent_path
+                    node['ouput_relative_path'] = os.path.join(output_folder_name, parent_path)
+                    files.append(node)
+                else:
+                    relative_paths[node['global_entity_id']] = os.path.join(parent_path, node['name'])
+        return files
+
+    async def get_folders_files(self, folders: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Return files of every source folder, folders are traversed concurrently."""
+
+        return list(
+            await asyncio.gather(
+                *[
+                    self.get_folder_files(folder['global_entity_id'], folder.get('rename', folder['name']))
+                    for folder in folders
+                ]
+            )
+        )
+
+    def get_output_path(self, file_node: Dict[str, Any], ouput_relative_path: str = '') -> Tuple[str, str]:
+        """Return input object path and output path of the file."""
+
+        ingestion_type, ingestion_host, ingestion_path = location_decoder(file_node['location'])
+        if ingestion_type != 'minio':
+            return None, None
+
+        source_object_name = ingestion_path.split('/', 1)[1]
+        path, source_name = os.path.split(source_object_name)
+        if self.destination and self.destination['resource_type'] == 'Folder':
+            path = os.path.join(self.destination['folder_relative_path'], self.destination['name'])
+        copied_name = file_node['rename'] if file_node.get('rename') else source_name
+        output_path = os.path.join(path, ouput_relative_path, copied_name)
+        if not self.destination:
+            root_folder = path.split('/')[0]
+            output_path = os.path.join(root_folder, ouput_relative_path, copied_name)
+        return source_object_name, output_path
+
+    def plan_file(self, file_node: Dict[str, Any]) -> Dict[str, Any]:
+        """Annotate the file node with its ingestion attributes, input path and output path."""
+
+        file_node['resource_type'] = get_resource_type(file_node['labels'])
+        ingestion_type, ingestion_host, ingestion_path = location_decoder(file_node['location'])
+        file_node['ingestion_type'] = ingestion_type
+        file_node['ingestion_host'] = ingestion_host
+        file_node['ingestion_path'] = ingestion_path
+        input_path, output_path = self.get_output_path(file_node, file_node.get('ouput_relative_path', ''))
+        file_node['input_path'] = input_path
+        file_node['output_path'] = output_path
+        return file_node
@@ -18,16 +18,33 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
 from enum import Enum
 from enum import unique
 from typing import Any
+from typing import Callable
 from typing import Dict
 from typing import List
+from typing import Optional
 from typing import Set
+from typing import Tuple
 
+from api.api_file_operations.validations import validate_project
+from config import ConfigClass
+from models.base_models import EAPIResponseCode
+from models.file_ops_models import EActionState
 from models.file_ops_models import FileOperationTarget
+from resources.helpers import allocate_geid
 from resources.helpers import get_resource_bygeid
 from resources.helpers import get_resource_type
+from resources.helpers import get_resources_bygeids
+from resources.node_cache import bypass_node_cache
+from resources.outbox import queue_outbox_relay
+from resources.redis_project_session_job import SessionJob
+
+
+# number of target names listed in the source of the parent job
+PARENT_SOURCE_NAMES = 3
 
 
 @unique
@@ -76,11 +93,67 @@ class NodeList(list):
         return self._get_by_resource_type(ResourceType.FILE)
 
 
+def get_parent_source(targets: NodeList) -> str:
+    """Return the source of the parent job, the first target names followed by the number of remaining targets.
+
+    Job source is a part of the job key and of the file index, so it has to stay short for any number of targets.
+    """
+
+    names = targets.names[:PARENT_SOURCE_NAMES]
+    return '{} and {} more'.format(', '.join(names), len(targets) - len(names))
+
+
+class PreflightError(Exception):
+    """Raised when a pre-flight check of the file operation fails."""
+
+    def __init__(self, code: EAPIResponseCode, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
 class BaseDispatcher:
     """Base class for all dispatcher implementations."""
 
+    async def preflight(
+        self, project_geid: str, folders: Dict[str, str], targets: List[FileOperationTarget]
+    ) -> Tuple[Dict[str, Any], NodeList]:
+        """Validate the project, folder nodes and targets concurrently and return project info with targets.
+
+        Folders map the name used in the error message to the folder geid. When several checks fail, the
+        failure is reported for the first of them in order project, folders, targets.
+        """
+
+        folder_items = list(folders.items())
+        project_result, *folder_results, targets_result = await asyncio.gather(
+            validate_project(project_geid),
+            *[self.is_valid_folder_node(geid) for _, geid in folder_items],
+            self.validate_targets(targets),
+            return_exceptions=True,
+        )
+
+        if isinstance(project_result, BaseException):
+            raise project_result
+        project_validation_code, project_info = project_result
+        if project_validation_code != EAPIResponseCode.success:
+            raise PreflightError(project_validation_code, project_info)
+
+        for (name, geid), is_valid in zip(folder_items, folder_results):
+            if isinstance(is_valid, BaseException):
+                raise is_valid
+            if not is_valid:
+                raise PreflightError(EAPIResponseCode.bad_request, f'Invalid {name}: {geid}')
+
+        if isinstance(targets_result, ValueError):
+            raise PreflightError(EAPIResponseCode.bad_request, str(targets_result))
+        if isinstance(targets_result, BaseException):
+            raise targets_result
+
+        return project_info, targets_result
+
     async def is_valid_folder_node(self, geid: str) -> bool:
-        node = await get_resource_bygeid(geid)
+        with bypass_node_cache():
+            node = await get_resource_bygeid(geid)
 
         if node:
             resource_type = get_resource_type(node['labels'])
@@ -91,9 +164,10 @@ class BaseDispatcher:
 
     async def validate_targets(self, targets: List[FileOperationTarget]) -> NodeList:
         fetched = []
+        nodes, missing = await get_resources_bygeids([target.geid for target in targets])
 
         for target in targets:
-            source = await get_resource_bygeid(target.geid)
+            source = nodes.get(target.geid)
             if not source:
                 raise ValueError(f'Not found resource: {target.geid}')
             if source['archived'] is True:
@@ -105,5 +179,72 @@ class BaseDispatcher:
 
         return NodeList(fetched)
 
+    def split_targets(self, targets: NodeList) -> List[NodeList]:
+        """Split targets into shards of FILE_OPERATION_SHARD_SIZE nodes."""
+
+        size = ConfigClass.FILE_OPERATION_SHARD_SIZE
+        return [NodeList(targets[start : start + size]) for start in range(0, len(targets), size)]
+
+    async def submit_jobs(
+        self,
+        _logger,
+        targets: NodeList,
+        create_job: Callable[[NodeList], SessionJob],
+        get_message: Callable[[str, NodeList], Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """Create session jobs for the targets and add their queue messages to the outbox.
+
+        Targets that don't fit into one shard are split, every shard gets its own sub-job and message. The parent job
+        lists its sub-jobs and follows their aggregated status and progress. Return the created jobs, the parent first.
+        """
+
+        shards = self.split_targets(targets)
+        if len(shards) == 1:
+            return [await self.submit_job(_logger, create_job(targets), targets, get_message)]
+
+        parent_job = create_job(targets)
+        parent_job.set_source(get_parent_source(targets))
+        parent_job.payload.pop('targets', None)
+        sub_job_ids = [await allocate_geid() for _ in shards]
+        parent_job.add_payload('sub_jobs', sub_job_ids)
+        await parent_job.set_job_id(await allocate_geid(), check=False)
+        await parent_job.save()
+
+        sub_jobs = await asyncio.gather(
+            *[
+                self.submit_job(_logger, create_job(shard), shard, get_message, job_id, parent_job.job_id)
+                for job_id, shard in zip(sub_job_ids, shards)
+            ]
+        )
+        return [parent_job.to_dict(), *sub_jobs]
+
+    async def submit_job(
+        self,
+        _logger,
+        session_job: SessionJob,
+        targets: NodeList,
+        get_message: Callable[[str, NodeList], Dict[str, Any]],
+        job_id: Optional[str] = None,
+        parent_job_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Save the session job together with its queue message, the job is terminated if that fails."""
+
+        if job_id is None:
+            job_id = await allocate_geid()
+        if parent_job_id:
+            session_job.add_payload('parent_job_id', parent_job_id)
+
+        try:
+            await session_job.set_job_id(job_id, check=False)
+            await session_job.save(message=get_message(job_id, targets))
+            queue_outbox_relay.notify()
+            _logger.info(f'Message To Queue has been added to the outbox for job {job_id}')
+        except Exception as e:
+            session_job.set_status(EActionState.TERMINATED.name)
+            session_job.add_payload('error', str(e))
+            await session_job.save()
+
+        return session_job.to_dict()
+
     def execute(self, *args, **kwds):
         raise NotImplementedError
@@ -18,117 +18,119 @@
 # permissions and limitations under the Licence.
 # 
 
-import asyncio
 import os
 
-from api.api_file_operations.validations import validate_file_repeated
-from api.api_file_operations.validations import validate_folder_repeated
+from api.api_file_operations.copy_path_planner import CopyPathPlanner
+from api.api_file_operations.validations import find_repeated_files
+from api.api_file_operations.validations import find_repeated_folders
 from api.api_file_operations.validations import validate_operation
 from api.api_file_operations.validations import validate_project
 from models import file_ops_models as models
 from models.base_models import EAPIResponseCode
-from resources.helpers import get_connected_nodes
 from resources.helpers import get_resource_bygeid
+from resources.helpers import get_resources_bygeids
 from resources.helpers import location_decoder
 from config import ConfigClass
 
 
 async def copy_validation(project_code, to_validate, destination_geid, operation, srv_redis):
-    validations = []
-    # validate operation lock
-    await asyncio.wait([copy_thread(destination_geid, project_code, node,
-                                    operation, srv_redis, validations) for node in to_validate])
+    """Validate copy of the entries into the destination.
+
+    The destination is fetched once, destination conflicts and current actions of all source and destination
+    files are looked up in batches. Return a validation record for every source and its destination file.
+    """
+    destination_prefix = await get_copy_destination_prefix(project_code, destination_geid)
+    validations, dest_validations = get_copy_validations(to_validate, destination_prefix)
+
+    # check copy destination repeated
+    found_files = await find_repeated_files(
+        ConfigClass.CORE_ZONE_LABEL, project_code, [dest_location for _, dest_location in dest_validations])
+    for dest_validation, dest_location in dest_validations:
+        found = found_files.get(dest_location)
+        if found:
+            dest_validation['error'] = 'entity-exist'
+            dest_validation['is_valid'] = False
+            dest_validation['found'] = found['global_entity_id']
+            dest_validation['found_name'] = found['name']
+
+    # validate operation lock of all source and destination files at once
+    current_actions = await srv_redis.file_get_status_many(
+        [validation['full_path'] for validation in validations])
+    for validation in validations:
+        current_file_action = current_actions[validation['full_path']]
+        validation['current_file_action'] = current_file_action
+        if not validate_operation(operation, current_file_action):
+            validation['is_valid'] = False
+            validation.setdefault('error', 'operation-block')
     validations.sort(key=lambda v: v['is_valid'])
     return validations
 
 
-async def copy_thread(destination_geid, project_code, node,
-                      operation, srv_redis, validations):
-    location = node['location']
-    ingestion_type, ingestion_host, ingestion_path = location_decoder(
-        location)
-    # get destination
-    destination = None
-    if destination_geid:
-        destination_folder = await get_resource_bygeid(destination_geid)
-        if not destination_folder:
-            raise Exception('Not found resource: ' + destination_geid)
-        destination_folder['resource_type'] = get_resource_type(
-            destination_folder['labels'])
-        if not destination_folder['resource_type'] in ['Folder', 'Container']:
-            raise Exception(
-                'Invalid destination, must be a folder or project.')
-        if destination_folder['resource_type'] == 'Folder':
-            destination = destination_folder
-    # generate meta info for destination
-    bucket_name = 'core-{}'.format(project_code)
-    destination_prefix = os.path.join(bucket_name, destination['folder_relative_path'], destination['name'])
-    destination_file_node = {
-        'full_path': '',
-        'geid': node['geid']
-    }
-    # get relative path to source folder
+async def get_copy_destination_prefix(project_code, destination_geid):
+    """Return the path the entries are copied into.
+
+    Copy goes into the project root when the destination is not a folder. Raise exception if the destination node
+    doesn't exist or is neither a folder nor a project.
+    """
+
+    destination_prefix = 'core-{}'.format(project_code)
+    if not destination_geid:
+        return destination_prefix
+    destination_folder = await get_resource_bygeid(destination_geid)
+    if not destination_folder:
+        raise Exception('Not found resource: ' + destination_geid)
+    destination_folder['resource_type'] = get_resource_type(
+        destination_folder['labels'])
+    if not destination_folder['resource_type'] in ['Folder', 'Container']:
+        raise Exception(
+            'Invalid destination, must be a folder or project.')
+    if destination_folder['resource_type'] == 'Folder':
+        destination_prefix = os.path.join(
+            destination_prefix, destination_folder['folder_relative_path'], destination_folder['name'])
+    return destination_prefix
+
+
+def get_copy_validations(to_validate, destination_prefix):
+    """Return validation records of the sources and their destination files.
+
+    Destination records are returned once more along with their locations, so conflicts are looked up for them.
+    """
+
+    validations = []
+    dest_validations = []
+    for node in to_validate:
+        validations.append({
+            "is_valid": True,
+            "geid": node.get('geid'),
+            "full_path": node['full_path'],
+            "current_file_action": None
+        })
+        # targets given by path only have no node to copy
+        if not node.get('location'):
+            continue
+        dest_validation = {
+            "is_valid": True,
+            "geid": node['geid'],
+            "full_path": get_copy_destination_path(destination_prefix, node),
+            "current_file_action": None
+        }
+        validations.append(dest_validation)
+        ingestion_type, ingestion_host, ingestion_path = location_decoder(node['location'])
+        dest_location = "{}://{}/{}".format(ingestion_type, ingestion_host, dest_validation['full_path'])
+        dest_validations.append((dest_validation, dest_location))
+    return validations, dest_validations
+
+
+def get_copy_destination_path(destination_prefix, node):
+    """Return full path of the copied file inside the destination."""
+
     source_folder = node.get('source_folder')
     if source_folder:
-        input_nodes = await get_connected_nodes(
-            node["entity_geid"], "input")
-        input_nodes = [
-            node for node in input_nodes if 'Folder' in node['labels']]
-        input_nodes.sort(key=lambda f: f['folder_level'])
-        found_source_node = [
-            input_node for input_node in input_nodes if input_node['global_entity_id'] == source_folder][0]
-        path_relative_to_source_path = ''
-        source_index = input_nodes.index(found_source_node)
-        folder_name_list = [node['name']
-                            for node in input_nodes[source_index + 1:]]
-        path_relative_to_source_path = os.sep.join(folder_name_list)
-        output_folder_name = node.get('source_folder_rename')
-        node['path_relative_to_source_path'] = path_relative_to_source_path
+        # path relative to the source folder is resolved by CopyPathPlanner while flattening folders
         node['ouput_relative_path'] = os.path.join(
-            output_folder_name, path_relative_to_source_path)
-        destination_file_node['full_path'] = os.path.join(
-            destination_prefix, node['ouput_relative_path'], node['copy_name'])
-    else:
-        destination_file_node['full_path'] = os.path.join(
-            destination_prefix, node['copy_name'])
-    # check target file
-    current_file_action = await srv_redis.file_get_status(
-        node['full_path'])
-    is_valid = validate_operation(
-        operation, current_file_action)
-    validation = {
-        "is_valid": is_valid,
-        "geid": node['geid'],
-        "full_path": node['full_path'],
-        "current_file_action": current_file_action
-    }
-    validations.append(validation)
-    if not is_valid:
-        validation['error'] = 'operation-block'
-
-    # check destination file
-    dest_file_action = await srv_redis.file_get_status(
-        destination_file_node['full_path'])
-    is_valid = validate_operation(
-        operation, dest_file_action)
-    dest_validation = {
-        "is_valid": is_valid,
-        "geid": destination_file_node['geid'],
-        "full_path": destination_file_node['full_path'],
-        "current_file_action": dest_file_action
-    }
-    validations.append(dest_validation)
-    if not is_valid:
-        dest_validation['error'] = 'operation-block'
-    # check copy destination repeated
-    dest_location = "{}://{}/{}".format(ingestion_type, ingestion_host, destination_file_node['full_path'])
-    is_valid, found = await validate_file_repeated(
-        ConfigClass.CORE_ZONE_LABEL, project_code, dest_location)
-    if not is_valid:
-        dest_validation['error'] = 'entity-exist'
-        dest_validation['is_valid'] = is_valid
-        dest_validation['found'] = found['global_entity_id']
-        dest_validation['found_name'] = found['name']
+            node.get('source_folder_rename'), node['path_relative_to_source_path'])
+        return os.path.join(destination_prefix, node['ouput_relative_path'], node['copy_name'])
+    return os.path.join(destination_prefix, node['copy_name'])
 
 
 async def repeated_check(_logger, data: models.FileOperationsPOST):
@@ -165,9 +167,10 @@ async def repeated_check(_logger, data: models.FileOperationsPOST):
     async def validate_targets(targets: list):
         fetched = []
         try:
+            nodes, missing = await get_resources_bygeids([target['geid'] for target in targets])
             for target in targets:
                 # get source file
-                source = await get_resource_bygeid(target['geid'])
+                source = nodes.get(target['geid'])
                 if not source:
                     raise Exception('Not found resource: ' + target['geid'])
                 if target.get("rename"):
@@ -187,84 +190,60 @@ async def repeated_check(_logger, data: models.FileOperationsPOST):
 
     sources = validation_result
 
+    planner = CopyPathPlanner(node_destination)
     flattened_sources = [
         node for node in sources if node['resource_type'] == "File"]
     # flatten sources
-    for source in sources:
-        # append path and attrs
-        if source["resource_type"] == "Folder":
-            nodes_child = await get_connected_nodes(
-                source['global_entity_id'], "output")
-            nodes_child_files = [
-                node for node in nodes_child if "File" in node["labels"]]
-
-            # check folder repeated
-            target_folder_relative_path = ""
-            if node_destination and node_destination['resource_type'] == 'Folder':
-                target_folder_relative_path = os.path.join(
-                    node_destination['folder_relative_path'], node_destination['name'])
-            output_folder_name = source.get('rename', source['name'])
-            is_valid, found = await validate_folder_repeated(
-                ConfigClass.CORE_ZONE_LABEL, project_code, target_folder_relative_path, output_folder_name)
-            if not is_valid:
-                repeated_path = os.path.join(target_folder_relative_path, output_folder_name)
-                repeated.append({
-                    'error': 'entity-exist',
-                    'is_valid': is_valid,
-                    "geid": source['global_entity_id'],
-                    'found': found['global_entity_id'],
-                    'found_name': repeated_path
-                })
-
-            # add other attributes
-            for node in nodes_child_files:
-                node['parent_folder'] = source
-                input_nodes = await get_connected_nodes(
-                    node["global_entity_id"], "input")
-                input_nodes = [
-                    node for node in input_nodes if 'Folder' in node['labels']]
-                input_nodes.sort(key=lambda f: f['folder_level'])
-                found_source_node = [
-                    node for node in input_nodes if node['global_entity_id'] == source['global_entity_id']][0]
-                path_relative_to_source_path = ''
-                source_index = input_nodes.index(found_source_node)
-                folder_name_list = [node['name']
-                                    for node in input_nodes[source_index + 1:]]
-                path_relative_to_source_path = os.sep.join(folder_name_list)
-                node['path_relative_to_source_path'] = path_relative_to_source_path
-                node['ouput_relative_path'] = os.path.join(
-                    output_folder_name, path_relative_to_source_path)
-            flattened_sources += nodes_child_files
+    source_folders = [
+        node for node in sources if node['resource_type'] == "Folder"]
+    folders_files = await planner.get_folders_files(source_folders)
+    # check folders repeated
+    target_folder_relative_path = ""
+    if node_destination and node_destination['resource_type'] == 'Folder':
+        target_folder_relative_path = os.path.join(
+            node_destination['folder_relative_path'], node_destination['name'])
+    found_folders = await find_repeated_folders(
+        ConfigClass.CORE_ZONE_LABEL, project_code, target_folder_relative_path,
+        [source.get('rename', source['name']) for source in source_folders])
+    for source, nodes_child_files in zip(source_folders, folders_files):
+        output_folder_name = source.get('rename', source['name'])
+        found = found_folders.get(output_folder_name)
+        if found:
+            repeated_path = os.path.join(target_folder_relative_path, output_folder_name)
+            repeated.append({
+                'error': 'entity-exist',
+                'is_valid': False,
+                "geid": source['global_entity_id'],
+                'found': found['global_entity_id'],
+                'found_name': repeated_path
+            })
+
+        # add other attributes
+        for node in nodes_child_files:
+            node['parent_folder'] = source
+        flattened_sources += nodes_child_files
 
     # update input output path
+    to_validate_repeat = []
     for source in flattened_sources:
-        source['resource_type'] = get_resource_type(source['labels'])
-        location = source['location']
-        ingestion_type, ingestion_host, ingestion_path = location_decoder(
-            location)
-        source['ingestion_type'] = ingestion_type
-        source['ingestion_host'] = ingestion_host
-        source['ingestion_path'] = ingestion_path
-        ouput_relative_path = source.get('ouput_relative_path', '')
-        input_path, output_path = get_output_payload(
-            source, node_destination, ouput_relative_path=ouput_relative_path)
-        source['input_path'] = input_path
-        source['output_path'] = output_path
-        # validate repeated
+        planner.plan_file(source)
         if source['global_entity_id'] in to_validate_repeat_geids:
-            host = "{}://{}".format(ingestion_type, ingestion_host)
+            host = "{}://{}".format(source['ingestion_type'], source['ingestion_host'])
             bucket = "core-" + project_info["code"] + "/"
-            dest_location = os.path.join(host, bucket + source['output_path'])
-            is_valid, found = await validate_file_repeated(
-                ConfigClass.CORE_ZONE_LABEL, project_code, dest_location)
-            if not is_valid:
-                repeated.append({
-                    'error': 'entity-exist',
-                    'is_valid': is_valid,
-                    "geid": source['global_entity_id'],
-                    'found': found['global_entity_id'],
-                    'found_name': source['output_path']
-                })
+            to_validate_repeat.append((source, os.path.join(host, bucket + source['output_path'])))
+    # validate repeated
+    found_files = await find_repeated_files(
+        ConfigClass.CORE_ZONE_LABEL, project_code, [dest_location for _, dest_location in to_validate_repeat])
+    for source, dest_location in to_validate_repeat:
+        found = found_files.get(dest_location)
+        if found:
+            repeated.append({
+                'error': 'entity-exist',
+                'is_valid': False,
+                "geid": source['global_entity_id'],
+                'found': found['global_entity_id'],
+                'found_name': source['output_path']
+            })
     if len(repeated) > 0:
         return EAPIResponseCode.conflict, repeated
 
@@ -280,29 +259,3 @@ def get_resource_type(labels: list):
         if label in resources:
             return label
     return None
-
-
-def get_output_payload(file_node, destination=None, ouput_relative_path=''):
-    '''
-    return inputpath, outputpath
-    '''
-    location = file_node['location']
-    splits_loaction = location.split("://")
-    ingestion_type = file_node['ingestion_type']
-    ingestion_host = file_node['ingestion_host']
-    ingestion_path = file_node['ingestion_path']
-    if ingestion_type == "minio":
-        splits_ingestion = ingestion_path.split("/", 1)
-        source_bucket_name = splits_ingestion[0]
-        source_object_name = splits_ingestion[1]
-        path, source_name = os.path.split(source_object_name)
-        if destination and destination['resource_type'] == 'Folder':
-            path = os.path.join(
-                destination['folder_relative_path'], destination['name'])
-        copied_name = file_node['rename'] if file_node.get(
-            'rename') else source_name
-        output_path = os.path.join(path, ouput_relative_path, copied_name)
-        root_folder = path.split('/')[0]
-        if not destination:
-            output_path = os.path.join(root_folder, ouput_relative_path, copied_name)
-        return source_object_name, output_path
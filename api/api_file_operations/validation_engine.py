@@ -0,0 +1,190 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from api.api_file_operations.copy_path_planner import CopyPathPlanner
+from api.api_file_operations.validations import validate_operation
+from config import ConfigClass
+from resources.helpers import get_resource_type
+from resources.helpers import get_resources_bygeids
+from resources.helpers import location_decoder
+from resources.redis import FILE_STATUS_BATCH_SIZE
+from resources.redis import SrvAioRedisSingleton
+
+
+class InvalidTargetError(Exception):
+    """Raised when a target of the file operation is neither a file nor a folder."""
+
+
+def get_zone(labels: list):
+    """Get zone by neo4j labels."""
+
+    zones = [ConfigClass.GREEN_ZONE_LABEL, ConfigClass.CORE_ZONE_LABEL]
+    for label in labels:
+        if label in zones:
+            return label
+    return None
+
+
+def get_ingestion_path(source: dict):
+    location = source['location']
+    ingestion_type, ingestion_host, ingestion_path = location_decoder(location)
+    return ingestion_path
+
+
+def get_validate_object(node: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the entry to validate for the file node."""
+
+    return {
+        'geid': node.get('target_folder_geid') if 'target_folder_geid' in node else node.get('global_entity_id'),
+        'full_path': get_ingestion_path(node),
+        'entity_geid': node.get('global_entity_id'),
+        'location': node.get('location'),
+        'source_folder': node.get('target_folder_geid'),
+        'source_folder_rename': node.get('source_folder_rename'),
+        'path_relative_to_source_path': node.get('path_relative_to_source_path'),
+        'copy_name': node['rename'] if node.get('rename') else node['name'],
+    }
+
+
+class FileOperationValidator:
+    """Validate that a file operation can be performed on the targets.
+
+    Validation runs in stages: targets are resolved in one batched lookup, folders are flattened concurrently,
+    at most FILE_VALIDATION_CONCURRENCY at a time, and current file actions are checked in batches of
+    FILE_STATUS_BATCH_SIZE paths. Results are produced batch by batch, so they can be streamed to the client.
+    """
+
+    def __init__(self, operation: str, srv_redis: SrvAioRedisSingleton) -> None:
+        self.operation = operation
+        self.srv_redis = srv_redis
+
+    async def resolve_targets(self, targets: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Return entries to validate for the file and path targets, and the folder targets to flatten."""
+
+        to_validate_files = []
+        to_validate = []
+        folders = []
+        nodes, missing = await get_resources_bygeids([target['geid'] for target in targets if target.get('geid')])
+        for target in targets:
+            if not target.get('geid'):
+                to_validate.append({'full_path': target['full_path']})
+                continue
+
+            source = nodes.get(target['geid'])
+            if not source:
+                raise Exception('Not found resource: ' + target['geid'])
+            target['resource_type'] = get_resource_type(source['labels'])
+            source['resource_type'] = target['resource_type']
+            if not target['resource_type'] in ['File', 'Folder']:
+                raise InvalidTargetError('[Fatal]Invalid target, target must be Folder or File: ' + str(target))
+            target['zone'] = get_zone(source['labels'])
+            source['zone'] = target['zone']
+            target['name'] = source['name']
+            if source['resource_type'] == 'File':
+                source['rename'] = target.get('rename')
+                to_validate_files.append(source)
+            else:
+                folders.append(target)
+
+        return to_validate + [get_validate_object(node) for node in to_validate_files], folders
+
+    async def iter_folder_files(self, folders: List[Dict[str, Any]]) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield files of every folder target as soon as the folder is flattened."""
+
+        planner = CopyPathPlanner()
+        semaphore = asyncio.Semaphore(ConfigClass.FILE_VALIDATION_CONCURRENCY)
+
+        async def flatten(target: Dict[str, Any]) -> List[Dict[str, Any]]:
+            output_folder_name = target['rename'] if target.get('rename') else target['name']
+            async with semaphore:
+                child_files = await planner.get_folder_files(target['geid'], output_folder_name)
+            for source in child_files:
+                source['resource_type'] = 'File'
+                source['zone'] = get_zone(source['labels'])
+                source['target_folder_geid'] = target['geid']
+                source['source_folder_rename'] = output_folder_name
+            return child_files
+
+        tasks = [asyncio.ensure_future(flatten(target)) for target in folders]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def check_actions(self, to_validate: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return validation results of the entries against the current file actions."""
+
+        current_actions = await self.srv_redis.file_get_status_many([target['full_path'] for target in to_validate])
+        files_validation = []
+        for target in to_validate:
+            current_file_action = current_actions[target['full_path']]
+            is_valid = validate_operation(self.operation, current_file_action)
+            validation = {
+                'is_valid': is_valid,
+                'geid': target.get('geid', None),
+                'full_path': target['full_path'],
+                'current_file_action': current_file_action,
+            }
+            if not is_valid:
+                validation['error'] = 'operation-block'
+            files_validation.append(validation)
+        return files_validation
+
+    async def iter_validations(
+        self, to_validate: List[Dict[str, Any]], folders: List[Dict[str, Any]]
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield validation results batch by batch, folder files follow in the order folders are flattened."""
+
+        for start in range(0, len(to_validate), FILE_STATUS_BATCH_SIZE):
+            yield await self.check_actions(to_validate[start : start + FILE_STATUS_BATCH_SIZE])
+
+        async for child_files in self.iter_folder_files(folders):
+            for start in range(0, len(child_files), FILE_STATUS_BATCH_SIZE):
+                batch = child_files[start : start + FILE_STATUS_BATCH_SIZE]
+                yield await self.check_actions([get_validate_object(node) for node in batch])
+
+    async def get_all_entries(
+        self, to_validate: List[Dict[str, Any]], folders: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Return entries to validate together with entries for all files of the folder targets."""
+
+        entries = list(to_validate)
+        async for child_files in self.iter_folder_files(folders):
+            entries += [get_validate_object(node) for node in child_files]
+        return entries
+
+    async def validate(self, to_validate: List[Dict[str, Any]], folders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return all validation results, blocked entries first."""
+
+        files_validation = []
+        async for batch in self.iter_validations(to_validate, folders):
+            files_validation += batch
+        files_validation.sort(key=lambda v: v['is_valid'])
+        return files_validation
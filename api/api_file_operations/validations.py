@@ -20,26 +20,28 @@
 
 from typing import Any
 from typing import Dict
+from typing import List
 from typing import Optional
 from typing import Tuple
 from config import ConfigClass
+from dependencies import DownstreamService
+from dependencies import http_clients
 from models.base_models import EAPIResponseCode
-from resources.helpers import http_query_node
-import httpx
+from resources.helpers import query_nodes_in
+from resources.project_cache import ProjectLookupError
+from resources.project_cache import project_cache
 
 async def validate_project(project_geid):
     '''
     validate project info, return tulpe(response_code, errormessage/project_info)
     '''
     # validate project
-    project_res = await http_query_node(
-        "Container", {"global_entity_id": project_geid})
-    if project_res.status_code != 200:
-        return EAPIResponseCode.internal_error, "Query node error: " + str(project_res.text)
-    project_found = project_res.json()
-    if len(project_found) == 0:
+    try:
+        project_info = await project_cache.get_by_geid(project_geid)
+    except ProjectLookupError as e:
+        return EAPIResponseCode.internal_error, "Query node error: " + str(e)
+    if project_info is None:
         return EAPIResponseCode.bad_request, "Invalid project_geid, Project not found: " + project_geid
-    project_info = project_found[0]
     return EAPIResponseCode.success, project_info
 
 
@@ -81,8 +83,8 @@ async def validate_file_repeated(zone, project_code, location) -> Tuple[bool, Op
         }
     }
     url = ConfigClass.NEO4J_SERVICE_V2 + "nodes/query"
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload)
+    client = http_clients.get(DownstreamService.NEO4J)
+    response = await client.post(url, json=payload)
     if response.status_code == 200:
         result = response.json()['result']
         if len(result) > 0:
@@ -108,10 +110,41 @@ async def validate_folder_repeated(zone, project_code, folder_relative_path, nam
         }
     }
     url = ConfigClass.NEO4J_SERVICE_V2 + "nodes/query"
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload)
+    client = http_clients.get(DownstreamService.NEO4J)
+    response = await client.post(url, json=payload)
     if response.status_code == 200:
         result = response.json()['result']
         if len(result) > 0:
             return False, result[0]
     return True, None
+
+
+async def find_repeated_files(zone, project_code, locations: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Return map of location to the file already existing at this location, for all taken locations."""
+
+    query = {
+        "project_code": project_code,
+        "labels": [zone, 'File'],
+        "archived": False,
+    }
+    found = {}
+    for node in await query_nodes_in('location', locations, query):
+        found.setdefault(node['location'], node)
+    return found
+
+
+async def find_repeated_folders(
+    zone, project_code, folder_relative_path, names: List[str]
+) -> Dict[str, Dict[str, Any]]:
+    """Return map of name to the folder already existing under this relative path, for all taken names."""
+
+    query = {
+        "project_code": project_code,
+        "folder_relative_path": folder_relative_path,
+        "labels": [zone, 'Folder'],
+        "archived": False,
+    }
+    found = {}
+    for node in await query_nodes_in('name', names, query):
+        found.setdefault(node['name'], node)
+    return found
@@ -18,18 +18,21 @@
 # permissions and limitations under the Licence.
 # 
 
-import httpx
 from fastapi import APIRouter
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
 
 from config import ConfigClass
+from dependencies import DownstreamService
+from dependencies import http_clients
 from models import filemeta_models as models
 from models.base_models import EAPIResponseCode
 from resources.cataloguing_manager import CataLoguingManager
 from resources.error_handler import catch_internal
-from resources.helpers import fetch_geid
-from fastapi.concurrency import run_in_threadpool
+from resources.helpers import allocate_geid
+from resources.node_cache import node_cache
+from resources.project_cache import ProjectLookupError
+from resources.project_cache import project_cache
 
 router = APIRouter()
 
@@ -49,7 +52,7 @@ class FiledataMeta:
         # fetch global entity id
         geid = ''
         try:
-            geid = await run_in_threadpool(fetch_geid)
+            geid = await allocate_geid()
         except Exception as e:
             self._logger.error(str(e))
             api_response.result = {'Error when fetching geid'}
@@ -89,33 +92,25 @@ class FiledataMeta:
             json_data["original_geid"] = parent_query["original_geid"]
         self._logger.info(f"Create file data:{json_data}")
         # Get dataset id
-        dataset_data = {
-            "code": data.project_code,
-        }
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                ConfigClass.NEO4J_SERVICE + "nodes/Container/query",
-                json=dataset_data,
-                timeout=None
-            )
-        if response.status_code != 200:
-            error_msg = "Get dataset id:" + str(response.__dict__)
+        try:
+            dataset = await project_cache.get_by_code(data.project_code)
+        except ProjectLookupError as e:
+            error_msg = "Get dataset id:" + str(e)
             self._logger.error(error_msg)
             api_response.error_msg = error_msg
             api_response.code = EAPIResponseCode.internal_error
             return api_response.json_response()
-        json_data["project_id"] = response.json()[0]["id"]
+        json_data["project_id"] = dataset["id"]
 
         self._logger.info("Create the in atlas")
 
         # Create the file entity
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                ConfigClass.ENTITYINFO_SERVICE + "files/",
-                json=json_data,
-                timeout=None
-            )
+        client = http_clients.get(DownstreamService.ENTITYINFO)
+        response = await client.post(
+            ConfigClass.ENTITYINFO_SERVICE + "files/",
+            json=json_data,
+            timeout=None
+        )
         if response.status_code != 200:
             error_msg = "Create the file entity error:" + str(response.__dict__)
             self._logger.error(error_msg)
@@ -123,6 +118,7 @@ class FiledataMeta:
             api_response.code = EAPIResponseCode.internal_error
             return api_response.json_response()
         node = response.json()['result']
+        await node_cache.invalidate([geid])
         self._logger.info(guid)
         self._logger.info(data.parent_query)
 
@@ -136,12 +132,12 @@ class FiledataMeta:
             if data.parent_query.get("global_entity_id"):
                 parent_query_post_form["global_entity_id"] = data.parent_query.get("global_entity_id")
             # Get parent file
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    ConfigClass.NEO4J_SERVICE+"nodes/File/query",
-                    json=parent_query_post_form,
-                    timeout=None
-                )
+            client = http_clients.get(DownstreamService.NEO4J)
+            response = await client.post(
+                ConfigClass.NEO4J_SERVICE+"nodes/File/query",
+                json=parent_query_post_form,
+                timeout=None
+            )
             self._logger.info(response.json())
             input_file_id = response.json()[0]["id"]
 
@@ -153,12 +149,12 @@ class FiledataMeta:
             }
             pipeline_name = data.process_pipeline
             self._logger.info(relation_data)
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    ConfigClass.NEO4J_SERVICE+f"relations/{data.process_pipeline}",
-                    json=relation_data,
-                    timeout=None
-                )
+            client = http_clients.get(DownstreamService.NEO4J)
+            response = await client.post(
+                ConfigClass.NEO4J_SERVICE+f"relations/{data.process_pipeline}",
+                json=relation_data,
+                timeout=None
+            )
             self._logger.info(response.json())
 
         api_response.result = node
@@ -0,0 +1,37 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+from fastapi import APIRouter
+from fastapi_utils.cbv import cbv
+
+from models.base_models import APIResponse
+from resources.node_cache import node_cache
+
+router = APIRouter()
+
+
+@cbv(router)
+class NodeCacheStats:
+    @router.get('/stats', summary='Get hit and miss counters of the node cache in this process')
+    async def get(self):
+        api_response = APIResponse()
+        api_response.result = node_cache.get_stats()
+        return api_response.json_response()
@@ -20,15 +20,19 @@
 
 """Batch tag operation API refactored to update tags using batch update in neo4j."""
 
-import httpx
 from fastapi import APIRouter
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
 from config import ConfigClass
+from dependencies import DownstreamService
+from dependencies import http_clients
 from models.base_models import APIResponse
 from models.base_models import EAPIResponseCode
 from models.tags_models import BatchOpsTagsPOST
 from resources.helpers import get_resource_bygeid
+from resources.helpers import get_resources_bygeids
+from resources.node_cache import bypass_node_cache
+from resources.node_cache import node_cache
 from resources.utils import get_resource_type
 from resources.utils import update_elastic_search_entity
 from resources.utils import validate_taglist
@@ -66,8 +70,11 @@ class BatchOpsTagsAPI:
             _res.code = EAPIResponseCode.bad_request
             return _res.json_response()
         try:
+            entities, missing = await get_resources_bygeids(entity_geid_list)
             for entity_geid in entity_geid_list:
-                entity_details = await get_resource_bygeid(entity_geid)
+                entity_details = entities.get(entity_geid)
+                if not entity_details:
+                    raise Exception('Not found resource: ' + entity_geid)
                 entity_type = get_resource_type(entity_details['labels'])
                 if only_files and entity_type == 'Folder':
                     only_files_res, batch_update_list = await update_only_files(entity_geid, data_tags, operation)
@@ -77,7 +84,7 @@ class BatchOpsTagsAPI:
                 else:
                     _logger.info(f'updating current entity :{entity_geid}')
                     current_entity_res, batch_update = await update_tag_list_based_on_operation(
-                        entity_geid=entity_geid, tags=data_tags, operation=operation
+                        entity_geid=entity_geid, tags=data_tags, operation=operation, entity_details=entity_details
                     )
                     if current_entity_res:
                         final_response.append(current_entity_res)
@@ -123,15 +130,18 @@ async def http_query_batch_update_neo4j(batch_update_list):
     _logger.info('Update tags for the given entity')
     node_property = 'tags'
     payload = {'data': batch_update_list}
-    async with httpx.AsyncClient() as client:
-        res = await client.put(ConfigClass.NEO4J_SERVICE + f'nodes/{node_property}/batch/update', json=payload)
+    client = http_clients.get(DownstreamService.NEO4J)
+    res = await client.put(ConfigClass.NEO4J_SERVICE + f'nodes/{node_property}/batch/update', json=payload)
+    await node_cache.invalidate([item['global_entity_id'] for item in batch_update_list])
     return res
 
 
-async def update_tag_list_based_on_operation(operation, entity_geid, tags):
+async def update_tag_list_based_on_operation(operation, entity_geid, tags, entity_details=None):
     current_entity_res = {}
     batch_update = []
-    entity_details = await get_resource_bygeid(entity_geid)
+    if entity_details is None:
+        with bypass_node_cache():
+            entity_details = await get_resource_bygeid(entity_geid)
     if not entity_details:
         return None, None
     entity_type = get_resource_type(entity_details['labels'])
@@ -182,14 +192,18 @@ async def update_tags_nested_entity(geid, tags, operation):
     _res = APIResponse()
     batch_update_tags = []
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(ConfigClass.NEO4J_SERVICE + f'relations/connected/{geid}?direction=output')
+        client = http_clients.get(DownstreamService.NEO4J)
+        response = await client.get(ConfigClass.NEO4J_SERVICE + f'relations/connected/{geid}?direction=output')
         api_res = []
         if not len(response.json()['result']) == 0:
             data = response.json()['result']
+            children, missing = await get_resources_bygeids([child['global_entity_id'] for child in data])
             for child in data:
+                entity_details = children.get(child['global_entity_id'])
+                if not entity_details:
+                    continue
                 api_res_entity, batch_update_child = await update_tag_list_based_on_operation(
-                    operation=operation, entity_geid=child['global_entity_id'], tags=tags
+                    operation=operation, entity_geid=child['global_entity_id'], tags=tags, entity_details=entity_details
                 )
                 if api_res_entity:
                     api_res.append(api_res_entity)
@@ -211,21 +225,22 @@ async def update_tags_nested_entity(geid, tags, operation):
 
 async def update_only_files(entity_geid, data_tags, operation):
     _logger.info(f'Updating only files under given entity : {entity_geid}')
-    async with httpx.AsyncClient() as client:
-        response = await client.get(ConfigClass.NEO4J_SERVICE + f'relations/connected/{entity_geid}?direction=output')
+    client = http_clients.get(DownstreamService.NEO4J)
+    response = await client.get(ConfigClass.NEO4J_SERVICE + f'relations/connected/{entity_geid}?direction=output')
     api_res = []
     batch_update_list = []
     if not len(response.json()['result']) == 0:
         data = response.json()['result']
+        children, missing = await get_resources_bygeids([child['global_entity_id'] for child in data])
         for child in data:
             child_geid = child['global_entity_id']
-            entity_details = await get_resource_bygeid(child_geid)
+            entity_details = children.get(child_geid)
             if not entity_details:
                 continue
             entity_type = get_resource_type(entity_details['labels'])
             if entity_type == 'File':
-                api_res_entity, batch_update = update_tag_list_based_on_operation(
-                    entity_geid=child_geid, tags=data_tags, operation=operation
+                api_res_entity, batch_update = await update_tag_list_based_on_operation(
+                    entity_geid=child_geid, tags=data_tags, operation=operation, entity_details=entity_details
                 )
                 if batch_update is not None:
                     batch_update_list += batch_update
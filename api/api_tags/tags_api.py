@@ -18,11 +18,12 @@
 # permissions and limitations under the Licence.
 # 
 
-import httpx
 from fastapi import APIRouter
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
 from config import ConfigClass
+from dependencies import DownstreamService
+from dependencies import http_clients
 from models.base_models import APIResponse
 from models.base_models import EAPIResponseCode
 from models.tags_models import SysTagsAPIPOST
@@ -30,6 +31,8 @@ from models.tags_models import TagsAPIPOST
 from resources.error_handler import catch_internal
 from resources.helpers import get_resource_bygeid
 from resources.helpers import http_query_node
+from resources.node_cache import bypass_node_cache
+from resources.node_cache import node_cache
 from resources.utils import get_resource_type
 from resources.utils import update_elastic_search_entity
 from resources.utils import validate_taglist
@@ -70,10 +73,10 @@ class TagsAPI:
         try:
             # overwrite tags list of current folder
             self._logger.info('Fetch tags and entity_id from neo4j')
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    ConfigClass.NEO4J_SERVICE + f'nodes/{entity_type}/query', json={'global_entity_id': entity_geid}
-                )
+            client = http_clients.get(DownstreamService.NEO4J)
+            response = await client.post(
+                ConfigClass.NEO4J_SERVICE + f'nodes/{entity_type}/query', json={'global_entity_id': entity_geid}
+            )
             if len(response.json()) == 0:
                 self._logger.info(f'{entity_type} does not exist')
                 _res.code = EAPIResponseCode.not_found
@@ -118,7 +121,7 @@ class SysTagsAPI:
             return _res.json_response()
 
         # Fetch entity from neo4j
-        response = await http_query_node(entity_type, entity_geid)
+        response = await http_query_node(entity_type, {'global_entity_id': entity_geid})
         if not response.json():
             self._logger.error(f'{entity_type} not found')
             _res.code = EAPIResponseCode.not_found
@@ -126,10 +129,10 @@ class SysTagsAPI:
             return _res.json_response()
 
         # append new tags to list of tags of current entity
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                ConfigClass.NEO4J_SERVICE + f'nodes/{entity_type}/query', json={'global_entity_id': entity_geid}
-            )
+        client = http_clients.get(DownstreamService.NEO4J)
+        response = await client.post(
+            ConfigClass.NEO4J_SERVICE + f'nodes/{entity_type}/query', json={'global_entity_id': entity_geid}
+        )
 
         entity_details = response.json()[0]
         try:
@@ -156,14 +159,14 @@ class SysTagsAPI:
 async def http_neo4j_update_tags(entity, entity_id, tags_list, tag_type):
     _logger.info('Update tags for the given entity')
     payload = {tag_type: tags_list}
-    async with httpx.AsyncClient() as client:
-        res = await client.put(ConfigClass.NEO4J_SERVICE + f'nodes/{entity}/node/{entity_id}', json=payload)
+    client = http_clients.get(DownstreamService.NEO4J)
+    res = await client.put(ConfigClass.NEO4J_SERVICE + f'nodes/{entity}/node/{entity_id}', json=payload)
     return res.json()
 
 
 async def update_tags_nested_entity(geid, tags, tag_type):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(ConfigClass.NEO4J_SERVICE + f'relations/connected/{geid}?direction=output')
+    client = http_clients.get(DownstreamService.NEO4J)
+    response = await client.get(ConfigClass.NEO4J_SERVICE + f'relations/connected/{geid}?direction=output')
     api_res = []
     if not len(response.json()['result']) == 0:
         data = response.json()['result']
@@ -185,7 +188,9 @@ async def update_tags_nested_entity(geid, tags, tag_type):
 
 async def update_tags(entity_geid, tags_list, tag_type):
     final_res = []
-    entity_details = await get_resource_bygeid(entity_geid)
+    # tags are written back from this read, a cached node could drop concurrent changes
+    with bypass_node_cache():
+        entity_details = await get_resource_bygeid(entity_geid)
     entity_type = get_resource_type(entity_details['labels'])
     entity_id = entity_details['id']
     try:
@@ -211,6 +216,7 @@ async def update_tags(entity_geid, tags_list, tag_type):
         _logger.info(f'Updating tag list for entity {entity_geid}')
         # tags_list = [tag for tag in entity_tags if tag not in tags]
         neo4j_res = await http_neo4j_update_tags(entity_type, entity_id=entity_id, tags_list=updated_tags, tag_type=tag_type)
+        await node_cache.invalidate([entity_geid])
         current_entity_res = {
             'name': entity_details['name'],
             'geid': entity_details['global_entity_id'],
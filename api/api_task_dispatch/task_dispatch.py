@@ -18,7 +18,11 @@
 # permissions and limitations under the Licence.
 # 
 
+import json
+from typing import Optional
+
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
 
@@ -27,7 +31,11 @@ from models.base_models import APIResponse
 from models.base_models import EAPIResponseCode
 from resources.error_handler import catch_internal
 from resources.redis_project_session_job import session_job_delete_status
+from resources.redis_project_session_job import session_job_export
+from resources.redis_project_session_job import session_job_get_changes
 from resources.redis_project_session_job import session_job_get_status
+from resources.redis_project_session_job import session_job_load_payload
+from resources.redis_project_session_job import session_task_get_progress
 from resources.redis_project_session_job import SessionJob
 
 router = APIRouter()
@@ -64,8 +72,38 @@ class TaskDispatcher:
 
     @router.get('/', summary="Asynchronized Task Management API, Get task information")
     @catch_internal('api_task_dispatch')
-    async def get(self, session_id, label="Container", job_id="*", code="*", action="*", operator="*"):
+    async def get(
+        self,
+        session_id,
+        label="Container",
+        job_id="*",
+        code="*",
+        action="*",
+        operator="*",
+        since: Optional[str] = None,
+        include_payload: bool = False,
+    ):
+        """Return session jobs.
+
+        When since cursor is provided, only jobs changed after the cursor are returned together with the new cursor.
+        Use "0-0" as the initial cursor. Large payload fields are returned only when include_payload is set.
+        """
+
         api_response = APIResponse()
+        if since is not None:
+            try:
+                changes = await session_job_get_changes(session_id, since, label, job_id, code, action, operator)
+            except ValueError:
+                api_response.code = EAPIResponseCode.bad_request
+                api_response.error_msg = f'Invalid cursor: {since}'
+                return api_response.json_response()
+            changes['updated'].sort(key=lambda x: x.get("update_timestamp", 0), reverse=True)
+            if include_payload:
+                await session_job_load_payload(changes['updated'])
+            api_response.code = EAPIResponseCode.success
+            api_response.result = changes
+            return api_response.json_response()
+
         fetched = await session_job_get_status(
             session_id,
             label,
@@ -80,12 +118,48 @@ class TaskDispatcher:
             return x.get("update_timestamp", 0)
 
         fetched.sort(key=get_update_time, reverse=True)
+        if include_payload:
+            await session_job_load_payload(fetched)
 
         api_response.code = EAPIResponseCode.success
         api_response.result = fetched
 
         return api_response.json_response()
 
+    @router.get('/export', summary="Asynchronized Task Management API, Export jobs as newline delimited JSON")
+    @catch_internal('api_task_dispatch')
+    async def export(
+        self,
+        session_id: str = "*",
+        label: str = "Container",
+        code: str = "*",
+        action: str = "*",
+        operator: str = "*",
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+        include_payload: bool = False,
+    ):
+        """Stream jobs of all sessions or of the project, optionally limited by update time range."""
+
+        jobs = session_job_export(
+            session_id, label, code, action, operator, start_timestamp, end_timestamp, include_payload
+        )
+
+        async def generate_lines():
+            async for job in jobs:
+                yield json.dumps(job) + '\n'
+
+        return StreamingResponse(generate_lines(), media_type='application/x-ndjson')
+
+    @router.get('/{task_id}/progress', response_model=models.TaskProgressGETResponse,
+                summary="Asynchronized Task Management API, Get aggregated progress of the task jobs")
+    @catch_internal('api_task_dispatch')
+    async def get_progress(self, task_id: str, session_id: str):
+        api_response = APIResponse()
+        api_response.code = EAPIResponseCode.success
+        api_response.result = await session_task_get_progress(session_id, task_id)
+        return api_response.json_response()
+
     @router.delete('/', summary="Asynchronized Task Management API, Delete tasks")
     @catch_internal('api_task_dispatch')
     async def delete(self, data: models.TaskDispatchDELETE):
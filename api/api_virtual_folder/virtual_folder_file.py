@@ -18,12 +18,16 @@
 # permissions and limitations under the Licence.
 # 
 
-import httpx
 from fastapi import APIRouter
 from fastapi_utils.cbv import cbv
 from config import ConfigClass
+from dependencies import DownstreamService
+from dependencies import http_clients
 from models import virtual_folder_models as models
 from models.base_models import EAPIResponseCode
+from resources.node_cache import node_cache
+from resources.project_cache import ProjectLookupError
+from resources.project_cache import project_cache
 
 router = APIRouter()
 
@@ -38,8 +42,8 @@ class VirtualFolderFile:
 
         url = ConfigClass.NEO4J_SERVICE + f'nodes/VirtualFolder/query'
         payload = {'global_entity_id': collection_geid}
-        async with httpx.AsyncClient() as client:
-            result = await client.post(url, json=payload)
+        client = http_clients.get(DownstreamService.NEO4J)
+        result = await client.post(url, json=payload)
         if result.status_code != 200:
             api_response.error_msg = 'update vfolder in neo4j Error: ' + str(result.json())
             api_response.code = EAPIResponseCode.internal_error
@@ -48,12 +52,13 @@ class VirtualFolderFile:
         vfolder_id = vfolder_node['id']
 
         url = ConfigClass.NEO4J_SERVICE + f'nodes/VirtualFolder/node/{vfolder_id}'
-        async with httpx.AsyncClient() as client:
-            result = await client.delete(url)
+        client = http_clients.get(DownstreamService.NEO4J)
+        result = await client.delete(url)
         if result.status_code != 200:
             api_response.code = EAPIResponseCode.internal_error
             api_response.error_msg = 'VirtualFolderFileDELETEResponse Error: ' + result.json()
             return api_response.json_response()
+        await node_cache.invalidate([collection_geid])
         api_response.result = 'success'
         return api_response.json_response()
 
@@ -72,8 +77,8 @@ class FileBulk:
         payload = {
             'global_entity_id': collection_geid,
         }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload)
+        client = http_clients.get(DownstreamService.NEO4J)
+        response = await client.post(url, json=payload)
         if response.status_code != 200:
             api_response.code = response.status_code
             api_response.error_msg = response.json()
@@ -82,20 +87,17 @@ class FileBulk:
 
         # Get folders dataset
         container_id = vfolder['container_id']
-        url = ConfigClass.NEO4J_SERVICE + f'nodes/Container/node/{container_id}'
-        async with httpx.AsyncClient() as client:
-            result = await client.get(url)
-        if result.status_code != 200:
+        try:
+            dataset = await project_cache.get_by_id(container_id)
+        except ProjectLookupError as e:
             api_response.code = EAPIResponseCode.internal_error
-            api_response.error_msg = 'Get folders dataset Error: ' + result.json()
+            api_response.error_msg = 'Get folders dataset Error: ' + str(e)
             return api_response.json_response()
-        if len(result.json()) < 1:
+        if dataset is None:
             api_response.code = EAPIResponseCode.not_found
             api_response.error_msg = 'Project not found'
             return api_response.json_response()
 
-        dataset = result.json()[0]
-
         duplicate = False
         for geid in file_geids:
             # Duplicate check
@@ -117,8 +119,8 @@ class FileBulk:
                     },
                 },
             }
-            async with httpx.AsyncClient() as client:
-                result = await client.post(url, json=payload)
+            client = http_clients.get(DownstreamService.NEO4J)
+            result = await client.post(url, json=payload)
             if result.status_code != 200:
                 api_response.code = EAPIResponseCode.internal_error
                 api_response.error_msg = 'Duplicate check Error: ' + result.json()
@@ -132,13 +134,12 @@ class FileBulk:
             payload = {
                 'global_entity_id': geid,
             }
+            client = http_clients.get(DownstreamService.NEO4J)
             try:
-                async with httpx.AsyncClient() as client:
-                    result = await client.post(ConfigClass.NEO4J_SERVICE + f'nodes/File/query', json=payload)
+                result = await client.post(ConfigClass.NEO4J_SERVICE + f'nodes/File/query', json=payload)
                 result = result.json()[0]
             except Exception:
-                async with httpx.AsyncClient() as client:
-                    result = await client.post(ConfigClass.NEO4J_SERVICE + f'nodes/Folder/query', json=payload)
+                result = await client.post(ConfigClass.NEO4J_SERVICE + f'nodes/Folder/query', json=payload)
                 result = result.json()[0]
 
             if not result:
@@ -163,8 +164,8 @@ class FileBulk:
                 'start_id': vfolder['id'],
                 'end_id': result['id'],
             }
-            async with httpx.AsyncClient() as client:
-                result = await client.post(url, json=payload)
+            client = http_clients.get(DownstreamService.NEO4J)
+            result = await client.post(url, json=payload)
             if result.status_code != 200:
                 api_response.code = EAPIResponseCode.internal_error
                 api_response.error_msg = 'Add folder relation to file Error: ' + result.json()
@@ -191,8 +192,8 @@ class FileBulk:
             payload = {
                 'global_entity_id': collection_geid,
             }
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload)
+            client = http_clients.get(DownstreamService.NEO4J)
+            response = await client.post(url, json=payload)
             if response.status_code != 200:
                 api_response.code = response.status_code
                 api_response.error_msg = response.json()
@@ -222,8 +223,8 @@ class FileBulk:
                     },
                 },
             }
-            async with httpx.AsyncClient() as client:
-                result = await client.post(url, json=payload)
+            client = http_clients.get(DownstreamService.NEO4J)
+            result = await client.post(url, json=payload)
             if result.status_code != 200:
                 api_response.code = EAPIResponseCode.internal_error
                 api_response.error_msg = 'Get file Error: ' + result.json()
@@ -244,8 +245,8 @@ class FileBulk:
                 'start_id': int(folder_id),
                 'end_id': file_id,
             }
-            async with httpx.AsyncClient() as client:
-                result = await client.delete(ConfigClass.NEO4J_SERVICE + 'relations', params=relation_query)
+            client = http_clients.get(DownstreamService.NEO4J)
+            result = await client.delete(ConfigClass.NEO4J_SERVICE + 'relations', params=relation_query)
             if result.status_code != 200:
                 api_response.code = EAPIResponseCode.internal_error
                 api_response.error_msg = 'Remove relationship from neo4j Error: ' + result.json()
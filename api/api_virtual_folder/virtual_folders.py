@@ -19,14 +19,18 @@
 # 
 
 import copy
-import httpx
 from fastapi import APIRouter
 from fastapi_utils.cbv import cbv
 from config import ConfigClass
+from dependencies import DownstreamService
+from dependencies import http_clients
 from models import virtual_folder_models as models
 from models.base_models import APIResponse
 from models.base_models import EAPIResponseCode
-from resources.helpers import fetch_geid
+from resources.helpers import allocate_geid
+from resources.node_cache import node_cache
+from resources.project_cache import ProjectLookupError
+from resources.project_cache import project_cache
 
 router = APIRouter()
 
@@ -45,8 +49,8 @@ class VirtualFolder:
         # Get folder
         url = ConfigClass.NEO4J_SERVICE + 'nodes/VirtualFolder/query'
         payload = {'owner': username, 'container_id': container_id}
-        async with httpx.AsyncClient() as client:
-            result = await client.post(url, json=payload)
+        client = http_clients.get(DownstreamService.NEO4J)
+        result = await client.post(url, json=payload)
 
         if result.status_code != 200:
             api_response.code = result.status_code
@@ -89,8 +93,8 @@ class VirtualFolder:
             'owner': username,
             'container_id': int(container_id),
         }
-        async with httpx.AsyncClient() as client:
-            result = await client.post(url, json=payload)
+        client = http_clients.get(DownstreamService.NEO4J)
+        result = await client.post(url, json=payload)
         result = result.json()
         if len(result) >= 10:
             api_response.error_msg = 'Folder limit reached'
@@ -100,8 +104,8 @@ class VirtualFolder:
         # duplicate check
         url = ConfigClass.NEO4J_SERVICE + 'nodes/VirtualFolder/query'
         payload = {'owner': username, 'container_id': int(container_id), 'name': folder_name}
-        async with httpx.AsyncClient() as client:
-            result = await client.post(url, json=payload)
+        client = http_clients.get(DownstreamService.NEO4J)
+        result = await client.post(url, json=payload)
         result = result.json()
         if len(result) > 0:
             api_response.error_msg = 'Found duplicate folder'
@@ -113,11 +117,11 @@ class VirtualFolder:
         payload = {
             'name': folder_name,
             'container_id': container_id,
-            'global_entity_id': fetch_geid(),
+            'global_entity_id': await allocate_geid(),
             'owner': username,
         }
-        async with httpx.AsyncClient() as client:
-            result = await client.post(url, json=payload)
+        client = http_clients.get(DownstreamService.NEO4J)
+        result = await client.post(url, json=payload)
         if result.status_code != 200:
             api_response.error_msg = 'Create vfolder in neo4j:' + result.json()
             api_response.code = EAPIResponseCode.internal_error
@@ -158,8 +162,8 @@ class VirtualFolder:
                 'global_entity_id': vfolder['geid'],
                 'owner': username,
             }
-            async with httpx.AsyncClient() as client:
-                result = await client.post(url, json=payload)
+            client = http_clients.get(DownstreamService.NEO4J)
+            result = await client.post(url, json=payload)
 
             if len(result.json()) < 1:
                 api_response.code = EAPIResponseCode.forbidden
@@ -177,8 +181,8 @@ class VirtualFolder:
             # duplicate check
             url = ConfigClass.NEO4J_SERVICE + 'nodes/VirtualFolder/query'
             payload = {'owner': username, 'container_id': container_id, 'name': vfolder['name']}
-            async with httpx.AsyncClient() as client:
-                result = await client.post(url, json=payload)
+            client = http_clients.get(DownstreamService.NEO4J)
+            result = await client.post(url, json=payload)
             result = result.json()
             if len(result) > 0:
                 api_response.error_msg = 'Found duplicate folder'
@@ -190,23 +194,23 @@ class VirtualFolder:
             payload = {
                 'name': vfolder['name'],
             }
-            async with httpx.AsyncClient() as client:
-                result = await client.put(url, json=payload)
+            client = http_clients.get(DownstreamService.NEO4J)
+            result = await client.put(url, json=payload)
             if result.status_code != 200:
                 api_response.error_msg = 'Neo4j Error: ' + result.json()
                 api_response.code = EAPIResponseCode.internal_error
                 return api_response.json_response()
             vfolder = result.json()[0]
+            await node_cache.invalidate([vfolder['global_entity_id']])
 
             # get container
-            url = ConfigClass.NEO4J_SERVICE + f'nodes/Container/node/{container_id}'
-            async with httpx.AsyncClient() as client:
-                result = await client.get(url)
-            if result.status_code != 200:
-                api_response.error_msg = 'Neo4j Error: ' + result.json()
+            try:
+                project = await project_cache.get_by_id(container_id)
+            except ProjectLookupError as e:
+                api_response.error_msg = 'Neo4j Error: ' + str(e)
                 api_response.code = EAPIResponseCode.internal_error
                 return api_response.json_response()
-            project_geid = result.json()[0]['global_entity_id']
+            project_geid = project['global_entity_id']
 
             del vfolder['id']
             del vfolder['container_id']
@@ -216,12 +220,11 @@ class VirtualFolder:
         return api_response.json_response()
 
     async def get_container_id(self, project_geid):
-        url = f'{ConfigClass.NEO4J_SERVICE}nodes/Container/query'
-        payload = {'global_entity_id': project_geid}
-        async with httpx.AsyncClient() as client:
-            result = await client.post(url, json=payload)
-        if result.status_code != 200 or result.json() == []:
+        try:
+            project = await project_cache.get_by_geid(project_geid)
+        except ProjectLookupError:
+            return None
+        if project is None:
             return None
-        result = result.json()[0]
-        container_id = result['id']
+        container_id = project['id']
         return container_id
@@ -25,6 +25,7 @@ from api.api_file_operations import api_file_operations
 from api.api_file_operations import api_file_operations_validate
 from api.api_file_operations import api_message_hub
 from api.api_filedata_meta import filedata_meta
+from api.api_node_cache import node_cache
 from api.api_resource_lock import api_file_lock
 from api.api_tags import batch_tags_operation_v2
 from api.api_tags import tags_api
@@ -44,6 +45,7 @@ api_router.include_router(
 api_router.include_router(api_message_hub.router, prefix='/files/actions/message', tags=['file-actions-message-hub'])
 
 api_router.include_router(archive.router, prefix='', tags=['archive'])
+api_router.include_router(node_cache.router, prefix='/node-cache', tags=['node-cache'])
 
 api_router_v2 = APIRouter()
 api_router_v2.include_router(batch_tags_operation_v2.router, prefix='/entity', tags=['Batch operation to update tags'])
@@ -40,6 +40,12 @@ from api.routes import api_router_v2
 from config import Settings
 from config import get_settings
 from dependencies import get_redis
+from dependencies import http_clients
+from resources.geid import geid_allocator
+from resources.helpers import get_resources_bygeids
+from resources.node_cache import NodeCacheBypassMiddleware
+from resources.node_loader import NodeLoaderMiddleware
+from resources.outbox import queue_outbox_relay
 
 
 def create_app() -> FastAPI:
@@ -80,18 +86,33 @@ def setup_middlewares(app: FastAPI,  settings: Settings) -> None:
         allow_methods=['*'],
         allow_headers=['*'],
     )
+    app.add_middleware(NodeLoaderMiddleware, batch_load_fn=get_resources_bygeids)
+    app.add_middleware(NodeCacheBypassMiddleware, header=settings.NODE_CACHE_BYPASS_HEADER)
 
 
 def setup_dependencies(app: FastAPI, settings: Settings) -> None:
     """Perform dependencies setup/teardown at the application startup/shutdown events."""
 
     app.add_event_handler('startup', partial(startup_event, settings))
+    app.add_event_handler('shutdown', shutdown_event)
 
 
 async def startup_event(settings: Settings) -> None:
     """Initialise dependencies at the application startup event."""
 
     await get_redis(settings=settings)
+    http_clients.connect(settings)
+    geid_allocator.refill()
+    queue_outbox_relay.start()
+
+
+async def shutdown_event() -> None:
+    """Release dependencies at the application shutdown event."""
+
+    await queue_outbox_relay.stop()
+    await get_redis.close()
+    await http_clients.close()
+    await geid_allocator.close()
 
 
 def setup_exception_handlers(app: FastAPI) -> None:
@@ -78,6 +78,25 @@ class Settings(BaseSettings):
     REDIS_PORT: int
     REDIS_DB: int
     REDIS_PASSWORD: str
+    REDIS_MAX_CONNECTIONS: int = 100
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5.0
+    # One of "standalone", "sentinel" or "cluster"
+    REDIS_MODE: str = 'standalone'
+    # Comma separated list of host:port pairs
+    REDIS_SENTINEL_HOSTS: str = ''
+    REDIS_SENTINEL_SERVICE_NAME: str = 'mymaster'
+    REDIS_SENTINEL_PASSWORD: Optional[str] = None
+    # Comma separated list of host:port pairs, REDIS_HOST:REDIS_PORT is used when empty
+    REDIS_CLUSTER_NODES: str = ''
+
+    # Number of deleted jobs remembered per session for the task list delta sync
+    TASK_TOMBSTONE_LOG_SIZE: int = 1000
+    # Job payload fields larger than this number of bytes are stored as separate compressed blobs
+    TASK_PAYLOAD_BLOB_THRESHOLD: int = 4096
+    # Number of jobs read from Redis at once by the task export
+    TASK_EXPORT_BATCH_SIZE: int = 1000
 
     RDS_DB_URI: str
 
@@ -86,6 +105,48 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str
     MINIO_HTTPS: bool = False
 
+    HTTP_POOL_MAX_CONNECTIONS: int = 100
+    HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_POOL_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_TIMEOUT: float = 5.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+
+    # Number of concurrent neo4j requests when walking a folder tree
+    NEO4J_TRAVERSAL_CONCURRENCY: int = 10
+    # Number of geids per neo4j node query and number of such queries running at once
+    NEO4J_QUERY_BATCH_SIZE: int = 500
+    NEO4J_QUERY_CONCURRENCY: int = 5
+
+    # Neo4j node cache, process local LRU in front of shared Redis entries
+    NODE_CACHE_TTL: int = 60
+    NODE_CACHE_LOCAL_TTL: float = 5.0
+    NODE_CACHE_LOCAL_SIZE: int = 1000
+    NODE_CACHE_BYPASS_HEADER: str = 'X-Node-Cache-Bypass'
+    PROJECT_CACHE_TTL: int = 60
+
+    # Geids prefetched per GEID client call and buffer size that triggers the next prefetch
+    GEID_BATCH_SIZE: int = 100
+    GEID_REFILL_THRESHOLD: int = 20
+
+    # Number of folders flattened at once when validating file operations
+    FILE_VALIDATION_CONCURRENCY: int = 5
+    # Copy and delete operations with more targets are split into sub-jobs with this many targets each
+    FILE_OPERATION_SHARD_SIZE: int = 1000
+    # File operation results are kept per operator and request id, so retried submissions are not dispatched again
+    IDEMPOTENCY_TTL: int = 86400
+    # Claims of running submissions are refreshed, the ttl only limits how long a claim of a dead process blocks retries
+    IDEMPOTENCY_PENDING_TTL: int = 60
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 5.0
+    IDEMPOTENCY_POLL_INTERVAL: float = 0.2
+
+    # Queue message outbox relay, messages are read in batches and retried with exponential backoff
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_RETRY_BACKOFF: float = 1.0
+    OUTBOX_RETRY_BACKOFF_MAX: float = 60.0
+    OUTBOX_LOCK_TIMEOUT: float = 30.0
+
     OPEN_TELEMETRY_ENABLED: bool = False
     OPEN_TELEMETRY_HOST: str = '127.0.0.1'
     OPEN_TELEMETRY_PORT: int = 6831
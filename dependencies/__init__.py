@@ -21,9 +21,13 @@
 from dependencies.cache import Cache
 from dependencies.cache import get_cache
 from dependencies.cache import get_redis
+from dependencies.http_clients import DownstreamService
+from dependencies.http_clients import http_clients
 
 __all__ = [
     'Cache',
+    'DownstreamService',
     'get_cache',
     'get_redis',
+    'http_clients',
 ]
@@ -18,33 +18,122 @@
 # permissions and limitations under the Licence.
 # 
 
+from typing import List
 from typing import Optional
+from typing import Tuple
 from typing import Union
 
 from aioredis.client import Redis
+from aioredis.connection import ConnectionPool
+from aioredis.sentinel import Sentinel
 from fastapi import Depends
 
 from config import Settings
 from config import get_settings
 
 
+def parse_redis_hosts(hosts: str) -> List[Tuple[str, int]]:
+    """Convert comma separated list of host:port pairs into list of tuples."""
+
+    parsed = []
+    for host in hosts.split(','):
+        host = host.strip()
+        if not host:
+            continue
+        name, _, port = host.rpartition(':')
+        parsed.append((name, int(port)))
+    return parsed
+
+
 class GetRedis:
-    """Create a FastAPI callable dependency for Redis single instance."""
+    """Create a FastAPI callable dependency for Redis single instance.
+
+    The same client, backed by one connection pool, is shared by every consumer in the process.
+    Depending on the REDIS_MODE setting the client talks to a single host, discovers the master
+    through Redis Sentinel or works with Redis Cluster.
+    """
 
     def __init__(self) -> None:
         self.instance = None
 
+    def connect(self, settings: Settings) -> Redis:
+        """Return the shared instance of Redis class, creating it on the first call."""
+
+        if not self.instance:
+            factory = {
+                'standalone': self._create_standalone,
+                'sentinel': self._create_sentinel,
+                'cluster': self._create_cluster,
+            }.get(settings.REDIS_MODE)
+            if not factory:
+                raise ValueError(f'Unsupported redis mode: {settings.REDIS_MODE}')
+            self.instance = factory(settings)
+        return self.instance
+
+    def _get_connection_kwargs(self, settings: Settings) -> dict:
+        return {
+            'password': settings.REDIS_PASSWORD,
+            'max_connections': settings.REDIS_MAX_CONNECTIONS,
+            'health_check_interval': settings.REDIS_HEALTH_CHECK_INTERVAL,
+            'socket_timeout': settings.REDIS_SOCKET_TIMEOUT,
+            'socket_connect_timeout': settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            'socket_keepalive': True,
+        }
+
+    def _create_standalone(self, settings: Settings) -> Redis:
+        connection_pool = ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            **self._get_connection_kwargs(settings),
+        )
+        return Redis(connection_pool=connection_pool)
+
+    def _create_sentinel(self, settings: Settings) -> Redis:
+        sentinel = Sentinel(
+            parse_redis_hosts(settings.REDIS_SENTINEL_HOSTS),
+            sentinel_kwargs={
+                'password': settings.REDIS_SENTINEL_PASSWORD,
+                'socket_timeout': settings.REDIS_SOCKET_TIMEOUT,
+                'socket_connect_timeout': settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            },
+        )
+        return sentinel.master_for(
+            settings.REDIS_SENTINEL_SERVICE_NAME,
+            redis_class=Redis,
+            db=settings.REDIS_DB,
+            **self._get_connection_kwargs(settings),
+        )
+
+    def _create_cluster(self, settings: Settings) -> Redis:
+        # aioredis has no cluster client, the asyncio one from redis>=4.5 (pipelines and locks) is used for this mode
+        from redis.asyncio.cluster import ClusterNode
+        from redis.asyncio.cluster import RedisCluster
+
+        nodes = parse_redis_hosts(settings.REDIS_CLUSTER_NODES) or [(settings.REDIS_HOST, settings.REDIS_PORT)]
+        return RedisCluster(
+            startup_nodes=[ClusterNode(host, port) for host, port in nodes],
+            **self._get_connection_kwargs(settings),
+        )
+
     async def __call__(self, settings: Settings = Depends(get_settings)) -> Redis:
         """Return an instance of Redis class."""
 
+        return self.connect(settings)
+
+    async def close(self) -> None:
+        """Disconnect all pooled connections and drop the shared instance."""
+
         if not self.instance:
-            self.instance = Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                db=settings.REDIS_DB,
-                password=settings.REDIS_PASSWORD,
-            )
-        return self.instance
+            return
+
+        instance = self.instance
+        self.instance = None
+        await instance.close()
+        # Cluster client owns one pool per node and releases them in close()
+        connection_pool = getattr(instance, 'connection_pool', None)
+        if connection_pool:
+            await connection_pool.disconnect()
 
 
 get_redis = GetRedis()
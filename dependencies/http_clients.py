@@ -0,0 +1,78 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+from enum import Enum
+from enum import unique
+from typing import Dict
+from typing import Optional
+
+import httpx
+
+from config import Settings
+from config import get_settings
+
+
+@unique
+class DownstreamService(str, Enum):
+    NEO4J = 'neo4j'
+    QUEUE = 'queue'
+    PROVENANCE = 'provenance'
+    ENTITYINFO = 'entityinfo'
+    CATALOGUING = 'cataloguing'
+
+
+class HTTPClients:
+    """Keep one pooled keep-alive HTTP client per downstream service."""
+
+    def __init__(self) -> None:
+        self.instances: Dict[DownstreamService, httpx.AsyncClient] = {}
+
+    def connect(self, settings: Settings) -> None:
+        """Create clients for all downstream services."""
+
+        for service in DownstreamService:
+            self.get(service, settings)
+
+    def get(self, service: DownstreamService, settings: Optional[Settings] = None) -> httpx.AsyncClient:
+        """Return the client of the downstream service, creating it on the first call."""
+
+        if service not in self.instances:
+            if settings is None:
+                settings = get_settings()
+            self.instances[service] = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+            )
+        return self.instances[service]
+
+    async def close(self) -> None:
+        """Close all clients and their pooled connections."""
+
+        instances = list(self.instances.values())
+        self.instances = {}
+        for instance in instances:
+            await instance.aclose()
+
+
+http_clients = HTTPClients()
@@ -94,4 +94,20 @@ class TaskDispatchPUT(BaseModel):
     job_id: str
     status: str
     add_payload: dict = {}
-    progress: int = 0
\ No newline at end of file
+    progress: int = 0
+
+
+class TaskProgressGETResponse(APIResponse):
+    result: dict = Field({}, example={
+        "session_id": "unique_session_2021",
+        "task_id": "task1",
+        "job_count": 3,
+        "finished_count": 1,
+        "progress": 45.5,
+        "worst_status": "RUNNING",
+        "statuses": {
+            "RUNNING": 2,
+            "SUCCEED": 1
+        }
+    }
+    )
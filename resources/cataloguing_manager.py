@@ -19,9 +19,10 @@
 # 
 
 from config import ConfigClass
+from dependencies import DownstreamService
+from dependencies import http_clients
 import requests
 from models import filemeta_models as models
-import httpx
 
 class CataLoguingManager:
     base_url = ConfigClass.CATALOGUING_SERVICE_V2
@@ -41,12 +42,12 @@ class CataLoguingManager:
             "processed_pipeline": post_form.process_pipeline
         }
         
-        async with httpx.AsyncClient() as client:
-            res = await client.post(
-                json=req_postform, 
-                url=self.base_url + filedata_endpoint,
-                timeout=None
-            )
+        client = http_clients.get(DownstreamService.CATALOGUING)
+        res = await client.post(
+            json=req_postform, 
+            url=self.base_url + filedata_endpoint,
+            timeout=None
+        )
         if res.status_code == 200:
             json_payload = res.json()
             created_entity = None
@@ -0,0 +1,99 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+from collections import deque
+from typing import Deque
+from typing import List
+from typing import Optional
+
+from common import GEIDClient
+from logger import LoggerFactory
+
+from config import ConfigClass
+
+_logger = LoggerFactory('geid_allocator').get_logger()
+
+
+class GEIDAllocationError(Exception):
+    """Raised when the GEID service doesn't provide any geids."""
+
+
+def generate_geids(number: int) -> List[str]:
+    """Generate geids with the blocking GEIDClient."""
+
+    client = GEIDClient()
+    return client.get_GEID_bulk(number)
+
+
+class GEIDAllocator:
+    """Hand out geids from an in-memory buffer that is refilled in the background.
+
+    Geids are generated in batches of GEID_BATCH_SIZE in a worker thread, so the event loop is never blocked by
+    the GEID client. A refill starts as soon as the buffer drops below GEID_REFILL_THRESHOLD, callers only wait
+    when the buffer runs empty.
+    """
+
+    def __init__(self) -> None:
+        self.buffer: Deque[str] = deque()
+        self.refill_task: Optional[asyncio.Future] = None
+
+    async def allocate(self) -> str:
+        """Return an unused geid."""
+
+        while not self.buffer:
+            # the buffer may be drained by other callers, only an empty batch means the service has no geids
+            if not await asyncio.shield(self.refill()):
+                raise GEIDAllocationError('GEID service returned no geids')
+
+        geid = self.buffer.popleft()
+        if len(self.buffer) < ConfigClass.GEID_REFILL_THRESHOLD:
+            self.refill()
+        return geid
+
+    def refill(self) -> asyncio.Future:
+        """Start filling the buffer unless a refill is already running and return the refill task."""
+
+        if self.refill_task is None or self.refill_task.done():
+            self.refill_task = asyncio.ensure_future(self._fill())
+            self.refill_task.add_done_callback(self._log_failure)
+        return self.refill_task
+
+    async def close(self) -> None:
+        """Cancel the running refill and drop buffered geids."""
+
+        if self.refill_task is not None and not self.refill_task.done():
+            self.refill_task.cancel()
+        self.refill_task = None
+        self.buffer.clear()
+
+    async def _fill(self) -> int:
+        loop = asyncio.get_running_loop()
+        geids = await loop.run_in_executor(None, generate_geids, ConfigClass.GEID_BATCH_SIZE)
+        self.buffer.extend(geids)
+        return len(geids)
+
+    def _log_failure(self, task: asyncio.Future) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            _logger.error(f'Failed to prefetch geids: {task.exception()}')
+
+
+geid_allocator = GEIDAllocator()
@@ -18,40 +18,147 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
 import re
+from json import dumps as json_dumps
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import List
 from typing import Optional
+from typing import Tuple
 
 import httpx
-from common import GEIDClient
 
 from config import ConfigClass
+from dependencies import DownstreamService
+from dependencies import http_clients
+from resources.geid import geid_allocator
+from resources.node_cache import node_cache
+from resources.node_loader import get_node_loader
 
 
-def fetch_geid():
-    client = GEIDClient()
-    geid = client.get_GEID()
-    return geid
+async def allocate_geid() -> str:
+    """Return a new geid without blocking the event loop."""
+
+    return await geid_allocator.allocate()
+
+
+_inflight_requests: Dict[str, asyncio.Future] = {}
+
+
+async def single_flight(
+    service: DownstreamService,
+    method: str,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    json: Any = None,
+) -> httpx.Response:
+    """Send the request unless an identical one is already in flight, in which case share its response.
+
+    Requests are identical when the service, method, url, params and payload match. Only use it for requests
+    without side effects.
+    """
+
+    key = json_dumps([service, method, url, params, json], sort_keys=True, default=str)
+    future = _inflight_requests.get(key)
+    if future is None:
+        client = http_clients.get(service)
+        future = asyncio.ensure_future(client.request(method, url, params=params, json=json))
+        _inflight_requests[key] = future
+        future.add_done_callback(lambda _: _inflight_requests.pop(key, None))
+
+    return await asyncio.shield(future)
 
 
 async def get_resource_bygeid(geid: str) -> Optional[dict]:
     """Get the node by geid.
 
+    Nodes are served from the node cache when possible. Within a request the remaining lookups go through
+    the request node loader and are batched with other lookups.
     raise exception if the geid does not exist.
     """
-    url = f'{ConfigClass.NEO4J_SERVICE}nodes/geid/{geid}'
-    async with httpx.AsyncClient() as client:
-        res = await client.get(url)
-    nodes = res.json()
+    node, version = await node_cache.get_node(geid)
+    if node is not None:
+        return node
 
-    if len(nodes) == 0:
+    loader = get_node_loader()
+    if loader is not None:
+        node = await loader.load(geid)
+    else:
+        url = f'{ConfigClass.NEO4J_SERVICE}nodes/geid/{geid}'
+        res = await single_flight(DownstreamService.NEO4J, 'GET', url)
+        nodes = res.json()
+        node = nodes[0] if nodes else None
+
+    if node is None:
         raise Exception('Not found resource: ' + geid)
 
-    return nodes[0]
+    await node_cache.set_node(node, version)
+    return node
 
 
-async def get_files_recursive(folder_geid, all_files=None):
-    if all_files is None:
-        all_files = []
+async def query_nodes_in(field: str, values: List[Any], query: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Return nodes matching the query with the field equal to one of the values.
+
+    Values are queried in chunks of NEO4J_QUERY_BATCH_SIZE, up to NEO4J_QUERY_CONCURRENCY requests at a time.
+    Every chunk is paged only until each of its values matched a node, so the result is guaranteed to contain
+    at least one node per existing value rather than all matching nodes.
+    """
+
+    unique_values = list(dict.fromkeys(values))
+    batch_size = ConfigClass.NEO4J_QUERY_BATCH_SIZE
+    chunks = [unique_values[i : i + batch_size] for i in range(0, len(unique_values), batch_size)]
+    semaphore = asyncio.Semaphore(ConfigClass.NEO4J_QUERY_CONCURRENCY)
+    url = ConfigClass.NEO4J_SERVICE_V2 + 'nodes/query'
+    client = http_clients.get(DownstreamService.NEO4J)
+
+    async def query_chunk(chunk: List[Any]) -> List[Dict[str, Any]]:
+        nodes = []
+        pending = set(chunk)
+        page = 0
+        while True:
+            payload = {
+                'page': page,
+                'page_size': len(chunk),
+                'partial': False,
+                'order_by': 'global_entity_id',
+                'order_type': 'desc',
+                'query': {
+                    **(query or {}),
+                    field: chunk,
+                },
+            }
+            async with semaphore:
+                response = await client.post(url, json=payload)
+            if response.status_code != 200:
+                raise Exception(f'Failed to query nodes by {field}: {response.text}')
+            result = response.json()['result']
+            nodes += result
+            pending.difference_update(node.get(field) for node in result)
+            if len(result) < len(chunk) or not pending:
+                return nodes
+            page += 1
+
+    results = await asyncio.gather(*[query_chunk(chunk) for chunk in chunks])
+    return [node for result in results for node in result]
+
+
+async def get_resources_bygeids(geids: List[str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """Get nodes for the list of geids.
+
+    Return map of geid to node and list of geids that do not exist.
+    """
+
+    unique_geids = list(dict.fromkeys(geids))
+    result = await query_nodes_in('global_entity_id', unique_geids)
+    nodes = {node['global_entity_id']: node for node in result}
+    missing = [geid for geid in unique_geids if geid not in nodes]
+    return nodes, missing
+
+
+async def get_folder_children(folder_geid: str) -> List[Dict[str, Any]]:
+    """Return files and folders directly under the folder."""
 
     query = {
         'start_label': 'Folder',
@@ -63,13 +170,65 @@ async def get_files_recursive(folder_geid, all_files=None):
             'end_params': {},
         },
     }
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(ConfigClass.NEO4J_SERVICE_V2 + 'relations/query', json=query)
-    for node in resp.json()['results']:
-        if 'File' in node['labels']:
-            all_files.append(node)
-        else:
-            await get_files_recursive(node['global_entity_id'], all_files=all_files)
+    client = http_clients.get(DownstreamService.NEO4J)
+    resp = await client.post(ConfigClass.NEO4J_SERVICE_V2 + 'relations/query', json=query)
+    return resp.json()['results']
+
+
+async def iter_folder_levels(folder_geid: str) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Walk the folder tree level by level and yield every expanded folder geid with its children.
+
+    Folders of the same level are expanded concurrently, up to NEO4J_TRAVERSAL_CONCURRENCY requests at a time.
+    """
+
+    semaphore = asyncio.Semaphore(ConfigClass.NEO4J_TRAVERSAL_CONCURRENCY)
+
+    async def expand(geid: str) -> Tuple[str, List[Dict[str, Any]]]:
+        async with semaphore:
+            return geid, await get_folder_children(geid)
+
+    level = [folder_geid]
+    while level:
+        next_level = []
+        tasks = [asyncio.ensure_future(expand(geid)) for geid in level]
+        try:
+            for task in asyncio.as_completed(tasks):
+                geid, children = await task
+                yield geid, children
+                next_level += [node['global_entity_id'] for node in children if 'File' not in node['labels']]
+        finally:
+            for task in tasks:
+                task.cancel()
+        level = next_level
+
+
+async def iter_files_recursive(folder_geid: str) -> AsyncIterator[Dict[str, Any]]:
+    """Yield all files under the folder as soon as they are found."""
+
+    async for _, children in iter_folder_levels(folder_geid):
+        for node in children:
+            if 'File' in node['labels']:
+                yield node
+
+
+async def get_files_recursive(folder_geid, all_files=None):
+    """Return all files under the folder in depth-first order."""
+
+    if all_files is None:
+        all_files = []
+
+    children_by_folder = {}
+    async for geid, children in iter_folder_levels(folder_geid):
+        children_by_folder[geid] = children
+
+    def collect(geid):
+        for node in children_by_folder[geid]:
+            if 'File' in node['labels']:
+                all_files.append(node)
+            else:
+                collect(node['global_entity_id'])
+
+    collect(folder_geid)
     return all_files
 
 
@@ -82,43 +241,27 @@ def get_resource_type(labels: list):
     return None
 
 
-async def get_connected_nodes(geid, direction: str = 'both'):
-    """return a list of nodes."""
-    if direction == 'both':
-        params = {'direction': 'input'}
-        url = ConfigClass.NEO4J_SERVICE + 'relations/connected/{}'.format(geid)
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
-        if response.status_code != 200:
-            raise Exception(
-                'Internal error for neo4j service, \
-                when get_connected, geid: '
-                + str(geid)
-            )
-        connected_nodes = response.json()['result']
-        params = {'direction': 'output'}
-        url = ConfigClass.NEO4J_SERVICE + 'relations/connected/{}'.format(geid)
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
-        if response.status_code != 200:
-            raise Exception(
-                'Internal error for neo4j service, \
-                when get_connected, geid: '
-                + str(geid)
-            )
-        return connected_nodes + response.json()['result']
-    params = {'direction': direction}
+async def get_connected_nodes_in_direction(geid: str, direction: str) -> List[Dict[str, Any]]:
     url = ConfigClass.NEO4J_SERVICE + 'relations/connected/{}'.format(geid)
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
+    response = await single_flight(DownstreamService.NEO4J, 'GET', url, params={'direction': direction})
     if response.status_code != 200:
         raise Exception(
             'Internal error for neo4j service, \
             when get_connected, geid: '
             + str(geid)
         )
-    connected_nodes = response.json()['result']
-    return connected_nodes
+    return response.json()['result']
+
+
+async def get_connected_nodes(geid, direction: str = 'both'):
+    """return a list of nodes."""
+    if direction == 'both':
+        input_nodes, output_nodes = await asyncio.gather(
+            get_connected_nodes_in_direction(geid, 'input'),
+            get_connected_nodes_in_direction(geid, 'output'),
+        )
+        return input_nodes + output_nodes
+    return await get_connected_nodes_in_direction(geid, direction)
 
 
 def location_decoder(location: str):
@@ -136,6 +279,4 @@ async def http_query_node(primary_label, query_params={}):
     """primary_label i.e. Folder, File, Container."""
     payload = {**query_params}
     node_query_url = ConfigClass.NEO4J_SERVICE + 'nodes/{}/query'.format(primary_label)
-    async with httpx.AsyncClient() as client:
-        response = await client.post(node_query_url, json=payload)
-    return response
+    return await single_flight(DownstreamService.NEO4J, 'POST', node_query_url, json=payload)
@@ -0,0 +1,111 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+import json
+import time
+from contextlib import suppress
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from uuid import uuid4
+
+from config import ConfigClass
+from resources.redis import SrvAioRedisSingleton
+
+PENDING_PREFIX = b'pending:'
+
+
+class RequestInProgressError(Exception):
+    """Raised when the submission with the same request id is still being processed."""
+
+
+def get_idempotency_key(operator: str, request_id: str) -> str:
+    return 'dataops-idempotency:{}:{}'.format(operator, request_id)
+
+
+class RequestClaim:
+    """Claim of the operator request id, held while the submission with this id is processed.
+
+    The claim stores a unique pending token, which is refreshed every third of IDEMPOTENCY_PENDING_TTL for as long
+    as the submission runs. A claim left by a process that died expires after IDEMPOTENCY_PENDING_TTL. The result is
+    stored and the claim is released only while the key still holds the token, so a submission can't overwrite or
+    drop the claim taken over by another one.
+    """
+
+    def __init__(self, operator: str, request_id: str) -> None:
+        self.key = get_idempotency_key(operator, request_id)
+        self.request_id = request_id
+        self.token = PENDING_PREFIX + uuid4().hex.encode('utf-8')
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    async def acquire(self) -> Optional[List[Dict[str, Any]]]:
+        """Claim the request id or return the result of the earlier submission with it.
+
+        Return None when the request is claimed and should be processed. When the earlier submission is still being
+        processed, wait up to IDEMPOTENCY_WAIT_TIMEOUT for its result and raise RequestInProgressError after that.
+        """
+
+        srv_redis = SrvAioRedisSingleton()
+        deadline = time.monotonic() + ConfigClass.IDEMPOTENCY_WAIT_TIMEOUT
+        while True:
+            if await srv_redis.set_if_missing(self.key, self.token, ConfigClass.IDEMPOTENCY_PENDING_TTL):
+                self.refresh_task = asyncio.ensure_future(self._refresh())
+                return None
+            value = await srv_redis.get_by_key(self.key)
+            if value is not None and not value.startswith(PENDING_PREFIX):
+                return json.loads(value)
+            if time.monotonic() >= deadline:
+                raise RequestInProgressError(f'Request {self.request_id} is already being processed')
+            await asyncio.sleep(ConfigClass.IDEMPOTENCY_POLL_INTERVAL)
+
+    async def store(self, result: List[Dict[str, Any]]) -> bool:
+        """Keep the result for IDEMPOTENCY_TTL, retries with the same request id receive it.
+
+        Return false if the claim was lost in the meantime.
+        """
+
+        await self._stop_refresh()
+        srv_redis = SrvAioRedisSingleton()
+        return await srv_redis.compare_and_set(self.key, self.token, json.dumps(result), ConfigClass.IDEMPOTENCY_TTL)
+
+    async def release(self) -> bool:
+        """Drop the claim of the request that wasn't accepted, so it can be submitted again."""
+
+        await self._stop_refresh()
+        srv_redis = SrvAioRedisSingleton()
+        return await srv_redis.compare_and_delete(self.key, self.token)
+
+    async def _refresh(self) -> None:
+        srv_redis = SrvAioRedisSingleton()
+        while True:
+            await asyncio.sleep(ConfigClass.IDEMPOTENCY_PENDING_TTL / 3)
+            if not await srv_redis.compare_and_expire(self.key, self.token, ConfigClass.IDEMPOTENCY_PENDING_TTL):
+                return
+
+    async def _stop_refresh(self) -> None:
+        if self.refresh_task is None:
+            return
+        self.refresh_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self.refresh_task
+        self.refresh_task = None
@@ -0,0 +1,217 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import json
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+from typing import Tuple
+
+from logger import LoggerFactory
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+from config import ConfigClass
+from dependencies import get_redis
+from resources.node_loader import clear_loaded_nodes
+
+_logger = LoggerFactory('node_cache').get_logger()
+
+node_cache_bypass_var: ContextVar[bool] = ContextVar('node_cache_bypass', default=False)
+
+
+@contextmanager
+def bypass_node_cache() -> Iterator[None]:
+    """Read nodes straight from neo4j within the block, fetched nodes are still stored in the cache."""
+
+    token = node_cache_bypass_var.set(True)
+    try:
+        yield
+    finally:
+        node_cache_bypass_var.reset(token)
+
+
+# KEYS: node, node version; ARGV: version the node was read at, node, ttl
+SET_NODE_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+# KEYS: node, node version; ARGV: ttl
+INVALIDATE_NODE_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return redis.call('DEL', KEYS[1])
+"""
+
+
+class NodeCache:
+    """Two level cache of neo4j nodes.
+
+    Nodes are kept in a small process local LRU in front of shared Redis entries, both levels expire after their
+    own TTL. Local entries are not checked against Redis, so other processes may serve a node for up to
+    NODE_CACHE_LOCAL_TTL after it was invalidated, reads that must see the latest node use bypass_node_cache().
+
+    Every node has a version in Redis that invalidation bumps. A node read before an invalidation is not written
+    back to Redis, so the shared level doesn't get the previous value back.
+    """
+
+    def __init__(self, prefix: str = 'dataops-node-cache') -> None:
+        self.prefix = prefix
+        self.local: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self.stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0, 'bypasses': 0}
+
+    def get_node_keys(self, geid: str) -> Tuple[str, str]:
+        """Return keys of the node and of its version, the hash tag keeps both in the same cluster slot."""
+
+        return f'{self.prefix}:node:{{{geid}}}', f'{self.prefix}:version:{{{geid}}}'
+
+    @property
+    def redis(self):
+        return get_redis.connect(ConfigClass)
+
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self.local.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.local[key]
+            return None
+
+        self.local.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: str) -> None:
+        self.local[key] = (time.monotonic() + ConfigClass.NODE_CACHE_LOCAL_TTL, value)
+        self.local.move_to_end(key)
+        while len(self.local) > ConfigClass.NODE_CACHE_LOCAL_SIZE:
+            self.local.popitem(last=False)
+
+    async def get_node(self, geid: str) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """Return the cached node or None and the node version to pass to set_node.
+
+        The version is None when Redis is not available, the node is not cached then.
+        """
+
+        node_key, version_key = self.get_node_keys(geid)
+        bypass = node_cache_bypass_var.get()
+        if not bypass:
+            value = self._get_local(node_key)
+            if value is not None:
+                self.stats['local_hits'] += 1
+                return json.loads(value), None
+
+        try:
+            pipeline = self.redis.pipeline()
+            pipeline.get(version_key)
+            if not bypass:
+                pipeline.get(node_key)
+            version, *values = await pipeline.execute()
+        except Exception as e:
+            _logger.warning(f'Failed to read node cache entry {node_key}: {e}')
+            self.stats['bypasses' if bypass else 'misses'] += 1
+            return None, None
+
+        version = int(version or 0)
+        if bypass:
+            self.stats['bypasses'] += 1
+            return None, version
+
+        value = values[0]
+        if value is None:
+            self.stats['misses'] += 1
+            return None, version
+
+        self.stats['redis_hits'] += 1
+        if isinstance(value, bytes):
+            value = value.decode()
+        self._set_local(node_key, value)
+        return json.loads(value), version
+
+    async def set_node(self, node: Dict[str, Any], version: Optional[int]) -> None:
+        """Cache the node unless it was invalidated after it was read at the version."""
+
+        if version is None:
+            return
+
+        node_key, version_key = self.get_node_keys(node['global_entity_id'])
+        value = json.dumps(node)
+        try:
+            script = self.redis.register_script(SET_NODE_SCRIPT)
+            stored = await script(keys=[node_key, version_key], args=[version, value, ConfigClass.NODE_CACHE_TTL])
+        except Exception as e:
+            _logger.warning(f'Failed to write node cache entry {node_key}: {e}')
+            return
+
+        if stored:
+            self._set_local(node_key, value)
+
+    async def invalidate(self, geids: Iterable[str]) -> None:
+        """Drop the cached nodes and bump their versions, so nodes read before the change are not cached again."""
+
+        geids = set(geids)
+        clear_loaded_nodes(list(geids))
+        node_keys = [self.get_node_keys(geid) for geid in geids]
+        for node_key, _ in node_keys:
+            self.local.pop(node_key, None)
+        try:
+            script = self.redis.register_script(INVALIDATE_NODE_SCRIPT)
+            for keys in node_keys:
+                await script(keys=list(keys), args=[ConfigClass.NODE_CACHE_TTL])
+        except Exception as e:
+            _logger.warning(f'Failed to invalidate node cache entries: {e}')
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return hit and miss counters of the current process."""
+
+        return {**self.stats, 'local_size': len(self.local)}
+
+
+node_cache = NodeCache()
+
+
+class NodeCacheBypassMiddleware:
+    """Skip node cache reads for http requests carrying the NODE_CACHE_BYPASS_HEADER header."""
+
+    def __init__(self, app: ASGIApp, header: str) -> None:
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or self.header not in Headers(scope=scope):
+            await self.app(scope, receive, send)
+            return
+
+        with bypass_node_cache():
+            await self.app(scope, receive, send)
@@ -0,0 +1,148 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+import copy
+from contextvars import ContextVar
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from starlette.types import ASGIApp
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+BatchLoadFn = Callable[[List[str]], Awaitable[Tuple[Dict[str, Dict[str, Any]], List[str]]]]
+
+
+class NodeLoader:
+    """Collect node lookups made in the same event loop iteration and resolve them with one batched query.
+
+    Nodes are memoized for the lifetime of the loader, so every geid is fetched until it is cleared at most once.
+    Callers receive their own copy of the node and may modify it freely.
+    """
+
+    def __init__(self, batch_load_fn: BatchLoadFn) -> None:
+        self.batch_load_fn = batch_load_fn
+        self.futures: Dict[str, asyncio.Future] = {}
+        self.stale: Set[asyncio.Future] = set()
+        self.queue: List[Tuple[str, asyncio.Future]] = []
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def load(self, geid: str) -> Optional[Dict[str, Any]]:
+        """Return the node for the geid or None if it does not exist."""
+
+        while True:
+            future = self.futures.get(geid)
+            if future is None:
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                self.futures[geid] = future
+                if not self.queue:
+                    loop.call_soon(self._dispatch)
+                self.queue.append((geid, future))
+
+            node = await asyncio.shield(future)
+            # the node was cleared while it was being fetched, the fetched value may predate the change
+            if future not in self.stale:
+                return copy.deepcopy(node)
+
+    async def load_many(self, geids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Return nodes for the list of geids in the same order."""
+
+        return list(await asyncio.gather(*[self.load(geid) for geid in geids]))
+
+    def clear(self, geid: str) -> None:
+        """Forget the memoized node, so the next load fetches it again.
+
+        Loads waiting for the node that is being fetched at the moment fetch it again as well.
+        """
+
+        future = self.futures.pop(geid, None)
+        if future is not None and not future.done():
+            self.stale.add(future)
+
+    def _dispatch(self) -> None:
+        batch, self.queue = self.queue, []
+        # the loop keeps only weak references to tasks, so pending ones are kept here
+        task = asyncio.ensure_future(self._load_batch(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _load_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            nodes, _ = await self.batch_load_fn([geid for geid, _ in batch])
+        except Exception as e:
+            for geid, future in batch:
+                if self.futures.get(geid) is future:
+                    del self.futures[geid]
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for geid, future in batch:
+            if not future.done():
+                future.set_result(nodes.get(geid))
+
+
+node_loader_var: ContextVar[Optional[NodeLoader]] = ContextVar('node_loader', default=None)
+
+
+def get_node_loader() -> Optional[NodeLoader]:
+    """Return the node loader of the current request if there is one."""
+
+    return node_loader_var.get()
+
+
+def clear_loaded_nodes(geids: List[str]) -> None:
+    """Forget memoized nodes after they were modified within the current request."""
+
+    loader = get_node_loader()
+    if loader is None:
+        return
+
+    for geid in geids:
+        loader.clear(geid)
+
+
+class NodeLoaderMiddleware:
+    """Provide every http request with its own node loader."""
+
+    def __init__(self, app: ASGIApp, batch_load_fn: BatchLoadFn) -> None:
+        self.app = app
+        self.batch_load_fn = batch_load_fn
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        token = node_loader_var.set(NodeLoader(self.batch_load_fn))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            node_loader_var.reset(token)
@@ -0,0 +1,246 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+import json
+import time
+from contextlib import suppress
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from logger import LoggerFactory
+
+from config import ConfigClass
+from dependencies import DownstreamService
+from dependencies import http_clients
+from resources.redis import SrvAioRedisSingleton
+from resources.redis_project_session_job import get_outbox_keys
+from resources.redis_project_session_job import session_job_load_payload
+from resources.redis_project_session_job import session_job_set_status
+
+_logger = LoggerFactory('queue_outbox').get_logger()
+
+OUTBOX_LOCK_KEY = 'dataaction-outbox-relay'
+
+
+def get_retry_delay(attempts: int) -> float:
+    """Return the delay before the next delivery of the message that failed the number of attempts."""
+
+    return min(ConfigClass.OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1), ConfigClass.OUTBOX_RETRY_BACKOFF_MAX)
+
+
+class QueueOutboxRelay:
+    """Publish queue messages written to the session outboxes along with their jobs.
+
+    The relay runs in the background of every application process, but only the one holding the Redis lock sends
+    messages. Outboxes are read in batches of OUTBOX_BATCH_SIZE, delivered messages are removed and failed ones are
+    retried with exponential backoff. After OUTBOX_MAX_ATTEMPTS the message is dropped and its job is terminated.
+    """
+
+    def __init__(self) -> None:
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.lock = None
+        self.leader = False
+        self.retry_at: Dict[str, float] = {}
+
+    def start(self) -> None:
+        """Start the relay loop unless it is already running."""
+
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.ensure_future(self._run())
+
+    def notify(self) -> None:
+        """Wake up the relay after a message was added to the outbox."""
+
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def stop(self) -> None:
+        """Cancel the relay loop and release the lock for the other processes."""
+
+        if self.task is not None:
+            self.task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.task
+        self.task = None
+
+        if self.leader:
+            with suppress(Exception):
+                await self.lock.release()
+        self.lock = None
+        self.leader = False
+        self.retry_at.clear()
+
+    async def relay(self) -> int:
+        """Send pending messages of all sessions once and return the number of removed outbox entries.
+
+        The lock is extended before every session, so a long pass never outlives it. The pass stops as soon as the
+        lock can't be held, the process that took it over continues with the remaining sessions.
+        """
+
+        srv_redis = SrvAioRedisSingleton()
+        removed = 0
+        for session_id in await srv_redis.outbox_sessions():
+            if not await self._acquire_lock():
+                break
+            removed += await self.relay_session(srv_redis, session_id)
+        return removed
+
+    async def relay_session(self, srv_redis: SrvAioRedisSingleton, session_id: str) -> int:
+        """Send the batch of messages from the session outbox."""
+
+        outbox_keys = get_outbox_keys(session_id)
+        ready = await self.read_ready(srv_redis, outbox_keys[0])
+        if ready is None:
+            await srv_redis.outbox_release(session_id, outbox_keys[0])
+            return 0
+
+        results = await asyncio.gather(*[self.send(fields) for _, fields in ready], return_exceptions=True)
+
+        finished = []
+        for (entry_id, fields), result in zip(ready, results):
+            if not isinstance(result, Exception):
+                finished.append(entry_id)
+                continue
+            if await self.retry(srv_redis, outbox_keys, entry_id, fields, result):
+                continue
+            finished.append(entry_id)
+
+        if finished:
+            await srv_redis.outbox_ack(outbox_keys, finished)
+            for entry_id in finished:
+                self.retry_at.pop(entry_id, None)
+        return len(finished)
+
+    async def read_ready(
+        self, srv_redis: SrvAioRedisSingleton, outbox_key: str
+    ) -> Optional[List[Tuple[str, Dict[str, str]]]]:
+        """Return the batch of the oldest outbox entries that are not waiting for a retry.
+
+        Entries waiting for a retry are skipped, so they don't hold back newer messages. Return None when the outbox
+        is empty.
+        """
+
+        ready = []
+        start = None
+        now = time.monotonic()
+        while len(ready) < ConfigClass.OUTBOX_BATCH_SIZE:
+            entries = await srv_redis.outbox_read(outbox_key, ConfigClass.OUTBOX_BATCH_SIZE, start)
+            if start is None and not entries:
+                return None
+            ready.extend(
+                (entry_id, fields) for entry_id, fields in entries if self.retry_at.get(entry_id, 0) <= now
+            )
+            if len(entries) < ConfigClass.OUTBOX_BATCH_SIZE:
+                break
+            start = entries[-1][0]
+        return ready[: ConfigClass.OUTBOX_BATCH_SIZE]
+
+    async def send(self, fields: Dict[str, str]) -> None:
+        client = http_clients.get(DownstreamService.QUEUE)
+        response = await client.post(url=ConfigClass.SEND_MESSAGE_URL, json=json.loads(fields['message']))
+        response.raise_for_status()
+        _logger.info(f'Message To Queue has been sent for job {fields["job_key"]}: {response.text}')
+
+    async def retry(
+        self,
+        srv_redis: SrvAioRedisSingleton,
+        outbox_keys: Tuple[str, str],
+        entry_id: str,
+        fields: Dict[str, str],
+        error: Exception,
+    ) -> bool:
+        """Schedule the next delivery of the failed message.
+
+        Return false when the message ran out of attempts, its job is terminated in this case.
+        """
+
+        attempts = await srv_redis.outbox_retry(outbox_keys, entry_id)
+        if attempts < ConfigClass.OUTBOX_MAX_ATTEMPTS:
+            self.retry_at[entry_id] = time.monotonic() + get_retry_delay(attempts)
+            _logger.warning(f'Failed to send message for job {fields["job_key"]}, attempt {attempts}: {error}')
+            return True
+
+        _logger.error(f'Giving up sending message for job {fields["job_key"]} after {attempts} attempts: {error}')
+        await self.terminate_job(srv_redis, fields['job_key'], f'Failed to send message to queue: {error}')
+        return False
+
+    async def terminate_job(self, srv_redis: SrvAioRedisSingleton, job_key: str, error: str) -> None:
+        record = await srv_redis.get_by_key(job_key)
+        if not record:
+            return
+
+        record = json.loads(record)
+        await session_job_load_payload([record])
+        payload = record['payload']
+        payload['error'] = error
+        await session_job_set_status(
+            record['session_id'],
+            record['label'],
+            record['task_id'],
+            record['job_id'],
+            record['source'],
+            record['action'],
+            'TERMINATED',
+            record['code'],
+            record['operator'],
+            payload,
+            record['progress'],
+            record['payload_blobs'],
+        )
+
+    async def _acquire_lock(self) -> bool:
+        if self.lock is None:
+            self.lock = SrvAioRedisSingleton().lock(OUTBOX_LOCK_KEY, ConfigClass.OUTBOX_LOCK_TIMEOUT)
+
+        if self.leader:
+            try:
+                await self.lock.reacquire()
+                return True
+            except Exception as e:
+                _logger.warning(f'Lost the outbox relay lock: {e}')
+                self.leader = False
+                self.retry_at.clear()
+
+        self.leader = await self.lock.acquire(blocking=False)
+        return self.leader
+
+    async def _run(self) -> None:
+        while True:
+            self.wakeup.clear()
+            removed = 0
+            try:
+                removed = await self.relay()
+            except Exception as e:
+                _logger.error(f'Failed to relay queue messages: {e}')
+
+            # keep draining while messages are leaving the outbox
+            if removed:
+                continue
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.wakeup.wait(), ConfigClass.OUTBOX_POLL_INTERVAL)
+
+
+queue_outbox_relay = QueueOutboxRelay()
@@ -0,0 +1,93 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import copy
+import time
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from config import ConfigClass
+from dependencies import DownstreamService
+from resources.helpers import single_flight
+
+
+class ProjectLookupError(Exception):
+    """Raised when the neo4j service fails to return the project."""
+
+
+class ProjectCache:
+    """Process local cache of project (Container) nodes.
+
+    A project can be looked up by geid, code or container id, the fetched node is stored under all three keys
+    for PROJECT_CACHE_TTL seconds. Concurrent lookups of the same project share one request to the neo4j
+    service through single_flight. Projects that are not found are not cached.
+    """
+
+    def __init__(self) -> None:
+        self.entries: Dict[Tuple[str, Any], Tuple[float, Dict[str, Any]]] = {}
+
+    async def get_by_geid(self, geid: str) -> Optional[Dict[str, Any]]:
+        """Return the project with the geid or None if it does not exist."""
+
+        return await self._get('global_entity_id', geid)
+
+    async def get_by_code(self, code: str) -> Optional[Dict[str, Any]]:
+        """Return the project with the code or None if it does not exist."""
+
+        return await self._get('code', code)
+
+    async def get_by_id(self, container_id: int) -> Optional[Dict[str, Any]]:
+        """Return the project with the neo4j container id or None if it does not exist."""
+
+        return await self._get('id', int(container_id))
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    async def _get(self, field: str, value: Any) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get((field, value))
+        if entry is not None and entry[0] > time.monotonic():
+            return copy.deepcopy(entry[1])
+
+        if field == 'id':
+            url = f'{ConfigClass.NEO4J_SERVICE}nodes/Container/node/{value}'
+            response = await single_flight(DownstreamService.NEO4J, 'GET', url)
+        else:
+            url = f'{ConfigClass.NEO4J_SERVICE}nodes/Container/query'
+            response = await single_flight(DownstreamService.NEO4J, 'POST', url, json={field: value})
+        if response.status_code != 200:
+            raise ProjectLookupError(response.text)
+
+        projects = response.json()
+        if not projects:
+            return None
+
+        project = projects[0]
+        expires_at = time.monotonic() + ConfigClass.PROJECT_CACHE_TTL
+        keys = [('global_entity_id', project['global_entity_id']), ('code', project['code']), ('id', project['id'])]
+        for key in keys:
+            self.entries[key] = (expires_at, project)
+        return copy.deepcopy(project)
+
+
+project_cache = ProjectCache()
@@ -19,40 +19,251 @@
 # 
 
 import json
+import time
 from datetime import timedelta
-
-from aioredis import StrictRedis
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
 
 from config import ConfigClass
+from dependencies.cache import get_redis
+
+JOB_TTL = timedelta(hours=24)
+TERMINAL_JOB_STATES = ('SUCCEED', 'TERMINATED')
+# number of file index lookups sent in one pipeline
+FILE_STATUS_BATCH_SIZE = 1000
+# file index field that keeps the update timestamp of the latest finished job
+LAST_TERMINAL_FIELD = '__last_terminal__'
+
+# set of sessions that may have queue messages waiting in their outbox
+OUTBOX_SESSIONS_KEY = 'dataaction-outbox-sessions'
+
+_SAVE_SESSION_JOB = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('HSETNX', KEYS[2], 'epoch', ARGV[3])
+local seq = redis.call('HINCRBY', KEYS[2], 'seq', 1)
+redis.call('ZADD', KEYS[3], seq, KEYS[1])
+redis.call('ZADD', KEYS[5], ARGV[3] + ARGV[2] * 1000, KEYS[1])
+for i = 2, 5 do
+    redis.call('EXPIRE', KEYS[i], ARGV[2])
+end
+"""
+# KEYS: job, change log, changes, tombstones, expiry; ARGV: job record, ttl, current time in milliseconds
+SAVE_SESSION_JOB_SCRIPT = _SAVE_SESSION_JOB + """
+return seq
+"""
+# KEYS: job, change log, changes, tombstones, expiry
+# ARGV: job record, ttl, current time in milliseconds, expected current job record
+REPLACE_SESSION_JOB_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[4] then
+    return 0
+end
+""" + _SAVE_SESSION_JOB + """
+return 1
+"""
+# KEYS: job, change log, changes, tombstones, expiry, outbox
+# ARGV: job record, ttl, current time in milliseconds, queue message
+SAVE_SESSION_JOB_WITH_MESSAGE_SCRIPT = _SAVE_SESSION_JOB + """
+local entry_id = redis.call('XADD', KEYS[6], '*', 'job_key', KEYS[1], 'message', ARGV[4])
+redis.call('EXPIRE', KEYS[6], ARGV[2])
+return entry_id
+"""
+# KEYS: job, change log, changes, tombstones, expiry
+# ARGV: tombstone, ttl, current time in milliseconds, tombstones limit
+DELETE_SESSION_JOB_SCRIPT = """
+local deleted = redis.call('DEL', KEYS[1])
+if deleted == 0 then
+    return 0
+end
+redis.call('HSETNX', KEYS[2], 'epoch', ARGV[3])
+local seq = redis.call('HINCRBY', KEYS[2], 'seq', 1)
+redis.call('ZREM', KEYS[3], KEYS[1])
+redis.call('ZREM', KEYS[5], KEYS[1])
+redis.call('ZADD', KEYS[4], seq, ARGV[1])
+local overflow = redis.call('ZCARD', KEYS[4]) - tonumber(ARGV[4])
+if overflow > 0 then
+    local trimmed = redis.call('ZRANGE', KEYS[4], overflow - 1, overflow - 1, 'WITHSCORES')
+    redis.call('HSET', KEYS[2], 'floor', trimmed[2])
+    redis.call('ZREMRANGEBYRANK', KEYS[4], 0, overflow - 1)
+end
+for i = 2, 5 do
+    redis.call('EXPIRE', KEYS[i], ARGV[2])
+end
+return deleted
+"""
+
+# KEYS: change log, changes, tombstones, expiry
+# ARGV: sequence number to read the changes after, current time in milliseconds
+GET_SESSION_JOB_CHANGES_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', ARGV[2])
+if #expired > 0 then
+    for _, job_key in ipairs(expired) do
+        redis.call('ZREM', KEYS[2], job_key)
+    end
+    redis.call('ZREMRANGEBYSCORE', KEYS[4], '-inf', ARGV[2])
+    local epoch = redis.call('HGET', KEYS[1], 'epoch')
+    if epoch then
+        redis.call('HSET', KEYS[1], 'epoch', string.format('%d', math.max(tonumber(ARGV[2]), tonumber(epoch) + 1)))
+    end
+end
+local since = '(' .. ARGV[1]
+return {
+    redis.call('HGETALL', KEYS[1]),
+    redis.call('ZRANGEBYSCORE', KEYS[2], since, '+inf'),
+    redis.call('ZRANGEBYSCORE', KEYS[3], since, '+inf'),
+}
+"""
+
+# KEYS: key; ARGV: expected value, new value, ttl
+COMPARE_AND_SET_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+# KEYS: key; ARGV: expected value
+COMPARE_AND_DELETE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+return redis.call('DEL', KEYS[1])
+"""
+# KEYS: key; ARGV: expected value, ttl
+COMPARE_AND_EXPIRE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+return redis.call('EXPIRE', KEYS[1], ARGV[2])
+"""
+
+# KEYS: task progress, task jobs
+# ARGV: job id, job status or empty string to remove the job, progress, finished, weight or empty string, ttl
+# job entries are kept as 'status finished weight progress', cjson is not available in every Redis flavour
+UPDATE_TASK_PROGRESS_SCRIPT = """
+local old = redis.call('HGET', KEYS[2], ARGV[1])
+local old_weight
+if old then
+    local status, finished, weight, progress = string.match(old, '^(%S+) (%S+) (%S+) (%S+)$')
+    old_weight = tonumber(weight)
+    redis.call('HINCRBY', KEYS[1], 'jobs', -1)
+    redis.call('HINCRBY', KEYS[1], 'finished', -tonumber(finished))
+    redis.call('HINCRBY', KEYS[1], 'weight', -old_weight)
+    redis.call('HINCRBYFLOAT', KEYS[1], 'weighted_progress', -old_weight * tonumber(progress))
+    redis.call('HINCRBY', KEYS[1], 'status:' .. status, -1)
+end
+if ARGV[2] == '' then
+    redis.call('HDEL', KEYS[2], ARGV[1])
+else
+    local weight = tonumber(ARGV[5]) or old_weight or 1
+    redis.call('HINCRBY', KEYS[1], 'jobs', 1)
+    redis.call('HINCRBY', KEYS[1], 'finished', ARGV[4])
+    redis.call('HINCRBY', KEYS[1], 'weight', weight)
+    redis.call('HINCRBYFLOAT', KEYS[1], 'weighted_progress', weight * tonumber(ARGV[3]))
+    redis.call('HINCRBY', KEYS[1], 'status:' .. ARGV[2], 1)
+    redis.call('HSET', KEYS[2], ARGV[1], table.concat({ARGV[2], ARGV[4], weight, ARGV[3]}, ' '))
+end
+for i = 1, 2 do
+    redis.call('EXPIRE', KEYS[i], ARGV[6])
+end
+return redis.call('HLEN', KEYS[2])
+"""
+
+
+def get_file_index_key(file_path: str) -> str:
+    """Return the key of the reverse index from file path to its active jobs."""
+
+    return 'dataaction-file:{}'.format(file_path)
+
+
+def get_current_action(index_entries: Dict[bytes, bytes]) -> Optional[str]:
+    """Return the action of the latest job from the file index if the job is not finished yet."""
+
+    expired_before = time.time() - JOB_TTL.total_seconds()
+    last_terminal = 0
+    latest_item = None
+    for field, value in index_entries.items():
+        if field.decode('utf-8') == LAST_TERMINAL_FIELD:
+            last_terminal = int(value)
+            continue
+        info = json.loads(value.decode('utf-8'))
+        update_timestamp = int(info['update_timestamp'])
+        # the job record itself has already expired
+        if update_timestamp < expired_before:
+            continue
+        if not latest_item or update_timestamp > int(latest_item['update_timestamp']):
+            latest_item = info
+
+    if not latest_item or int(latest_item['update_timestamp']) < last_terminal:
+        return None
+
+    return latest_item['action']
 
 
 class SrvAioRedisSingleton:
-    __instance = {}
+    """Wrap the process-wide Redis client that is also served by the `get_redis` dependency."""
 
     def __init__(self):
-        self.host = ConfigClass.REDIS_HOST
-        self.port = ConfigClass.REDIS_PORT
-        self.db = ConfigClass.REDIS_DB
-        self.pwd = ConfigClass.REDIS_PASSWORD
         self.connect()
 
     def connect(self):
-        if self.__instance:
-            pass
-        else:
-            self.__instance = StrictRedis(host=self.host, port=self.port, db=self.db, password=self.pwd)
+        self.__instance = get_redis.connect(ConfigClass)
+
+    async def mget(self, keys):
+        # keys of different sessions can live in different cluster slots
+        if ConfigClass.REDIS_MODE == 'cluster':
+            return await self.__instance.mget_nonatomic(keys)
+        return await self.__instance.mget(keys)
 
     async def get_by_key(self, key: str):
         return await self.__instance.get(key)
 
     async def set_by_key(self, key: str, content: str):
-        res = await self.__instance.set(key, content, ex=timedelta(hours=24))
+        res = await self.__instance.set(key, content, ex=JOB_TTL)
         return res
 
+    async def set_if_missing(self, key: str, value: Any, ttl: int) -> bool:
+        """Set the value only if the key doesn't exist, return true if the value was set."""
+
+        return bool(await self.__instance.set(key, value, ex=ttl, nx=True))
+
+    async def compare_and_set(self, key: str, expected: Any, value: Any, ttl: int) -> bool:
+        """Set the value only if the key still holds the expected one, return true if the value was set."""
+
+        script = self.__instance.register_script(COMPARE_AND_SET_SCRIPT)
+        return bool(await script(keys=[key], args=[expected, value, ttl]))
+
+    async def compare_and_delete(self, key: str, expected: Any) -> bool:
+        """Delete the key only if it holds the expected value, return true if the key was deleted."""
+
+        script = self.__instance.register_script(COMPARE_AND_DELETE_SCRIPT)
+        return bool(await script(keys=[key], args=[expected]))
+
+    async def compare_and_expire(self, key: str, expected: Any, ttl: int) -> bool:
+        """Reset the key ttl only if it holds the expected value, return true if the ttl was reset."""
+
+        script = self.__instance.register_script(COMPARE_AND_EXPIRE_SCRIPT)
+        return bool(await script(keys=[key], args=[expected, ttl]))
+
+    async def mset_with_ttl(self, mapping: Dict[str, Any]):
+        pipeline = self.__instance.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipeline.set(key, value, ex=JOB_TTL)
+        return await pipeline.execute()
+
+    async def mexpire(self, keys: List[str]):
+        pipeline = self.__instance.pipeline(transaction=False)
+        for key in keys:
+            pipeline.expire(key, JOB_TTL)
+        return await pipeline.execute()
+
     async def mget_by_prefix(self, prefix: str):
         query = '{}:*'.format(prefix)
         keys = await self.__instance.keys(query)
-        return await self.__instance.mget(keys)
+        return await self.mget(keys)
 
     async def get_by_prefix(self, prefix: str):
         query = '*:{}:*'.format(prefix)
@@ -77,10 +288,28 @@ class SrvAioRedisSingleton:
             results.append(res)
         return results
 
+    async def scan_keys(self, match: str, batch_size: int) -> AsyncIterator[List[bytes]]:
+        """Iterate over keys matching the pattern in batches, without loading the whole keyspace."""
+
+        keys = []
+        async for key in self.__instance.scan_iter(match=match, count=batch_size):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                yield keys
+                keys = []
+        if keys:
+            yield keys
+
+    async def scan_values(self, match: str, batch_size: int) -> AsyncIterator[List[bytes]]:
+        """Iterate over values of keys matching the pattern in batches, without loading the whole keyspace."""
+
+        async for keys in self.scan_keys(match, batch_size):
+            yield [value for value in await self.mget(keys) if value]
+
     async def get_by_pattern(self, key: str, pattern: str):
         query_string = '{}:*{}*'.format(key, pattern)
         keys = await self.__instance.keys(query_string)
-        return await self.__instance.mget(keys)
+        return await self.mget(keys)
 
     async def publish(self, channel, data):
         res = await self.__instance.publish(channel, data)
@@ -91,25 +320,210 @@ class SrvAioRedisSingleton:
         p.subscribe(channel)
         return p
 
-    async def file_get_status(self, file_path):
-        query = '*:{}'.format(file_path)
-        keys = await self.__instance.keys(query)
-        result = await self.__instance.mget(keys)
+    async def session_job_save(self, job_key: str, record: str, log_keys: Tuple[str, str, str, str]) -> int:
+        """Save the job record and register the change in the session change log.
+
+        Return sequence number of the change.
+        """
+
+        script = self.__instance.register_script(SAVE_SESSION_JOB_SCRIPT)
+        return await script(
+            keys=[job_key, *log_keys],
+            args=[record, int(JOB_TTL.total_seconds()), round(time.time() * 1000)],
+        )
+
+    async def session_job_replace(
+        self, job_key: str, record: str, log_keys: Tuple[str, str, str, str], expected: str
+    ) -> bool:
+        """Save the job record only if the stored one still equals the expected record.
+
+        Return false when the job was changed or removed in the meantime.
+        """
+
+        script = self.__instance.register_script(REPLACE_SESSION_JOB_SCRIPT)
+        replaced = await script(
+            keys=[job_key, *log_keys],
+            args=[record, int(JOB_TTL.total_seconds()), round(time.time() * 1000), expected],
+        )
+        return bool(replaced)
+
+    async def session_job_save_with_message(
+        self,
+        job_key: str,
+        record: str,
+        log_keys: Tuple[str, str, str, str],
+        session_id: str,
+        outbox_key: str,
+        message: str,
+    ) -> str:
+        """Save the job record and append the queue message to the session outbox in one atomic step.
+
+        The session is registered in the outbox sessions set before and after the write, so the relay can't drop it
+        while the message is being added. Return id of the outbox entry.
+        """
+
+        await self.__instance.sadd(OUTBOX_SESSIONS_KEY, session_id)
+        script = self.__instance.register_script(SAVE_SESSION_JOB_WITH_MESSAGE_SCRIPT)
+        entry_id = await script(
+            keys=[job_key, *log_keys, outbox_key],
+            args=[record, int(JOB_TTL.total_seconds()), round(time.time() * 1000), message],
+        )
+        await self.__instance.sadd(OUTBOX_SESSIONS_KEY, session_id)
+        return entry_id.decode('utf-8') if isinstance(entry_id, bytes) else entry_id
+
+    async def outbox_sessions(self) -> List[str]:
+        """Return ids of the sessions that may have messages in their outbox."""
+
+        sessions = await self.__instance.smembers(OUTBOX_SESSIONS_KEY)
+        return [session_id.decode('utf-8') for session_id in sessions]
+
+    async def outbox_read(
+        self, outbox_key: str, count: int, after: Optional[str] = None
+    ) -> List[Tuple[str, Dict[str, str]]]:
+        """Return the oldest entries of the outbox, or the oldest ones added after the entry id."""
+
+        start = '-' if after is None else '({}'.format(after)
+        entries = await self.__instance.xrange(outbox_key, min=start, count=count)
+        return [
+            (
+                entry_id.decode('utf-8'),
+                {field.decode('utf-8'): value.decode('utf-8') for field, value in fields.items()},
+            )
+            for entry_id, fields in entries
+        ]
+
+    async def outbox_ack(self, outbox_keys: Tuple[str, str], entry_ids: List[str]) -> int:
+        """Remove the delivered entries from the outbox together with their attempt counters."""
+
+        outbox_key, attempts_key = outbox_keys
+        pipeline = self.__instance.pipeline(transaction=False)
+        pipeline.xdel(outbox_key, *entry_ids)
+        pipeline.hdel(attempts_key, *entry_ids)
+        deleted, _ = await pipeline.execute()
+        return deleted
+
+    async def outbox_retry(self, outbox_keys: Tuple[str, str], entry_id: str) -> int:
+        """Register the failed delivery of the outbox entry and return the number of attempts so far."""
+
+        _, attempts_key = outbox_keys
+        pipeline = self.__instance.pipeline(transaction=False)
+        pipeline.hincrby(attempts_key, entry_id, 1)
+        pipeline.expire(attempts_key, JOB_TTL)
+        attempts, _ = await pipeline.execute()
+        return attempts
+
+    async def outbox_release(self, session_id: str, outbox_key: str) -> bool:
+        """Unregister the session with the empty outbox.
 
-        current_action = None
+        The outbox is checked again after the removal, the session is registered back when a message was added in the
+        meantime. Return true if the session was unregistered.
+        """
 
-        decoded_result = []
-        for record in result:
-            record = record.decode('utf-8')
-            info = json.loads(record)
-            decoded_result.append(info)
+        await self.__instance.srem(OUTBOX_SESSIONS_KEY, session_id)
+        if await self.__instance.xlen(outbox_key):
+            await self.__instance.sadd(OUTBOX_SESSIONS_KEY, session_id)
+            return False
+        return True
 
-        if len(decoded_result) > 0:
-            latest_item = max(decoded_result, key=lambda x: x['update_timestamp'])
+    def lock(self, name: str, timeout: float):
+        """Return the distributed lock with the name."""
+
+        return self.__instance.lock(name, timeout=timeout)
+
+    async def session_job_delete(self, job_key: str, tombstone: str, log_keys: Tuple[str, str, str, str]) -> int:
+        """Delete the job record and register the tombstone in the session change log."""
+
+        script = self.__instance.register_script(DELETE_SESSION_JOB_SCRIPT)
+        return await script(
+            keys=[job_key, *log_keys],
+            args=[
+                tombstone,
+                int(JOB_TTL.total_seconds()),
+                round(time.time() * 1000),
+                ConfigClass.TASK_TOMBSTONE_LOG_SIZE,
+            ],
+        )
+
+    async def session_job_changes(self, log_keys: Tuple[str, str, str, str], since: int) -> Dict[str, Any]:
+        """Return the change log state with the job keys and tombstones registered after the sequence number.
+
+        The log is read by a script rather than MULTI, so it stays consistent in Redis Cluster as well. Expired jobs
+        leave no tombstone, so the script drops them from the log and moves the epoch forward, which makes every reader
+        fall back to the full list.
+        """
+
+        script = self.__instance.register_script(GET_SESSION_JOB_CHANGES_SCRIPT)
+        log, changed_keys, tombstones = await script(keys=list(log_keys), args=[since, round(time.time() * 1000)])
+        records = await self.mget(changed_keys) if changed_keys else []
+        return {
+            'log': {field.decode('utf-8'): int(value) for field, value in zip(log[::2], log[1::2])},
+            'records': [record for record in records if record],
+            'tombstones': tombstones,
+        }
+
+    async def task_progress_update(
+        self, task_keys: Tuple[str, str], job_id: str, entry: Optional[Dict[str, Any]]
+    ) -> int:
+        """Apply the job entry to the task progress aggregate, no entry removes the job from the task."""
+
+        entry = entry or {}
+        script = self.__instance.register_script(UPDATE_TASK_PROGRESS_SCRIPT)
+        return await script(
+            keys=list(task_keys),
+            args=[
+                job_id,
+                entry.get('status', ''),
+                entry.get('progress', 0),
+                entry.get('finished', 0),
+                entry.get('weight', ''),
+                int(JOB_TTL.total_seconds()),
+            ],
+        )
+
+    async def task_progress_get(self, task_keys: Tuple[str, str]) -> Dict[str, str]:
+        progress = await self.__instance.hgetall(task_keys[0])
+        return {field.decode('utf-8'): value.decode('utf-8') for field, value in progress.items()}
+
+    async def sub_jobs_register(self, sub_jobs_keys: Tuple[str, str], parent_key: str, count: int):
+        """Link the aggregate of sub-jobs to the parent job record and set the expected number of sub-jobs."""
+
+        progress_key, _ = sub_jobs_keys
+        pipeline = self.__instance.pipeline(transaction=False)
+        pipeline.hset(progress_key, mapping={'parent_key': parent_key, 'sub_jobs': count})
+        pipeline.expire(progress_key, JOB_TTL)
+        return await pipeline.execute()
+
+    async def file_index_update(self, file_path: str, job_key: str, action: str, status: str, update_timestamp: str):
+        """Add the job to the file index, or remove it when the job reaches the terminal state."""
+
+        key = get_file_index_key(file_path)
+        pipeline = self.__instance.pipeline(transaction=False)
+        if status in TERMINAL_JOB_STATES:
+            pipeline.hdel(key, job_key)
+            pipeline.hset(key, LAST_TERMINAL_FIELD, update_timestamp)
+        else:
+            pipeline.hset(key, job_key, json.dumps({'action': action, 'update_timestamp': update_timestamp}))
+        pipeline.expire(key, JOB_TTL)
+        return await pipeline.execute()
+
+    async def file_index_remove(self, file_path: str, job_key: str):
+        return await self.__instance.hdel(get_file_index_key(file_path), job_key)
+
+    async def file_get_status(self, file_path):
+        index_entries = await self.__instance.hgetall(get_file_index_key(file_path))
+        return get_current_action(index_entries)
 
-            if latest_item['status'] == 'SUCCEED' or latest_item['status'] == 'TERMINATED':
-                return current_action
-            else:
-                return latest_item['action']
+    async def file_get_status_many(self, file_paths: List[str]) -> Dict[str, Optional[str]]:
+        """Return the current action for each file path, looked up with pipelined requests."""
 
-        return current_action
+        unique_paths = list(dict.fromkeys(file_paths))
+        current_actions = {}
+        for start in range(0, len(unique_paths), FILE_STATUS_BATCH_SIZE):
+            batch = unique_paths[start : start + FILE_STATUS_BATCH_SIZE]
+            pipeline = self.__instance.pipeline(transaction=False)
+            for file_path in batch:
+                pipeline.hgetall(get_file_index_key(file_path))
+            results = await pipeline.execute()
+            for file_path, index_entries in zip(batch, results):
+                current_actions[file_path] = get_current_action(index_entries)
+        return current_actions
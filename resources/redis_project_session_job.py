@@ -18,11 +18,33 @@
 # permissions and limitations under the Licence.
 # 
 
+import hashlib
 import json
 import time
+import zlib
+from fnmatch import fnmatchcase
 
+from config import ConfigClass
+from resources.redis import TERMINAL_JOB_STATES
 from resources.redis import SrvAioRedisSingleton
 
+# job statuses ordered from the worst to the best, statuses not listed here rank right after the failures
+JOB_STATUS_SEVERITY = [
+    'TERMINATED',
+    'ERROR',
+    'CANCELLED',
+    'RUNNING',
+    'ZIPPING',
+    'CHUNK_UPLOADED',
+    'PRE_UPLOADED',
+    'FINALIZED',
+    'READY_FOR_DOWNLOADING',
+    'PENDING',
+    'INIT',
+    'SUCCEED',
+]
+UNKNOWN_STATUS_SEVERITY = JOB_STATUS_SEVERITY.index('RUNNING')
+
 
 class SessionJob:
     """Session Job ORM."""
@@ -44,6 +66,7 @@ class SessionJob:
         self.status = None
         self.progress = 0
         self.payload = {}
+        self.payload_blobs = {}
 
     @classmethod
     async def load(cls, session_id, code, action, operator, job_id=None, label='Container', task_id='default_task'):
@@ -52,6 +75,8 @@ class SessionJob:
         return instance
 
     def to_dict(self):
+        """Return job metadata, payload fields stored in blobs are listed in payload_blobs only."""
+
         return {
             'session_id': self.session_id,
             'task_id': self.task_id,
@@ -63,14 +88,19 @@ class SessionJob:
             'source': self.source,
             'status': self.status,
             'progress': self.progress,
-            'payload': self.payload,
+            'payload': {key: value for key, value in self.payload.items() if key not in self.payload_blobs},
+            'payload_blobs': self.payload_blobs,
         }
 
-    async def set_job_id(self, job_id):
-        """Set job id."""
+    async def set_job_id(self, job_id, check=True):
+        """Set job id.
+
+        The lookup of an existing job scans the keyspace, it can be skipped for geids that were just allocated.
+        """
 
         self.job_id = job_id
-        await self.check_job_id()
+        if check:
+            await self.check_job_id()
 
     def set_source(self, source: str):
         """Set job source."""
@@ -92,8 +122,8 @@ class SessionJob:
 
         self.progress = progress
 
-    async def save(self):
-        """Save in redis."""
+    async def save(self, message=None):
+        """Save in redis, the queue message is written to the session outbox along with the job."""
 
         if not self.job_id:
             raise Exception('[SessionJob] job_id not provided')
@@ -101,7 +131,7 @@ class SessionJob:
             raise Exception('[SessionJob] source not provided')
         if not self.status:
             raise Exception('[SessionJob] status not provided')
-        return await session_job_set_status(
+        record = await session_job_set_status(
             self.session_id,
             self.label,
             self.task_id,
@@ -113,7 +143,11 @@ class SessionJob:
             self.operator,
             self.payload,
             self.progress,
+            self.payload_blobs,
+            message,
         )
+        self.payload_blobs = record['payload_blobs']
+        return record
 
     async def read(self):
         """Read from redis."""
@@ -127,6 +161,7 @@ class SessionJob:
         self.status = job_read['status']
         self.progress = job_read['progress']
         self.payload = job_read['payload']
+        self.payload_blobs = job_read.get('payload_blobs', {})
         self.task_id = job_read['task_id']
         self.action = job_read['action']
         self.operator = job_read['operator']
@@ -142,12 +177,214 @@ class SessionJob:
             raise Exception('[SessionJob] job id already exists: {}'.format(self.job_id))
 
 
+def get_session_job_key(session_id, label, job_id, action, code, operator, source=None):
+    """Return the session job key, or the key prefix when source is not provided.
+
+    Session id is wrapped into a hash tag, so all jobs of one session are stored in the same slot of the Redis Cluster.
+    """
+
+    key = 'dataaction:{{{}}}:{}:{}:{}:{}:{}'.format(session_id, label, job_id, action, code, operator)
+    if source is None:
+        return key
+    return '{}:{}'.format(key, source)
+
+
+def get_session_log_keys(session_id):
+    """Return keys of the session change log and of the job expiry times.
+
+    They share the hash tag with the session jobs.
+    """
+
+    return (
+        'dataaction-log:{{{}}}'.format(session_id),
+        'dataaction-changes:{{{}}}'.format(session_id),
+        'dataaction-tombstones:{{{}}}'.format(session_id),
+        'dataaction-expiry:{{{}}}'.format(session_id),
+    )
+
+
+def get_outbox_keys(session_id):
+    """Return keys of the session outbox with queue messages and of the delivery attempt counters.
+
+    Outbox shares the hash tag with the session jobs, so the job and its message are written by one script.
+    """
+
+    return (
+        'dataaction-outbox:{{{}}}'.format(session_id),
+        'dataaction-outbox-attempts:{{{}}}'.format(session_id),
+    )
+
+
+def get_task_progress_keys(session_id, task_id):
+    """Return keys of the task progress aggregate and of the task job entries."""
+
+    return (
+        'dataaction-task:{{{}}}:{}'.format(session_id, task_id),
+        'dataaction-task-jobs:{{{}}}:{}'.format(session_id, task_id),
+    )
+
+
+def get_sub_jobs_progress_keys(session_id, parent_job_id):
+    """Return keys of the aggregate of sub-jobs that share the parent job and of the sub-job entries."""
+
+    return (
+        'dataaction-sub-jobs:{{{}}}:{}'.format(session_id, parent_job_id),
+        'dataaction-sub-jobs-entries:{{{}}}:{}'.format(session_id, parent_job_id),
+    )
+
+
+def get_progress_summary(aggregate):
+    """Return job count, progress and statuses from the progress aggregate."""
+
+    statuses = {
+        field.split(':', 1)[1]: int(value)
+        for field, value in aggregate.items()
+        if field.startswith('status:') and int(value) > 0
+    }
+    weight = int(aggregate.get('weight', 0))
+    return {
+        'job_count': int(aggregate.get('jobs', 0)),
+        'finished_count': int(aggregate.get('finished', 0)),
+        'progress': round(float(aggregate.get('weighted_progress', 0)) / weight, 2) if weight else 0,
+        'worst_status': get_worst_status(statuses),
+        'statuses': statuses,
+    }
+
+
+def get_task_progress_entry(status, progress, payload):
+    """Return the job entry of the task progress aggregate.
+
+    Jobs are weighted by the number of their targets. Weight is left out when the payload doesn't have targets, so the
+    aggregate keeps the previous one.
+    """
+
+    entry = {
+        'status': status,
+        'progress': 100 if status == 'SUCCEED' else progress,
+        'finished': int(status in TERMINAL_JOB_STATES),
+    }
+    if payload and isinstance(payload.get('targets'), list):
+        entry['weight'] = max(len(payload['targets']), 1)
+    return entry
+
+
+def get_worst_status(statuses):
+    """Return the worst status from the list of job statuses."""
+
+    def get_severity(status):
+        if status in JOB_STATUS_SEVERITY:
+            return JOB_STATUS_SEVERITY.index(status)
+        return UNKNOWN_STATUS_SEVERITY - 0.5
+
+    return min(statuses, key=get_severity, default=None)
+
+
+def parse_task_cursor(cursor):
+    """Convert the task list cursor into a tuple of change log epoch and sequence number.
+
+    Raise ValueError if the cursor is malformed.
+    """
+
+    epoch, _, seq = cursor.partition('-')
+    return int(epoch), int(seq)
+
+
+def match_job(job, **patterns):
+    """Check if job fields match glob patterns the same way Redis key patterns do."""
+
+    return all(fnmatchcase(str(job.get(field)), pattern) for field, pattern in patterns.items())
+
+
+def get_payload_blob_key(digest):
+    """Return the key of the compressed payload field, blobs are addressed by content, so equal values are shared."""
+
+    return 'dataaction-blob:{}'.format(digest)
+
+
+async def offload_payload(payload, payload_blobs=None):
+    """Move large payload fields into compressed blobs.
+
+    Return inline payload and the mapping from offloaded field names to blob digests. Fields offloaded earlier and
+    missing in the payload keep their blobs.
+    """
+
+    if payload is None:
+        return None, dict(payload_blobs or {})
+
+    inline = {}
+    blobs = dict(payload_blobs or {})
+    to_store = {}
+    for key, value in payload.items():
+        serialized = json.dumps(value).encode('utf-8')
+        if len(serialized) < ConfigClass.TASK_PAYLOAD_BLOB_THRESHOLD:
+            inline[key] = value
+            blobs.pop(key, None)
+            continue
+        digest = hashlib.sha256(serialized).hexdigest()
+        blobs[key] = digest
+        to_store[get_payload_blob_key(digest)] = zlib.compress(serialized)
+
+    srv_redis = SrvAioRedisSingleton()
+    if to_store:
+        await srv_redis.mset_with_ttl(to_store)
+    # blobs kept from the previous save must live as long as the job record
+    retained = [get_payload_blob_key(digest) for digest in blobs.values()]
+    retained = [key for key in retained if key not in to_store]
+    if retained:
+        await srv_redis.mexpire(retained)
+    return inline, blobs
+
+
+async def session_job_load_payload(records):
+    """Restore payload fields stored in blobs for the list of job records in place."""
+
+    digests = list({digest for record in records for digest in record.get('payload_blobs', {}).values()})
+    if not digests:
+        return records
+
+    srv_redis = SrvAioRedisSingleton()
+    blobs = await srv_redis.mget([get_payload_blob_key(digest) for digest in digests])
+    values = {
+        digest: json.loads(zlib.decompress(blob).decode('utf-8')) for digest, blob in zip(digests, blobs) if blob
+    }
+    for record in records:
+        if record['payload'] is None:
+            record['payload'] = {}
+        for key, digest in record.get('payload_blobs', {}).items():
+            if digest in values:
+                record['payload'][key] = values[digest]
+    return records
+
+
 async def session_job_set_status(
-    session_id, label, task_id, job_id, source, action, target_status, code, operator, payload=None, progress=0
+    session_id,
+    label,
+    task_id,
+    job_id,
+    source,
+    action,
+    target_status,
+    code,
+    operator,
+    payload=None,
+    progress=0,
+    payload_blobs=None,
+    message=None,
 ):
-    """Set session job status."""
+    """Set session job status.
+
+    When the queue message is provided, it is added to the session outbox atomically with the job record and
+    published later by the outbox relay.
+
+    Parent jobs with the sub_jobs payload field are left out of the task progress, their sub-jobs are counted
+    instead. Saving a sub-job with the parent_job_id payload field refreshes the parent job.
+    """
     srv_redis = SrvAioRedisSingleton()
-    my_key = 'dataaction:{}:{}:{}:{}:{}:{}:{}'.format(session_id, label, job_id, action, code, operator, source)
+    progress_entry = get_task_progress_entry(target_status, progress, payload)
+    sub_jobs = (payload or {}).get('sub_jobs')
+    parent_job_id = (payload or {}).get('parent_job_id')
+    payload, payload_blobs = await offload_payload(payload, payload_blobs)
+    my_key = get_session_job_key(session_id, label, job_id, action, code, operator, source)
     record = {
         'session_id': session_id,
         'label': label,
@@ -160,22 +397,192 @@ async def session_job_set_status(
         'operator': operator,
         'progress': progress,
         'payload': payload,
+        'payload_blobs': payload_blobs,
         'update_timestamp': str(round(time.time())),
     }
     my_value = json.dumps(record)
-    await srv_redis.set_by_key(my_key, my_value)
+    if message is None:
+        await srv_redis.session_job_save(my_key, my_value, get_session_log_keys(session_id))
+    else:
+        outbox_key, _ = get_outbox_keys(session_id)
+        await srv_redis.session_job_save_with_message(
+            my_key, my_value, get_session_log_keys(session_id), session_id, outbox_key, json.dumps(message)
+        )
+    is_parent = sub_jobs is not None or 'sub_jobs' in payload_blobs
+    await srv_redis.task_progress_update(
+        get_task_progress_keys(session_id, task_id), job_id, None if is_parent else progress_entry
+    )
+    await srv_redis.file_index_update(source, my_key, action, target_status, record['update_timestamp'])
+    if sub_jobs is not None:
+        await srv_redis.sub_jobs_register(get_sub_jobs_progress_keys(session_id, job_id), my_key, len(sub_jobs))
+    if parent_job_id:
+        await srv_redis.task_progress_update(
+            get_sub_jobs_progress_keys(session_id, parent_job_id), job_id, progress_entry
+        )
+        await session_job_refresh_parent(session_id, parent_job_id)
+    return record
+
+
+async def session_task_get_progress(session_id, task_id):
+    """Return aggregated progress of all jobs of the task."""
+
+    srv_redis = SrvAioRedisSingleton()
+    aggregate = await srv_redis.task_progress_get(get_task_progress_keys(session_id, task_id))
+    return {'session_id': session_id, 'task_id': task_id, **get_progress_summary(aggregate)}
+
+
+async def session_job_refresh_parent(session_id, parent_job_id):
+    """Update status and progress of the parent job from the aggregate of its sub-jobs.
+
+    The parent stays RUNNING until all sub-jobs finish and then takes the worst of their statuses. The parent record is
+    replaced only if nobody changed it since it was read, otherwise the aggregate is read again. So concurrent sub-job
+    updates can't overwrite the parent with the state computed from an older aggregate, and a finished parent is
+    never moved back.
+    """
+
+    srv_redis = SrvAioRedisSingleton()
+    sub_jobs_keys = get_sub_jobs_progress_keys(session_id, parent_job_id)
+    while True:
+        aggregate = await srv_redis.task_progress_get(sub_jobs_keys)
+        if 'parent_key' not in aggregate:
+            return None
+        parent_key = aggregate['parent_key']
+        current = await srv_redis.get_by_key(parent_key)
+        if not current:
+            return None
+
+        record = json.loads(current)
+        summary = get_progress_summary(aggregate)
+        status = 'RUNNING'
+        if summary['finished_count'] >= int(aggregate['sub_jobs']):
+            status = summary['worst_status']
+        progress = round(summary['progress'])
+        if record['status'] in TERMINAL_JOB_STATES and status not in TERMINAL_JOB_STATES:
+            return record
+        if (record['status'], record['progress']) == (status, progress):
+            return record
+
+        record.update({'status': status, 'progress': progress, 'update_timestamp': str(round(time.time()))})
+        replaced = await srv_redis.session_job_replace(
+            parent_key, json.dumps(record), get_session_log_keys(session_id), current
+        )
+        if replaced:
+            break
+
+    # blobs of the parent payload must live as long as the job record
+    blobs = [get_payload_blob_key(digest) for digest in record['payload_blobs'].values()]
+    if blobs:
+        await srv_redis.mexpire(blobs)
+    # intermediate updates keep the parent RUNNING, so the file index changes only when the parent finishes
+    if status in TERMINAL_JOB_STATES:
+        await srv_redis.file_index_update(
+            record['source'], parent_key, record['action'], status, record['update_timestamp']
+        )
     return record
 
 
 async def session_job_get_status(session_id, label='Container', job_id='*', code='*', action='*', operator='*'):
     srv_redis = SrvAioRedisSingleton()
-    my_key = 'dataaction:{}:{}:{}:{}:{}:{}'.format(session_id, label, job_id, action, code, operator)
+    my_key = get_session_job_key(session_id, label, job_id, action, code, operator)
     res_binary = await srv_redis.mget_by_prefix(my_key)
     return [json.loads(record.decode('utf-8')) for record in res_binary] if res_binary else []
 
 
+async def session_job_get_changes(
+    session_id, cursor, label='Container', job_id='*', code='*', action='*', operator='*'
+):
+    """Return session jobs created, updated or deleted after the cursor along with the new cursor.
+
+    If the changes since the cursor are no longer in the change log, or some jobs expired in the meantime, all matching
+    jobs are returned and full_sync is set, so the client replaces its list instead of applying the delta.
+    """
+
+    epoch, since = parse_task_cursor(cursor)
+    srv_redis = SrvAioRedisSingleton()
+    changes = await srv_redis.session_job_changes(get_session_log_keys(session_id), since)
+    log = changes['log']
+    patterns = {'label': label, 'job_id': job_id, 'code': code, 'action': action, 'operator': operator}
+    result = {
+        'cursor': '{}-{}'.format(log.get('epoch', 0), log.get('seq', 0)),
+        'full_sync': False,
+        'updated': [],
+        'deleted': [],
+    }
+
+    if epoch != log.get('epoch') or since < log.get('floor', 0):
+        result['full_sync'] = True
+        result['updated'] = await session_job_get_status(session_id, label, job_id, code, action, operator)
+        return result
+
+    for record in changes['records']:
+        job = json.loads(record.decode('utf-8'))
+        if match_job(job, **patterns):
+            result['updated'].append(job)
+    for tombstone in changes['tombstones']:
+        job = json.loads(tombstone.decode('utf-8'))
+        if match_job(job, **patterns):
+            result['deleted'].append(job)
+    return result
+
+
+async def session_job_export(
+    session_id='*',
+    label='Container',
+    code='*',
+    action='*',
+    operator='*',
+    start_timestamp=None,
+    end_timestamp=None,
+    include_payload=False,
+):
+    """Iterate over all jobs matching the filters and updated within the time range.
+
+    Jobs are read in batches of TASK_EXPORT_BATCH_SIZE with SCAN, so memory stays bounded. As with SCAN, a job updated
+    while the export is running may be yielded twice.
+    """
+
+    srv_redis = SrvAioRedisSingleton()
+    match = '{}:*'.format(get_session_job_key(session_id, label, '*', action, code, operator))
+    async for batch in srv_redis.scan_values(match, ConfigClass.TASK_EXPORT_BATCH_SIZE):
+        records = []
+        for value in batch:
+            record = json.loads(value.decode('utf-8'))
+            update_timestamp = int(record['update_timestamp'])
+            if start_timestamp is not None and update_timestamp < start_timestamp:
+                continue
+            if end_timestamp is not None and update_timestamp > end_timestamp:
+                continue
+            records.append(record)
+        if include_payload:
+            await session_job_load_payload(records)
+        for record in records:
+            yield record
+
+
 async def session_job_delete_status(session_id, label='Container', job_id='*', code='*', action='*', operator='*'):
     srv_redis = SrvAioRedisSingleton()
-    my_key = 'dataaction:{}:{}:{}:{}:{}:{}'.format(session_id, label, job_id, action, code, operator)
-    res_binary_list = await srv_redis.mdele_by_prefix(my_key)
+    deleted = await session_job_get_status(session_id, label, job_id, code, action, operator)
+    res_binary_list = []
+    for record in deleted:
+        job_key = get_session_job_key(
+            record['session_id'],
+            record['label'],
+            record['job_id'],
+            record['action'],
+            record['code'],
+            record['operator'],
+            record['source'],
+        )
+        tombstone = {
+            field: record[field]
+            for field in ['session_id', 'label', 'task_id', 'job_id', 'action', 'code', 'operator', 'source']
+        }
+        res = await srv_redis.session_job_delete(
+            job_key, json.dumps(tombstone, sort_keys=True), get_session_log_keys(record['session_id'])
+        )
+        res_binary_list.append(res)
+        await srv_redis.task_progress_update(
+            get_task_progress_keys(record['session_id'], record['task_id']), record['job_id'], None
+        )
+        await srv_redis.file_index_remove(record['source'], job_key)
     return res_binary_list
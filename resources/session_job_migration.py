@@ -0,0 +1,91 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+import json
+
+from logger import LoggerFactory
+
+from config import ConfigClass
+from resources.redis import SrvAioRedisSingleton
+from resources.redis_project_session_job import get_session_job_key
+from resources.redis_project_session_job import get_session_log_keys
+from resources.redis_project_session_job import get_task_progress_entry
+from resources.redis_project_session_job import get_task_progress_keys
+
+_logger = LoggerFactory('session_job_migration').get_logger()
+
+# job keys saved before the session id was wrapped into a hash tag, 'dataaction:<session_id>:...'
+LEGACY_SESSION_JOB_MATCH = 'dataaction:[^{]*'
+
+
+async def migrate_legacy_session_job(srv_redis: SrvAioRedisSingleton, legacy_key: bytes, value: bytes) -> None:
+    """Save the legacy job record under the current key and remove the legacy key.
+
+    The record is registered in the session change log, the task progress and the file index like a newly saved
+    job, its update timestamp is kept.
+    """
+
+    record = json.loads(value.decode('utf-8'))
+    session_id = record['session_id']
+    job_key = get_session_job_key(
+        session_id,
+        record['label'],
+        record['job_id'],
+        record['action'],
+        record['code'],
+        record['operator'],
+        record['source'],
+    )
+    progress_entry = get_task_progress_entry(record['status'], record['progress'], record['payload'])
+    await srv_redis.session_job_save(job_key, value.decode('utf-8'), get_session_log_keys(session_id))
+    await srv_redis.task_progress_update(
+        get_task_progress_keys(session_id, record['task_id']), record['job_id'], progress_entry
+    )
+    await srv_redis.file_index_update(
+        record['source'], job_key, record['action'], record['status'], record['update_timestamp']
+    )
+    await srv_redis.delete_by_key(legacy_key)
+
+
+async def migrate_legacy_session_jobs() -> int:
+    """Move job records from the keys without the session hash tag to the current keys.
+
+    Readers only look up the current keys, so jobs saved before the upgrade stay invisible until they expire unless
+    this is run once after the deploy. Moved records get a fresh JOB_TTL. Return the number of moved jobs.
+    """
+
+    srv_redis = SrvAioRedisSingleton()
+    migrated = 0
+    async for keys in srv_redis.scan_keys(LEGACY_SESSION_JOB_MATCH, ConfigClass.TASK_EXPORT_BATCH_SIZE):
+        values = await srv_redis.mget(keys)
+        for legacy_key, value in zip(keys, values):
+            # expired or moved by another run in the meantime
+            if value is None:
+                continue
+            await migrate_legacy_session_job(srv_redis, legacy_key, value)
+            migrated += 1
+    _logger.info(f'Moved {migrated} session jobs to hash tagged keys')
+    return migrated
+
+
+if __name__ == '__main__':
+    asyncio.run(migrate_legacy_session_jobs())
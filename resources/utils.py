@@ -21,7 +21,8 @@
 import re
 import time
 from config import ConfigClass
-import httpx
+from dependencies import DownstreamService
+from dependencies import http_clients
 from models.base_models import APIResponse
 from models.base_models import EAPIResponseCode
 from logger import LoggerFactory
@@ -73,8 +74,8 @@ async def http_update_node(primary_label, neo4j_id, update_json):
     # update neo4j node
     update_url = ConfigClass.NEO4J_SERVICE + \
                  "nodes/{}/node/{}".format(primary_label, neo4j_id)
-    async with httpx.AsyncClient() as client:
-        res = await client.put(url=update_url, json=update_json)
+    client = http_clients.get(DownstreamService.NEO4J)
+    res = await client.put(url=update_url, json=update_json)
     return res
 
 
@@ -87,9 +88,9 @@ async def update_elastic_search_entity(geid, taglist, tag_type):
             "time_lastmodified": time.time()
         }
     }
-    async with httpx.AsyncClient() as client:
-        es_res = await client.put(ConfigClass.PROVENANCE_SERVICE +
-                            'entity/file', json=es_payload)
+    client = http_clients.get(DownstreamService.PROVENANCE)
+    es_res = await client.put(ConfigClass.PROVENANCE_SERVICE +
+                              'entity/file', json=es_payload)
     if es_res.status_code != 200:
         _logger.error(
             f"Error while attaching tags to file in es update:{es_res.json()}")
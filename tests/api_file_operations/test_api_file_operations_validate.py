@@ -0,0 +1,63 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import json
+
+from api.api_file_operations.api_file_operations_validate import FileOperationsValidate
+
+
+class FakeValidator:
+    def __init__(self, batches, error=None):
+        self.batches = batches
+        self.error = error
+
+    async def iter_validations(self, to_validate, folders):
+        for batch in self.batches:
+            yield batch
+        if self.error:
+            raise self.error
+
+
+async def collect(lines):
+    return [json.loads(line) async for line in lines]
+
+
+class TestStreamValidations:
+    async def test_stream_ends_with_complete_record(self):
+        validator = FakeValidator([[{'full_path': 'a'}], [{'full_path': 'b'}]])
+
+        records = await collect(FileOperationsValidate().stream_validations(validator, [], []))
+
+        assert records == [{'full_path': 'a'}, {'full_path': 'b'}, {'status': 'complete'}]
+
+    async def test_stream_ends_with_error_record_on_failure(self):
+        validator = FakeValidator([[{'full_path': 'a'}]], error=Exception('redis down'))
+
+        records = await collect(FileOperationsValidate().stream_validations(validator, [], []))
+
+        assert records[0] == {'full_path': 'a'}
+        assert records[-1]['status'] == 'error'
+        assert 'redis down' in records[-1]['error']
+        assert {'status': 'complete'} not in records
+
+    async def test_buffered_results_end_with_complete_record(self):
+        records = await collect(FileOperationsValidate().stream_results([{'full_path': 'a'}]))
+
+        assert records == [{'full_path': 'a'}, {'status': 'complete'}]
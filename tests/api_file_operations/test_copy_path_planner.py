@@ -0,0 +1,82 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import pytest
+
+from api.api_file_operations.copy_path_planner import CopyPathPlanner
+from resources import helpers
+
+
+def create_file(geid, path, **kwds):
+    return {
+        'global_entity_id': geid,
+        'labels': ['File', 'Core'],
+        'location': f'minio://minio.local/core-project/{path}',
+        **kwds,
+    }
+
+
+@pytest.fixture(autouse=True)
+def folder_tree(monkeypatch):
+    tree = {
+        'source': [
+            create_file('file-1', 'admin/source/file-1.txt'),
+            {'global_entity_id': 'nested', 'name': 'nested', 'labels': ['Folder']},
+        ],
+        'nested': [
+            {'global_entity_id': 'deep', 'name': 'deep', 'labels': ['Folder']},
+        ],
+        'deep': [
+            create_file('file-2', 'admin/source/nested/deep/file-2.txt'),
+        ],
+    }
+
+    async def get_folder_children(folder_geid):
+        return tree[folder_geid]
+
+    monkeypatch.setattr(helpers, 'get_folder_children', get_folder_children)
+    yield tree
+
+
+class TestCopyPathPlanner:
+    async def test_get_folder_files_sets_relative_paths(self):
+        files = await CopyPathPlanner().get_folder_files('source', 'renamed')
+
+        relative_paths = {file['global_entity_id']: file['ouput_relative_path'] for file in files}
+        assert relative_paths == {'file-1': 'renamed/', 'file-2': 'renamed/nested/deep'}
+
+    async def test_plan_file_sets_output_path_inside_destination_folder(self):
+        destination = {'resource_type': 'Folder', 'folder_relative_path': 'admin', 'name': 'target'}
+        planner = CopyPathPlanner(destination)
+        files = await planner.get_folder_files('source', 'source')
+
+        planned = {file['global_entity_id']: planner.plan_file(file) for file in files}
+
+        assert planned['file-2']['input_path'] == 'admin/source/nested/deep/file-2.txt'
+        assert planned['file-2']['output_path'] == 'admin/target/source/nested/deep/file-2.txt'
+
+    async def test_plan_file_uses_rename_of_file(self):
+        planner = CopyPathPlanner()
+        file = create_file('file-1', 'admin/file-1.txt', rename='copy.txt')
+
+        planner.plan_file(file)
+
+        assert file['output_path'] == 'admin/copy.txt'
@@ -18,6 +18,9 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
+import itertools
+import logging
 import random
 import time
 import uuid
@@ -26,9 +29,17 @@ from typing import Callable
 
 import pytest
 
+from api.api_file_operations import dispatcher
+from api.api_file_operations.dispatcher import BaseDispatcher
 from api.api_file_operations.dispatcher import Node
 from api.api_file_operations.dispatcher import NodeList
+from api.api_file_operations.dispatcher import PreflightError
 from api.api_file_operations.dispatcher import ResourceType
+from config import ConfigClass
+from models.base_models import EAPIResponseCode
+from resources.redis import SrvAioRedisSingleton
+from resources.redis_project_session_job import SessionJob
+from resources.redis_project_session_job import session_task_get_progress
 
 
 def get_timestamp() -> int:
@@ -115,3 +126,168 @@ class TestNodeList:
         sources = NodeList([create_node(resource_type=ResourceType.FOLDER), expected_node])
 
         assert sources.filter_files() == [expected_node]
+
+
+class FakeDispatcher(BaseDispatcher):
+    def __init__(self, invalid_folders=(), targets_error=None):
+        self.invalid_folders = invalid_folders
+        self.targets_error = targets_error
+
+    async def is_valid_folder_node(self, geid):
+        return geid not in self.invalid_folders
+
+    async def validate_targets(self, targets):
+        if self.targets_error:
+            raise self.targets_error
+        return NodeList(targets)
+
+
+class TestBaseDispatcher:
+    @pytest.fixture(autouse=True)
+    def project(self, monkeypatch):
+        project = {'code': 'project'}
+
+        async def validate_project(project_geid):
+            if project_geid == 'invalid':
+                return EAPIResponseCode.bad_request, 'Project not found'
+            return EAPIResponseCode.success, project
+
+        monkeypatch.setattr(dispatcher, 'validate_project', validate_project)
+        yield project
+
+    async def test_preflight_returns_project_info_and_targets(self, project, create_node):
+        node = create_node()
+
+        project_info, targets = await FakeDispatcher().preflight('geid', {'source': 'source'}, [node])
+
+        assert project_info == project
+        assert targets == [node]
+
+    async def test_preflight_reports_project_failure_first(self):
+        with pytest.raises(PreflightError) as exc_info:
+            await FakeDispatcher(invalid_folders=['source'], targets_error=ValueError('invalid')).preflight(
+                'invalid', {'source': 'source'}, []
+            )
+
+        assert exc_info.value.code == EAPIResponseCode.bad_request
+        assert exc_info.value.message == 'Project not found'
+
+    async def test_preflight_reports_folders_in_order(self):
+        folders = {'source': 'source', 'destination': 'destination'}
+
+        with pytest.raises(PreflightError) as exc_info:
+            await FakeDispatcher(invalid_folders=['source', 'destination']).preflight('geid', folders, [])
+
+        assert exc_info.value.message == 'Invalid source: source'
+
+    async def test_preflight_reports_invalid_targets_as_bad_request(self):
+        with pytest.raises(PreflightError) as exc_info:
+            await FakeDispatcher(targets_error=ValueError('Not found resource: geid')).preflight('geid', {}, [])
+
+        assert exc_info.value.code == EAPIResponseCode.bad_request
+        assert exc_info.value.message == 'Not found resource: geid'
+
+
+@pytest.mark.usefixtures('shared_redis')
+class TestSubmitJobs:
+    @pytest.fixture(autouse=True)
+    def geids(self, monkeypatch):
+        counter = itertools.count()
+
+        async def allocate_geid():
+            return f'geid-{next(counter)}'
+
+        monkeypatch.setattr(dispatcher, 'allocate_geid', allocate_geid)
+        monkeypatch.setattr(ConfigClass, 'FILE_OPERATION_SHARD_SIZE', 2)
+
+    def create_job(self, nodes):
+        session_job = SessionJob('session', 'project', 'data_delete', 'admin')
+        session_job.set_source(', '.join(nodes.names))
+        session_job.set_status('RUNNING')
+        session_job.add_payload('targets', [node.geid for node in nodes])
+        return session_job
+
+    def get_message(self, job_id, nodes):
+        return {'job_id': job_id, 'include_geids': [node.geid for node in nodes]}
+
+    async def test_small_operation_creates_one_job(self, create_node):
+        targets = NodeList([create_node(), create_node()])
+
+        jobs = await FakeDispatcher().submit_jobs(logging.getLogger(), targets, self.create_job, self.get_message)
+
+        assert len(jobs) == 1
+        assert jobs[0]['payload']['targets'] == [node.geid for node in targets]
+
+    async def test_large_operation_is_split_into_sub_jobs(self, create_node):
+        targets = NodeList([create_node() for _ in range(5)])
+
+        parent, *sub_jobs = await FakeDispatcher().submit_jobs(
+            logging.getLogger(), targets, self.create_job, self.get_message
+        )
+
+        assert parent['source'] == ', '.join(targets.names[:3]) + ' and 2 more'
+        assert 'targets' not in parent['payload']
+        assert parent['payload']['sub_jobs'] == [sub_job['job_id'] for sub_job in sub_jobs]
+        assert [len(sub_job['payload']['targets']) for sub_job in sub_jobs] == [2, 2, 1]
+        assert all(sub_job['payload']['parent_job_id'] == parent['job_id'] for sub_job in sub_jobs)
+
+    async def test_allocated_job_ids_are_not_looked_up(self, monkeypatch, create_node):
+        async def check_job_id(session_job):
+            raise AssertionError('job id lookup scans the keyspace')
+
+        monkeypatch.setattr(SessionJob, 'check_job_id', check_job_id)
+        targets = NodeList([create_node() for _ in range(3)])
+
+        jobs = await FakeDispatcher().submit_jobs(logging.getLogger(), targets, self.create_job, self.get_message)
+
+        assert [job['status'] for job in jobs] == ['RUNNING', 'RUNNING', 'RUNNING']
+
+    async def test_parent_job_follows_sub_jobs(self, create_node):
+        targets = NodeList([create_node() for _ in range(3)])
+        parent, *sub_jobs = await FakeDispatcher().submit_jobs(
+            logging.getLogger(), targets, self.create_job, self.get_message
+        )
+
+        for sub_job, status in zip(sub_jobs, ['SUCCEED', 'TERMINATED']):
+            session_job = await SessionJob.load('session', '*', '*', '*', job_id=sub_job['job_id'])
+            session_job.set_status(status)
+            await session_job.save()
+
+        parent_job = await SessionJob.load('session', '*', '*', '*', job_id=parent['job_id'])
+        progress = await session_task_get_progress('session', 'default_task')
+        assert parent_job.status == 'TERMINATED'
+        assert progress['job_count'] == 2
+
+    async def test_parent_job_is_not_moved_back_by_concurrent_sub_job(self, monkeypatch, create_node):
+        targets = NodeList([create_node() for _ in range(4)])
+        parent, *sub_jobs = await FakeDispatcher().submit_jobs(
+            logging.getLogger(), targets, self.create_job, self.get_message
+        )
+        paused = asyncio.Event()
+        resume = asyncio.Event()
+        get_by_key = SrvAioRedisSingleton.get_by_key
+
+        async def get_by_key_paused(self, key):
+            value = await get_by_key(self, key)
+            if not paused.is_set():
+                paused.set()
+                await resume.wait()
+            return value
+
+        monkeypatch.setattr(SrvAioRedisSingleton, 'get_by_key', get_by_key_paused)
+        first, second = [
+            await SessionJob.load('session', '*', '*', '*', job_id=sub_job['job_id']) for sub_job in sub_jobs
+        ]
+        first.set_status('SUCCEED')
+        second.set_status('SUCCEED')
+
+        # the first refresh reads the parent before the second sub-job finishes and writes after it
+        first_save = asyncio.ensure_future(first.save())
+        await paused.wait()
+        await second.save()
+        resume.set()
+        await first_save
+
+        parent_job = await SessionJob.load('session', '*', '*', '*', job_id=parent['job_id'])
+        assert parent_job.status == 'SUCCEED'
+        assert parent_job.progress == 100
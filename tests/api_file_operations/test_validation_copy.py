@@ -0,0 +1,139 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import pytest
+
+from api.api_file_operations import validation_copy
+from api.api_file_operations.validation_copy import copy_validation
+from api.api_file_operations.validation_copy import get_copy_destination_prefix
+
+
+class FakeSrvRedis:
+    def __init__(self, current_actions):
+        self.current_actions = current_actions
+
+    async def file_get_status_many(self, file_paths):
+        return {file_path: self.current_actions.get(file_path) for file_path in file_paths}
+
+
+@pytest.fixture
+def destination_lookups(monkeypatch):
+    lookups = []
+
+    async def get_resource_bygeid(geid):
+        lookups.append(geid)
+        return {
+            'global_entity_id': geid,
+            'name': 'target',
+            'folder_relative_path': 'admin',
+            'labels': ['Folder', 'Core'],
+        }
+
+    monkeypatch.setattr(validation_copy, 'get_resource_bygeid', get_resource_bygeid)
+    yield lookups
+
+
+@pytest.fixture
+def existing_locations(monkeypatch):
+    existing = {}
+
+    async def find_repeated_files(zone, project_code, locations):
+        return {location: existing[location] for location in locations if location in existing}
+
+    monkeypatch.setattr(validation_copy, 'find_repeated_files', find_repeated_files)
+    yield existing
+
+
+def create_entry(geid, name, **kwds):
+    return {
+        'geid': geid,
+        'full_path': f'gr-project/admin/{name}',
+        'location': f'minio://minio.local/gr-project/admin/{name}',
+        'copy_name': name,
+        **kwds,
+    }
+
+
+async def test_copy_validation_fetches_destination_once(destination_lookups, existing_locations):
+    to_validate = [create_entry('a', 'a.txt'), create_entry('b', 'b.txt')]
+
+    validations = await copy_validation('project', to_validate, 'dest', 'copy', FakeSrvRedis({}))
+
+    assert destination_lookups == ['dest']
+    assert [v['full_path'] for v in validations] == [
+        'gr-project/admin/a.txt',
+        'core-project/admin/target/a.txt',
+        'gr-project/admin/b.txt',
+        'core-project/admin/target/b.txt',
+    ]
+
+
+async def test_copy_validation_reports_existing_destination(destination_lookups, existing_locations):
+    existing_locations['minio://minio.local/core-project/admin/target/folder/nested/a.txt'] = {
+        'global_entity_id': 'found',
+        'name': 'a.txt',
+    }
+    entry = create_entry(
+        'folder',
+        'a.txt',
+        source_folder='folder',
+        source_folder_rename='folder',
+        path_relative_to_source_path='nested',
+    )
+
+    validations = await copy_validation('project', [entry], 'dest', 'copy', FakeSrvRedis({}))
+
+    assert validations[0]['error'] == 'entity-exist'
+    assert validations[0]['found'] == 'found'
+    assert validations[1]['is_valid'] is True
+
+
+async def test_copy_validation_blocks_files_with_current_action(destination_lookups, existing_locations):
+    srv_redis = FakeSrvRedis({'gr-project/admin/a.txt': 'data_upload'})
+
+    validations = await copy_validation('project', [create_entry('a', 'a.txt')], 'dest', 'copy', srv_redis)
+
+    assert validations[0]['full_path'] == 'gr-project/admin/a.txt'
+    assert validations[0]['error'] == 'operation-block'
+
+
+async def test_copy_destination_prefix_is_destination_folder(destination_lookups):
+    assert await get_copy_destination_prefix('project', 'dest') == 'core-project/admin/target'
+
+
+@pytest.mark.parametrize('destination_geid', [None, 'project'])
+async def test_copy_destination_prefix_is_project_root_without_folder(monkeypatch, destination_geid):
+    async def get_resource_bygeid(geid):
+        return {'global_entity_id': geid, 'code': 'project', 'labels': ['Container']}
+
+    monkeypatch.setattr(validation_copy, 'get_resource_bygeid', get_resource_bygeid)
+
+    assert await get_copy_destination_prefix('project', destination_geid) == 'core-project'
+
+
+async def test_copy_destination_must_be_folder_or_project(monkeypatch):
+    async def get_resource_bygeid(geid):
+        return {'global_entity_id': geid, 'labels': ['File', 'Core']}
+
+    monkeypatch.setattr(validation_copy, 'get_resource_bygeid', get_resource_bygeid)
+
+    with pytest.raises(Exception, match='Invalid destination'):
+        await get_copy_destination_prefix('project', 'file')
@@ -0,0 +1,81 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import pytest
+
+from api.api_file_operations import validation_engine
+from api.api_file_operations.validation_engine import FileOperationValidator
+from api.api_file_operations.validation_engine import InvalidTargetError
+
+
+class FakeSrvRedis:
+    def __init__(self, current_actions):
+        self.current_actions = current_actions
+        self.requested = []
+
+    async def file_get_status_many(self, file_paths):
+        self.requested.append(file_paths)
+        return {file_path: self.current_actions.get(file_path) for file_path in file_paths}
+
+
+@pytest.fixture
+def nodes(monkeypatch):
+    nodes = {
+        'file': {
+            'global_entity_id': 'file',
+            'name': 'file.txt',
+            'labels': ['File', 'Greenroom'],
+            'location': 'minio://minio.local/gr-project/admin/file.txt',
+        },
+        'project': {'global_entity_id': 'project', 'name': 'project', 'labels': ['Container']},
+    }
+
+    async def get_resources_bygeids(geids):
+        return {geid: dict(nodes[geid]) for geid in geids if geid in nodes}, []
+
+    monkeypatch.setattr(validation_engine, 'get_resources_bygeids', get_resources_bygeids)
+    yield nodes
+
+
+class TestFileOperationValidator:
+    async def test_resolve_targets_returns_entries_for_files_and_paths(self, nodes):
+        validator = FileOperationValidator('data_delete', FakeSrvRedis({}))
+
+        to_validate, folders = await validator.resolve_targets([{'geid': 'file'}, {'full_path': 'gr-project/a.txt'}])
+
+        assert [entry['full_path'] for entry in to_validate] == ['gr-project/a.txt', 'gr-project/admin/file.txt']
+        assert folders == []
+
+    async def test_resolve_targets_rejects_invalid_target_type(self, nodes):
+        validator = FileOperationValidator('data_delete', FakeSrvRedis({}))
+
+        with pytest.raises(InvalidTargetError):
+            await validator.resolve_targets([{'geid': 'project'}])
+
+    async def test_validate_returns_blocked_entries_first(self):
+        srv_redis = FakeSrvRedis({'b': 'data_upload'})
+        validator = FileOperationValidator('data_delete', srv_redis)
+
+        validations = await validator.validate([{'full_path': 'a'}, {'full_path': 'b'}], [])
+
+        assert [(v['full_path'], v['is_valid']) for v in validations] == [('b', False), ('a', True)]
+        assert validations[0]['error'] == 'operation-block'
+        assert srv_redis.requested == [['a', 'b']]
@@ -0,0 +1,58 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import json
+
+import pytest
+
+from resources.redis_project_session_job import SessionJob
+
+
+pytestmark = pytest.mark.usefixtures('shared_redis')
+
+
+async def save_job(code, job_id):
+    session_job = SessionJob('session', code, 'data_transfer', 'admin', job_id=job_id)
+    session_job.set_source(f'{job_id}.txt')
+    session_job.set_status('RUNNING')
+    await session_job.save()
+
+
+async def test_export_streams_one_job_per_line(client):
+    await save_job('project', 'job-1')
+    await save_job('project', 'job-2')
+    await save_job('other', 'job-3')
+
+    response = await client.get('/v1/tasks/export', params={'code': 'project'})
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    lines = response.text.splitlines()
+    assert response.text.endswith('\n')
+    jobs = [json.loads(line) for line in lines]
+    assert sorted(job['job_id'] for job in jobs) == ['job-1', 'job-2']
+    assert all(job['code'] == 'project' for job in jobs)
+
+
+async def test_export_returns_empty_body_without_jobs(client):
+    response = await client.get('/v1/tasks/export')
+
+    assert response.status_code == 200
+    assert response.text == ''
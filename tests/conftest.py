@@ -23,10 +23,14 @@ import asyncio
 import httpx
 import pytest
 from faker import Faker
+from fakeredis import FakeServer
 from fakeredis.aioredis import FakeRedis
 
 from app import create_app
 from dependencies import Cache
+from dependencies import DownstreamService
+from dependencies import get_redis
+from dependencies import http_clients
 
 
 class AsyncClient(httpx.AsyncClient):
@@ -63,9 +67,58 @@ async def client(app) -> AsyncClient:
 
 @pytest.fixture
 def redis():
-    yield FakeRedis()
+    """Fake redis client, all its connections share one server."""
+
+    yield FakeRedis(server=FakeServer())
+
+
+@pytest.fixture
+def shared_redis(monkeypatch, redis):
+    """Make the fake redis the instance used by the application code."""
+
+    monkeypatch.setattr(get_redis, 'instance', redis)
+    yield redis
 
 
 @pytest.fixture
 def cache(redis):
     yield Cache(redis)
+
+
+@pytest.fixture
+def mock_service(monkeypatch):
+    """Return a function that routes requests to the downstream service into the handler."""
+
+    def _mock_service(service: DownstreamService, handler) -> None:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setitem(http_clients.instances, service, client)
+
+    yield _mock_service
+
+
+@pytest.fixture
+def neo4j_response():
+    """Return the function that answers neo4j requests, modules override it with their own data."""
+
+    def get_response(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={'url': str(request.url)})
+
+    yield get_response
+
+
+@pytest.fixture
+def neo4j_requests(mock_service, neo4j_response):
+    """Answer neo4j requests with the neo4j_response fixture and collect them.
+
+    Responses are slightly delayed, so concurrent requests overlap.
+    """
+
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        await asyncio.sleep(0.01)
+        return neo4j_response(request)
+
+    mock_service(DownstreamService.NEO4J, handler)
+    yield requests
@@ -25,6 +25,7 @@ from config import get_settings
 from dependencies import Cache
 from dependencies import get_cache
 from dependencies.cache import GetRedis
+from dependencies.cache import parse_redis_hosts
 
 
 @pytest.fixture
@@ -32,6 +33,12 @@ def get_redis():
     yield GetRedis()
 
 
+def test_parse_redis_hosts_returns_list_of_host_and_port_pairs():
+    result = parse_redis_hosts('sentinel-1:26379, sentinel-2:26380,')
+
+    assert result == [('sentinel-1', 26379), ('sentinel-2', 26380)]
+
+
 class TestGetRedis:
     async def test_instance_has_uninitialized_instance_attribute_after_creation(self, get_redis):
         assert get_redis.instance is None
@@ -41,6 +48,31 @@ class TestGetRedis:
         assert redis is get_redis.instance
         assert isinstance(redis, Redis)
 
+    async def test_call_returns_the_same_instance_on_subsequent_calls(self, get_redis):
+        redis = await get_redis(settings=get_settings())
+
+        assert await get_redis(settings=get_settings()) is redis
+
+    async def test_connect_configures_shared_connection_pool(self, get_redis):
+        settings = get_settings()
+
+        redis = get_redis.connect(settings)
+
+        assert redis.connection_pool.max_connections == settings.REDIS_MAX_CONNECTIONS
+
+    async def test_connect_raises_error_for_unsupported_mode(self, get_redis):
+        settings = get_settings().copy(update={'REDIS_MODE': 'unknown'})
+
+        with pytest.raises(ValueError):
+            get_redis.connect(settings)
+
+    async def test_close_drops_the_instance(self, get_redis):
+        await get_redis(settings=get_settings())
+
+        await get_redis.close()
+
+        assert get_redis.instance is None
+
 
 class TestCache:
     async def test_get_cache_returns_an_instance_of_cache(self, redis):
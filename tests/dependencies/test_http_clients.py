@@ -0,0 +1,56 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import httpx
+import pytest
+
+from config import get_settings
+from dependencies import DownstreamService
+from dependencies.http_clients import HTTPClients
+
+
+@pytest.fixture
+def http_clients():
+    yield HTTPClients()
+
+
+class TestHTTPClients:
+    async def test_get_returns_the_same_client_for_the_service(self, http_clients):
+        client = http_clients.get(DownstreamService.NEO4J)
+
+        assert isinstance(client, httpx.AsyncClient)
+        assert http_clients.get(DownstreamService.NEO4J) is client
+
+    async def test_get_returns_separate_clients_for_different_services(self, http_clients):
+        assert http_clients.get(DownstreamService.NEO4J) is not http_clients.get(DownstreamService.QUEUE)
+
+    async def test_connect_creates_clients_for_all_services(self, http_clients):
+        http_clients.connect(get_settings())
+
+        assert set(http_clients.instances) == set(DownstreamService)
+
+    async def test_close_closes_all_clients(self, http_clients):
+        client = http_clients.get(DownstreamService.NEO4J)
+
+        await http_clients.close()
+
+        assert client.is_closed
+        assert http_clients.instances == {}
@@ -23,7 +23,7 @@ from fastapi.testclient import TestClient
 
 from app import create_app
 from config import ConfigClass
-from resources.helpers import fetch_geid
+from resources.geid import generate_geids
 
 
 class SetUpTest:
@@ -97,7 +97,7 @@ class SetUpTest:
                   "discoverable": discoverable,
                   "type": "Usecase",
                   "tags": ['test'],
-                  "global_entity_id": fetch_geid()
+                  "global_entity_id": generate_geids(1)[0]
                   }
         self.log.info(f"POST API: {testing_api}")
         self.log.info(f"POST params: {params}")
@@ -0,0 +1,85 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+import itertools
+
+import pytest
+
+from config import ConfigClass
+from resources import geid
+from resources.geid import GEIDAllocationError
+from resources.geid import GEIDAllocator
+
+
+@pytest.fixture
+def generated_batches(monkeypatch):
+    batches = []
+    counter = itertools.count()
+
+    def generate_geids(number):
+        batch = [f'geid-{next(counter)}' for _ in range(number)]
+        batches.append(batch)
+        return batch
+
+    monkeypatch.setattr(geid, 'generate_geids', generate_geids)
+    monkeypatch.setattr(ConfigClass, 'GEID_BATCH_SIZE', 5)
+    monkeypatch.setattr(ConfigClass, 'GEID_REFILL_THRESHOLD', 2)
+    yield batches
+
+
+@pytest.fixture
+async def allocator():
+    allocator = GEIDAllocator()
+    yield allocator
+    await allocator.close()
+
+
+class TestGEIDAllocator:
+    async def test_allocate_returns_unique_geids(self, allocator, generated_batches):
+        geids = await asyncio.gather(*[allocator.allocate() for _ in range(12)])
+
+        assert len(set(geids)) == 12
+
+    async def test_allocate_refills_buffer_in_background(self, allocator, generated_batches):
+        for _ in range(4):
+            await allocator.allocate()
+        await allocator.refill_task
+
+        assert len(generated_batches) == 2
+        assert len(allocator.buffer) == 6
+
+    async def test_allocate_raises_generation_error(self, monkeypatch, allocator):
+        def generate_geids(number):
+            raise RuntimeError('unavailable')
+
+        monkeypatch.setattr(geid, 'generate_geids', generate_geids)
+
+        with pytest.raises(RuntimeError):
+            await allocator.allocate()
+
+    async def test_allocate_raises_when_service_returns_no_geids(self, monkeypatch, allocator, generated_batches):
+        monkeypatch.setattr(ConfigClass, 'GEID_BATCH_SIZE', 0)
+
+        with pytest.raises(GEIDAllocationError):
+            await allocator.allocate()
+
+        assert len(generated_batches) == 1
@@ -0,0 +1,170 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from config import ConfigClass
+from dependencies import DownstreamService
+from resources import helpers
+from resources.helpers import get_connected_nodes
+from resources.helpers import get_files_recursive
+from resources.helpers import get_resources_bygeids
+from resources.helpers import iter_files_recursive
+from resources.helpers import query_nodes_in
+from resources.helpers import single_flight
+
+TREE = {
+    'root': [
+        {'global_entity_id': 'folder-a', 'labels': ['Folder']},
+        {'global_entity_id': 'file-1', 'labels': ['File']},
+        {'global_entity_id': 'folder-b', 'labels': ['Folder']},
+    ],
+    'folder-a': [
+        {'global_entity_id': 'file-2', 'labels': ['File']},
+        {'global_entity_id': 'folder-c', 'labels': ['Folder']},
+    ],
+    'folder-b': [
+        {'global_entity_id': 'file-3', 'labels': ['File']},
+    ],
+    'folder-c': [
+        {'global_entity_id': 'file-4', 'labels': ['File']},
+    ],
+}
+
+
+@pytest.fixture
+def folder_tree(monkeypatch):
+    async def get_folder_children(folder_geid):
+        return TREE[folder_geid]
+
+    monkeypatch.setattr(helpers, 'get_folder_children', get_folder_children)
+    yield TREE
+
+
+async def test_get_files_recursive_returns_files_in_depth_first_order(folder_tree):
+    files = await get_files_recursive('root')
+
+    assert [file['global_entity_id'] for file in files] == ['file-2', 'file-4', 'file-1', 'file-3']
+
+
+async def test_get_files_recursive_appends_to_passed_list(folder_tree):
+    all_files = [{'global_entity_id': 'existing', 'labels': ['File']}]
+
+    files = await get_files_recursive('folder-a', all_files)
+
+    assert files is all_files
+    assert [file['global_entity_id'] for file in files] == ['existing', 'file-2', 'file-4']
+
+
+async def test_iter_files_recursive_yields_all_files(folder_tree):
+    files = [file['global_entity_id'] async for file in iter_files_recursive('root')]
+
+    assert sorted(files) == ['file-1', 'file-2', 'file-3', 'file-4']
+
+
+@pytest.fixture
+def neo4j_nodes(mock_service):
+    nodes = {}
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        geids = json.loads(request.content)['query']['global_entity_id']
+        requests.append(geids)
+        return httpx.Response(200, json={'result': [nodes[geid] for geid in geids if geid in nodes]})
+
+    mock_service(DownstreamService.NEO4J, handler)
+    yield nodes, requests
+
+
+async def test_get_resources_bygeids_queries_geids_in_chunks(monkeypatch, neo4j_nodes):
+    nodes, requests = neo4j_nodes
+    nodes.update({geid: {'global_entity_id': geid} for geid in ['a', 'b', 'c']})
+    monkeypatch.setattr(ConfigClass, 'NEO4J_QUERY_BATCH_SIZE', 2)
+
+    found, missing = await get_resources_bygeids(['a', 'b', 'c', 'd', 'a'])
+
+    assert set(found) == {'a', 'b', 'c'}
+    assert missing == ['d']
+    assert sorted(requests) == [['a', 'b'], ['c', 'd']]
+
+
+async def test_single_flight_shares_response_of_identical_requests(neo4j_requests):
+    url = ConfigClass.NEO4J_SERVICE + 'nodes/Container/query'
+
+    responses = await asyncio.gather(
+        single_flight(DownstreamService.NEO4J, 'POST', url, json={'code': 'project', 'labels': ['Container']}),
+        single_flight(DownstreamService.NEO4J, 'POST', url, json={'labels': ['Container'], 'code': 'project'}),
+        single_flight(DownstreamService.NEO4J, 'POST', url, json={'code': 'other'}),
+    )
+
+    assert responses[0] is responses[1]
+    assert len(neo4j_requests) == 2
+
+
+async def test_single_flight_sends_new_request_after_completion(neo4j_requests):
+    url = ConfigClass.NEO4J_SERVICE + 'nodes/geid/geid'
+
+    await single_flight(DownstreamService.NEO4J, 'GET', url)
+    await single_flight(DownstreamService.NEO4J, 'GET', url)
+
+    assert len(neo4j_requests) == 2
+
+
+@pytest.fixture
+def connected_nodes(mock_service):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        geid = request.url.path.rsplit('/', 1)[-1]
+        direction = request.url.params['direction']
+        requests.append((geid, direction))
+        return httpx.Response(200, json={'result': [{'global_entity_id': f'{geid}-{direction}'}]})
+
+    mock_service(DownstreamService.NEO4J, handler)
+    yield requests
+
+
+async def test_get_connected_nodes_returns_input_then_output_nodes(connected_nodes):
+    nodes = await get_connected_nodes('a')
+
+    assert [node['global_entity_id'] for node in nodes] == ['a-input', 'a-output']
+
+
+async def test_query_nodes_in_pages_until_every_value_matched(mock_service):
+    pages = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        pages.append(payload['page'])
+        nodes = [{'global_entity_id': 'a-1', 'name': 'a'}, {'global_entity_id': 'a-2', 'name': 'a'}]
+        if payload['page'] == 1:
+            nodes = [{'global_entity_id': 'b-1', 'name': 'b'}]
+        return httpx.Response(200, json={'result': nodes})
+
+    mock_service(DownstreamService.NEO4J, handler)
+
+    nodes = await query_nodes_in('name', ['a', 'b'], {'labels': ['Folder']})
+
+    assert [node['global_entity_id'] for node in nodes] == ['a-1', 'a-2', 'b-1']
+    assert pages == [0, 1]
@@ -0,0 +1,116 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+
+import pytest
+
+from config import ConfigClass
+from resources.idempotency import RequestClaim
+from resources.idempotency import RequestInProgressError
+from resources.idempotency import get_idempotency_key
+
+JOBS = [{'job_id': 'job', 'status': 'RUNNING'}]
+
+
+pytestmark = pytest.mark.usefixtures('shared_redis')
+
+
+@pytest.fixture(autouse=True)
+def short_wait(monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'IDEMPOTENCY_WAIT_TIMEOUT', 0.1)
+    monkeypatch.setattr(ConfigClass, 'IDEMPOTENCY_POLL_INTERVAL', 0.01)
+
+
+class TestRequestClaim:
+    async def test_first_submission_claims_request(self):
+        claim = RequestClaim('admin', 'request')
+
+        assert await claim.acquire() is None
+        await claim.release()
+
+    async def test_retried_submission_returns_stored_result(self):
+        claim = RequestClaim('admin', 'request')
+        await claim.acquire()
+        await claim.store(JOBS)
+
+        assert await RequestClaim('admin', 'request').acquire() == JOBS
+
+    async def test_retry_waits_for_pending_submission(self):
+        claim = RequestClaim('admin', 'request')
+        await claim.acquire()
+
+        async def finish():
+            await asyncio.sleep(0.02)
+            await claim.store(JOBS)
+
+        submitted, _ = await asyncio.gather(RequestClaim('admin', 'request').acquire(), finish())
+
+        assert submitted == JOBS
+
+    async def test_retry_of_pending_submission_raises_after_timeout(self):
+        claim = RequestClaim('admin', 'request')
+        await claim.acquire()
+
+        with pytest.raises(RequestInProgressError):
+            await RequestClaim('admin', 'request').acquire()
+        await claim.release()
+
+    async def test_released_request_can_be_claimed_again(self):
+        claim = RequestClaim('admin', 'request')
+        await claim.acquire()
+        await claim.release()
+
+        retry = RequestClaim('admin', 'request')
+        assert await retry.acquire() is None
+        await retry.release()
+
+    async def test_lost_claim_does_not_touch_claim_of_retry(self, redis):
+        claim = RequestClaim('admin', 'request')
+        await claim.acquire()
+        # the claim expired while the first submission was still running
+        await redis.delete(get_idempotency_key('admin', 'request'))
+        retry = RequestClaim('admin', 'request')
+        await retry.acquire()
+
+        assert await claim.store(JOBS) is False
+        assert await claim.release() is False
+        assert await redis.get(get_idempotency_key('admin', 'request')) == retry.token
+        await retry.release()
+
+    async def test_claim_is_refreshed_while_submission_runs(self, monkeypatch, redis):
+        monkeypatch.setattr(ConfigClass, 'IDEMPOTENCY_PENDING_TTL', 1)
+        claim = RequestClaim('admin', 'request')
+        await claim.acquire()
+
+        await asyncio.sleep(1.5)
+
+        assert await redis.get(get_idempotency_key('admin', 'request')) == claim.token
+        await claim.release()
+
+    async def test_request_ids_are_scoped_by_operator(self):
+        claim = RequestClaim('admin', 'request')
+        await claim.acquire()
+        await claim.store(JOBS)
+
+        other = RequestClaim('other', 'request')
+        assert await other.acquire() is None
+        await other.release()
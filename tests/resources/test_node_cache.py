@@ -0,0 +1,103 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import pytest
+
+from config import ConfigClass
+from resources.node_cache import NodeCache
+from resources.node_cache import bypass_node_cache
+
+
+pytestmark = pytest.mark.usefixtures('shared_redis')
+
+
+@pytest.fixture
+def node_cache():
+    yield NodeCache(prefix='test-node-cache')
+
+
+def create_node(geid, **kwds):
+    return {'global_entity_id': geid, 'name': geid, **kwds}
+
+
+class TestNodeCache:
+    async def test_get_node_returns_node_from_local_cache(self, node_cache):
+        await node_cache.set_node(create_node('a'), 0)
+
+        node, _ = await node_cache.get_node('a')
+
+        assert node == create_node('a')
+        assert node_cache.stats['local_hits'] == 1
+
+    async def test_local_hit_does_not_read_redis(self, node_cache, shared_redis):
+        await node_cache.set_node(create_node('a'), 0)
+        await shared_redis.flushall()
+
+        node, _ = await node_cache.get_node('a')
+
+        assert node == create_node('a')
+
+    async def test_get_node_falls_back_to_redis(self, node_cache):
+        await node_cache.set_node(create_node('a'), 0)
+        node_cache.local.clear()
+
+        assert await node_cache.get_node('a') == (create_node('a'), 0)
+        assert node_cache.stats['redis_hits'] == 1
+        assert 'test-node-cache:node:{a}' in node_cache.local
+
+    async def test_get_node_counts_miss(self, node_cache):
+        assert await node_cache.get_node('a') == (None, 0)
+        assert node_cache.stats['misses'] == 1
+
+    async def test_get_node_skips_cache_when_bypassed(self, node_cache):
+        await node_cache.set_node(create_node('a'), 0)
+
+        with bypass_node_cache():
+            assert await node_cache.get_node('a') == (None, 0)
+        assert node_cache.stats['bypasses'] == 1
+
+    async def test_invalidate_drops_node_from_redis_and_local_cache(self, node_cache):
+        await node_cache.set_node(create_node('a'), 0)
+        await node_cache.set_node(create_node('b'), 0)
+
+        await node_cache.invalidate(['a'])
+
+        assert 'test-node-cache:node:{a}' not in node_cache.local
+        assert await node_cache.get_node('a') == (None, 1)
+        assert (await node_cache.get_node('b'))[0] == create_node('b')
+
+    async def test_invalidated_node_is_dropped_for_other_processes_after_local_ttl(self, monkeypatch, node_cache):
+        monkeypatch.setattr(ConfigClass, 'NODE_CACHE_LOCAL_TTL', 0)
+        other = NodeCache(prefix='test-node-cache')
+        await other.set_node(create_node('a', name='old'), 0)
+
+        await node_cache.invalidate(['a'])
+
+        assert await other.get_node('a') == (None, 1)
+
+    async def test_set_node_skips_node_read_before_invalidation(self, node_cache, shared_redis):
+        _, version = await node_cache.get_node('a')
+        await node_cache.invalidate(['a'])
+
+        await node_cache.set_node(create_node('a', name='old'), version)
+
+        assert node_cache.local == {}
+        assert await shared_redis.get('test-node-cache:node:{a}') is None
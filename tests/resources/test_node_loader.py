@@ -0,0 +1,121 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+
+import pytest
+
+from resources.node_loader import NodeLoader
+
+
+@pytest.fixture
+def batch_calls():
+    yield []
+
+
+@pytest.fixture
+def node_loader(batch_calls):
+    async def batch_load_fn(geids):
+        batch_calls.append(geids)
+        nodes = {geid: {'global_entity_id': geid} for geid in geids if geid != 'missing'}
+        return nodes, [geid for geid in geids if geid not in nodes]
+
+    yield NodeLoader(batch_load_fn)
+
+
+class TestNodeLoader:
+    async def test_load_batches_lookups_made_in_the_same_tick(self, node_loader, batch_calls):
+        nodes = await asyncio.gather(node_loader.load('a'), node_loader.load('b'), node_loader.load('a'))
+
+        assert [node['global_entity_id'] for node in nodes] == ['a', 'b', 'a']
+        assert batch_calls == [['a', 'b']]
+
+    async def test_load_returns_memoized_node_copy(self, node_loader, batch_calls):
+        node = await node_loader.load('a')
+        node['name'] = 'changed'
+
+        assert await node_loader.load('a') == {'global_entity_id': 'a'}
+        assert batch_calls == [['a']]
+
+    async def test_load_returns_none_for_missing_geid(self, node_loader):
+        assert await node_loader.load('missing') is None
+
+    async def test_clear_forgets_memoized_node(self, node_loader, batch_calls):
+        await node_loader.load('a')
+
+        node_loader.clear('a')
+        await node_loader.load('a')
+
+        assert batch_calls == [['a'], ['a']]
+
+    async def test_load_raises_batch_error_and_allows_retry(self, batch_calls):
+        async def batch_load_fn(geids):
+            batch_calls.append(geids)
+            if len(batch_calls) == 1:
+                raise ValueError('unavailable')
+            return {geid: {'global_entity_id': geid} for geid in geids}, []
+
+        node_loader = NodeLoader(batch_load_fn)
+
+        with pytest.raises(ValueError):
+            await node_loader.load('a')
+
+        assert await node_loader.load('a') == {'global_entity_id': 'a'}
+
+    async def test_clear_during_fetch_makes_waiting_loads_fetch_again(self, batch_calls):
+        versions = iter(['old', 'new'])
+
+        async def batch_load_fn(geids):
+            batch_calls.append(geids)
+            version = next(versions)
+            await asyncio.sleep(0)
+            return {geid: {'global_entity_id': geid, 'version': version} for geid in geids}, []
+
+        node_loader = NodeLoader(batch_load_fn)
+        load = asyncio.ensure_future(node_loader.load('a'))
+        await asyncio.sleep(0)
+
+        node_loader.clear('a')
+
+        assert (await load)['version'] == 'new'
+        assert batch_calls == [['a'], ['a']]
+
+    async def test_pending_batch_tasks_are_referenced(self):
+        release = asyncio.Event()
+
+        async def batch_load_fn(geids):
+            await release.wait()
+            return {geid: {'global_entity_id': geid} for geid in geids}, []
+
+        node_loader = NodeLoader(batch_load_fn)
+        load = asyncio.ensure_future(node_loader.load('a'))
+        try:
+            # the batch is dispatched by a loop callback scheduled from load()
+            for _ in range(10):
+                if node_loader.tasks:
+                    break
+                await asyncio.sleep(0)
+
+            assert len(node_loader.tasks) == 1
+        finally:
+            release.set()
+            await load
+        assert node_loader.tasks == set()
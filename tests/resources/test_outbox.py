@@ -0,0 +1,119 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import json
+
+import httpx
+import pytest
+
+from config import ConfigClass
+from dependencies import DownstreamService
+from resources.outbox import QueueOutboxRelay
+from resources.redis import OUTBOX_SESSIONS_KEY
+from resources.redis_project_session_job import SessionJob
+from resources.redis_project_session_job import get_outbox_keys
+
+
+pytestmark = pytest.mark.usefixtures('shared_redis')
+
+
+@pytest.fixture
+def queue(monkeypatch, mock_service):
+    queue = {'messages': [], 'status_code': 200}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        message = json.loads(request.content)
+        queue['messages'].append(message)
+        if message.get('broken'):
+            return httpx.Response(500, json={})
+        return httpx.Response(queue['status_code'], json={})
+
+    mock_service(DownstreamService.QUEUE, handler)
+    monkeypatch.setattr(ConfigClass, 'OUTBOX_RETRY_BACKOFF', 0)
+    monkeypatch.setattr(ConfigClass, 'OUTBOX_MAX_ATTEMPTS', 2)
+    yield queue
+
+
+async def save_job(message, job_id='job'):
+    session_job = SessionJob('session', 'project', 'data_transfer', 'admin', job_id=job_id)
+    session_job.set_source('file.txt')
+    session_job.set_status('RUNNING')
+    await session_job.save(message=message)
+    return session_job
+
+
+class TestQueueOutboxRelay:
+    async def test_job_and_message_are_saved_together(self, redis, queue):
+        await save_job({'event_type': 'folder_copy'})
+
+        assert await redis.xlen(get_outbox_keys('session')[0]) == 1
+        assert await redis.smembers(OUTBOX_SESSIONS_KEY) == {b'session'}
+        assert queue['messages'] == []
+
+    async def test_relay_sends_message_and_removes_it_from_outbox(self, redis, queue):
+        await save_job({'event_type': 'folder_copy'})
+
+        assert await QueueOutboxRelay().relay() == 1
+
+        assert queue['messages'] == [{'event_type': 'folder_copy'}]
+        assert await redis.xlen(get_outbox_keys('session')[0]) == 0
+
+    async def test_relay_releases_session_with_empty_outbox(self, redis, queue):
+        await save_job({'event_type': 'folder_copy'})
+        relay = QueueOutboxRelay()
+
+        await relay.relay()
+        await relay.relay()
+
+        assert await redis.smembers(OUTBOX_SESSIONS_KEY) == set()
+
+    async def test_relay_terminates_job_when_attempts_run_out(self, redis, queue):
+        queue['status_code'] = 500
+        session_job = await save_job({'event_type': 'folder_copy'})
+        relay = QueueOutboxRelay()
+
+        assert await relay.relay() == 0
+        assert await relay.relay() == 1
+
+        await session_job.read()
+        assert len(queue['messages']) == 2
+        assert session_job.status == 'TERMINATED'
+        assert 'Failed to send message to queue' in session_job.payload['error']
+
+    async def test_messages_waiting_for_retry_do_not_hold_back_newer_ones(self, monkeypatch, queue):
+        monkeypatch.setattr(ConfigClass, 'OUTBOX_BATCH_SIZE', 1)
+        monkeypatch.setattr(ConfigClass, 'OUTBOX_RETRY_BACKOFF', 60)
+        await save_job({'event_type': 'folder_copy', 'broken': True}, job_id='broken')
+        await save_job({'event_type': 'folder_copy'}, job_id='job')
+        relay = QueueOutboxRelay()
+
+        assert await relay.relay() == 0
+        assert await relay.relay() == 1
+
+        assert queue['messages'] == [{'event_type': 'folder_copy', 'broken': True}, {'event_type': 'folder_copy'}]
+
+    async def test_relay_stops_when_lock_is_held_by_other_process(self, queue):
+        await save_job({'event_type': 'folder_copy'})
+        other = QueueOutboxRelay()
+        assert await other._acquire_lock()
+
+        assert await QueueOutboxRelay().relay() == 0
+        assert queue['messages'] == []
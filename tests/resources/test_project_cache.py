@@ -0,0 +1,75 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from resources.project_cache import ProjectCache
+from resources.project_cache import ProjectLookupError
+
+PROJECT = {'id': 7, 'global_entity_id': 'project-geid', 'code': 'project', 'labels': ['Container']}
+
+
+@pytest.fixture
+def neo4j_response():
+    def get_response(request: httpx.Request) -> httpx.Response:
+        if request.method == 'GET':
+            found = request.url.path.endswith(f'/nodes/Container/node/{PROJECT["id"]}')
+        else:
+            query = json.loads(request.content)
+            found = all(PROJECT.get(field) == value for field, value in query.items())
+        if 'broken' in request.content.decode():
+            return httpx.Response(500, text='unavailable')
+        return httpx.Response(200, json=[PROJECT] if found else [])
+
+    yield get_response
+
+
+@pytest.fixture
+def project_cache():
+    yield ProjectCache()
+
+
+class TestProjectCache:
+    async def test_concurrent_lookups_share_one_request(self, project_cache, neo4j_requests):
+        projects = await asyncio.gather(*[project_cache.get_by_geid('project-geid') for _ in range(5)])
+
+        assert projects == [PROJECT] * 5
+        assert len(neo4j_requests) == 1
+
+    async def test_project_is_cached_by_geid_code_and_id(self, project_cache, neo4j_requests):
+        await project_cache.get_by_geid('project-geid')
+
+        assert await project_cache.get_by_code('project') == PROJECT
+        assert await project_cache.get_by_id('7') == PROJECT
+        assert len(neo4j_requests) == 1
+
+    async def test_missing_project_is_not_cached(self, project_cache, neo4j_requests):
+        assert await project_cache.get_by_code('unknown') is None
+        assert await project_cache.get_by_code('unknown') is None
+        assert len(neo4j_requests) == 2
+
+    async def test_lookup_error_is_raised(self, project_cache, neo4j_requests):
+        with pytest.raises(ProjectLookupError):
+            await project_cache.get_by_code('broken')
@@ -0,0 +1,181 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import json
+import time
+
+import pytest
+
+from config import ConfigClass
+from resources.redis import JOB_TTL
+from resources.redis import LAST_TERMINAL_FIELD
+from resources.redis import SrvAioRedisSingleton
+from resources.redis import get_current_action
+
+
+def create_index_entry(action: str, update_timestamp: int):
+    return json.dumps({'action': action, 'update_timestamp': str(update_timestamp)}).encode('utf-8')
+
+
+@pytest.fixture
+def srv_redis(shared_redis):
+    yield SrvAioRedisSingleton()
+
+
+class TestGetCurrentAction:
+    def test_returns_none_when_file_has_no_jobs(self):
+        assert get_current_action({}) is None
+
+    def test_returns_action_of_the_latest_active_job(self):
+        now = round(time.time())
+        entries = {
+            b'job-1': create_index_entry('data_upload', now - 10),
+            b'job-2': create_index_entry('data_transfer', now),
+        }
+
+        assert get_current_action(entries) == 'data_transfer'
+
+    def test_returns_none_when_latest_job_is_finished(self):
+        now = round(time.time())
+        entries = {
+            b'job-1': create_index_entry('data_upload', now - 10),
+            LAST_TERMINAL_FIELD.encode('utf-8'): str(now).encode('utf-8'),
+        }
+
+        assert get_current_action(entries) is None
+
+    def test_ignores_jobs_with_expired_records(self):
+        entries = {b'job-1': create_index_entry('data_upload', round(time.time()) - 2 * 24 * 60 * 60)}
+
+        assert get_current_action(entries) is None
+
+
+class TestSrvAioRedisSingleton:
+    async def test_file_get_status_returns_action_of_active_job(self, fake, srv_redis):
+        file_path = fake.file_path()
+        await srv_redis.file_index_update(file_path, 'job-1', 'data_transfer', 'RUNNING', str(round(time.time())))
+
+        assert await srv_redis.file_get_status(file_path) == 'data_transfer'
+
+    async def test_file_get_status_returns_none_after_job_is_finished(self, fake, srv_redis):
+        file_path = fake.file_path()
+        update_timestamp = str(round(time.time()))
+        await srv_redis.file_index_update(file_path, 'job-1', 'data_transfer', 'RUNNING', update_timestamp)
+        await srv_redis.file_index_update(file_path, 'job-1', 'data_transfer', 'SUCCEED', update_timestamp)
+
+        assert await srv_redis.file_get_status(file_path) is None
+
+    async def test_file_get_status_many_returns_action_for_each_path(self, fake, srv_redis):
+        active_path = fake.file_path()
+        idle_path = fake.file_path()
+        await srv_redis.file_index_update(active_path, 'job-1', 'data_delete', 'RUNNING', str(round(time.time())))
+
+        result = await srv_redis.file_get_status_many([active_path, idle_path])
+
+        assert result == {active_path: 'data_delete', idle_path: None}
+
+
+@pytest.fixture
+def log_keys():
+    yield (
+        'dataaction-log:{session}',
+        'dataaction-changes:{session}',
+        'dataaction-tombstones:{session}',
+        'dataaction-expiry:{session}',
+    )
+
+
+class TestSessionJobChanges:
+    async def test_returns_all_saved_records(self, srv_redis, log_keys):
+        await srv_redis.session_job_save('job:{session}:a', 'record-a', log_keys)
+        await srv_redis.session_job_save('job:{session}:b', 'record-b', log_keys)
+
+        changes = await srv_redis.session_job_changes(log_keys, 0)
+
+        assert sorted(changes['records']) == [b'record-a', b'record-b']
+        assert changes['tombstones'] == []
+        assert changes['log']['seq'] == 2
+        assert 'epoch' in changes['log']
+
+    async def test_returns_only_changes_after_sequence_number(self, srv_redis, log_keys):
+        seq = await srv_redis.session_job_save('job:{session}:a', 'record-a', log_keys)
+        await srv_redis.session_job_save('job:{session}:b', 'record-b', log_keys)
+
+        changes = await srv_redis.session_job_changes(log_keys, seq)
+
+        assert changes['records'] == [b'record-b']
+        assert changes['log']['seq'] == seq + 1
+
+    async def test_saving_job_again_moves_it_after_the_sequence_number(self, srv_redis, log_keys):
+        await srv_redis.session_job_save('job:{session}:a', 'record-a', log_keys)
+        seq = await srv_redis.session_job_save('job:{session}:b', 'record-b', log_keys)
+        await srv_redis.session_job_save('job:{session}:a', 'record-a2', log_keys)
+
+        changes = await srv_redis.session_job_changes(log_keys, seq)
+
+        assert changes['records'] == [b'record-a2']
+
+    async def test_deleted_job_is_returned_as_tombstone(self, srv_redis, log_keys):
+        seq = await srv_redis.session_job_save('job:{session}:a', 'record-a', log_keys)
+
+        assert await srv_redis.session_job_delete('job:{session}:a', 'tombstone-a', log_keys) == 1
+        changes = await srv_redis.session_job_changes(log_keys, seq)
+
+        assert changes['records'] == []
+        assert changes['tombstones'] == [b'tombstone-a']
+        assert changes['log']['seq'] == seq + 1
+
+    async def test_deleting_missing_job_is_not_logged(self, srv_redis, log_keys):
+        assert await srv_redis.session_job_delete('job:{session}:a', 'tombstone-a', log_keys) == 0
+
+        changes = await srv_redis.session_job_changes(log_keys, 0)
+
+        assert changes == {'log': {}, 'records': [], 'tombstones': []}
+
+    async def test_oldest_tombstones_are_trimmed_and_floor_is_recorded(self, monkeypatch, srv_redis, log_keys):
+        monkeypatch.setattr(ConfigClass, 'TASK_TOMBSTONE_LOG_SIZE', 2)
+        for name in ['a', 'b', 'c']:
+            await srv_redis.session_job_save(f'job:{{session}}:{name}', f'record-{name}', log_keys)
+        for name in ['a', 'b', 'c']:
+            await srv_redis.session_job_delete(f'job:{{session}}:{name}', f'tombstone-{name}', log_keys)
+
+        changes = await srv_redis.session_job_changes(log_keys, 0)
+
+        assert changes['tombstones'] == [b'tombstone-b', b'tombstone-c']
+        # readers behind the floor missed the trimmed tombstone and have to reload the whole list
+        assert changes['log']['floor'] == 4
+        assert changes['log']['seq'] == 6
+
+    async def test_expired_jobs_are_dropped_and_epoch_is_moved_forward(self, monkeypatch, srv_redis, log_keys):
+        now = time.time()
+        await srv_redis.session_job_save('job:{session}:a', 'record-a', log_keys)
+        monkeypatch.setattr(time, 'time', lambda: now + 60)
+        await srv_redis.session_job_save('job:{session}:b', 'record-b', log_keys)
+        epoch = (await srv_redis.session_job_changes(log_keys, 0))['log']['epoch']
+
+        monkeypatch.setattr(time, 'time', lambda: now + JOB_TTL.total_seconds() + 1)
+        changes = await srv_redis.session_job_changes(log_keys, 0)
+
+        # expired job leaves no tombstone, readers with the old epoch have to reload the whole list
+        assert changes['records'] == [b'record-b']
+        assert changes['tombstones'] == []
+        assert changes['log']['epoch'] > epoch
+        assert (await srv_redis.session_job_changes(log_keys, 0))['log'] == changes['log']
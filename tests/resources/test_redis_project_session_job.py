@@ -0,0 +1,180 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import time
+
+import pytest
+
+from config import ConfigClass
+from resources.redis_project_session_job import SessionJob
+from resources.redis_project_session_job import get_session_job_key
+from resources.redis_project_session_job import get_session_log_keys
+from resources.redis_project_session_job import get_task_progress_entry
+from resources.redis_project_session_job import get_worst_status
+from resources.redis_project_session_job import match_job
+from resources.redis_project_session_job import offload_payload
+from resources.redis_project_session_job import parse_task_cursor
+from resources.redis_project_session_job import session_job_export
+from resources.redis_project_session_job import session_job_load_payload
+
+
+pytestmark = pytest.mark.usefixtures('shared_redis')
+
+
+def test_get_session_job_key_wraps_session_id_into_hash_tag():
+    key = get_session_job_key('session', 'Container', 'job', 'data_transfer', 'project', 'admin', 'file.txt')
+
+    assert key == 'dataaction:{session}:Container:job:data_transfer:project:admin:file.txt'
+
+
+def test_get_session_log_keys_share_hash_tag_with_session_jobs():
+    keys = get_session_log_keys('session')
+
+    assert all('{session}' in key for key in keys)
+
+
+class TestGetTaskProgressEntry:
+    def test_marks_terminal_jobs_as_finished(self):
+        entry = get_task_progress_entry('TERMINATED', 40, {})
+
+        assert entry == {'status': 'TERMINATED', 'progress': 40, 'finished': 1}
+
+    def test_counts_succeeded_jobs_as_complete(self):
+        entry = get_task_progress_entry('SUCCEED', 0, {})
+
+        assert entry['progress'] == 100
+
+    def test_weights_job_by_number_of_targets(self):
+        entry = get_task_progress_entry('RUNNING', 0, {'targets': ['geid-1', 'geid-2']})
+
+        assert entry['weight'] == 2
+
+
+class TestGetWorstStatus:
+    def test_returns_failure_over_running_and_succeeded_statuses(self):
+        assert get_worst_status(['SUCCEED', 'TERMINATED', 'RUNNING']) == 'TERMINATED'
+
+    def test_ranks_unknown_status_above_running(self):
+        assert get_worst_status(['RUNNING', 'UNKNOWN']) == 'UNKNOWN'
+
+    def test_returns_none_for_task_without_jobs(self):
+        assert get_worst_status([]) is None
+
+
+class TestParseTaskCursor:
+    def test_returns_epoch_and_sequence_number(self):
+        assert parse_task_cursor('1650000000000-42') == (1650000000000, 42)
+
+    @pytest.mark.parametrize('cursor', ['', 'abc', '10-abc'])
+    def test_raises_value_error_for_malformed_cursor(self, cursor):
+        with pytest.raises(ValueError):
+            parse_task_cursor(cursor)
+
+
+class TestMatchJob:
+    def test_returns_true_when_all_patterns_match(self):
+        job = {'label': 'Container', 'action': 'data_transfer', 'code': 'project'}
+
+        assert match_job(job, label='Container', action='data_*', code='*') is True
+
+    def test_returns_false_when_any_pattern_does_not_match(self):
+        job = {'label': 'Container', 'action': 'data_transfer'}
+
+        assert match_job(job, label='Container', action='data_delete') is False
+
+
+class TestPayloadBlobs:
+    async def test_offload_payload_keeps_small_fields_inline(self):
+        inline, blobs = await offload_payload({'source': 'geid'})
+
+        assert inline == {'source': 'geid'}
+        assert blobs == {}
+
+    async def test_offload_payload_moves_large_fields_into_blobs(self, fake):
+        targets = [fake.uuid4() for _ in range(ConfigClass.TASK_PAYLOAD_BLOB_THRESHOLD // 10)]
+
+        inline, blobs = await offload_payload({'source': 'geid', 'targets': targets})
+
+        assert inline == {'source': 'geid'}
+        assert list(blobs) == ['targets']
+
+    async def test_offload_payload_shares_blob_for_equal_values(self, fake):
+        targets = [fake.uuid4() for _ in range(ConfigClass.TASK_PAYLOAD_BLOB_THRESHOLD // 10)]
+
+        _, blobs_1 = await offload_payload({'targets': targets})
+        _, blobs_2 = await offload_payload({'targets': list(targets)})
+
+        assert blobs_1 == blobs_2
+
+    async def test_session_job_load_payload_restores_offloaded_fields(self, fake):
+        targets = [fake.uuid4() for _ in range(ConfigClass.TASK_PAYLOAD_BLOB_THRESHOLD // 10)]
+        inline, blobs = await offload_payload({'source': 'geid', 'targets': targets})
+        record = {'payload': inline, 'payload_blobs': blobs}
+
+        await session_job_load_payload([record])
+
+        assert record['payload'] == {'source': 'geid', 'targets': targets}
+
+
+async def save_job(code, job_id, **payload):
+    session_job = SessionJob('session', code, 'data_transfer', 'admin', job_id=job_id)
+    session_job.set_source(f'{job_id}.txt')
+    session_job.set_status('RUNNING')
+    for key, value in payload.items():
+        session_job.add_payload(key, value)
+    await session_job.save()
+
+
+class TestSessionJobExport:
+    async def test_yields_every_job_once_across_scan_batches(self, monkeypatch):
+        monkeypatch.setattr(ConfigClass, 'TASK_EXPORT_BATCH_SIZE', 2)
+        for i in range(5):
+            await save_job('project', f'job-{i}')
+
+        jobs = [job async for job in session_job_export()]
+
+        assert sorted(job['job_id'] for job in jobs) == [f'job-{i}' for i in range(5)]
+
+    async def test_filters_jobs_by_code(self):
+        await save_job('project', 'job-1')
+        await save_job('other', 'job-2')
+
+        jobs = [job async for job in session_job_export(code='other')]
+
+        assert [job['job_id'] for job in jobs] == ['job-2']
+
+    async def test_filters_jobs_by_update_time_range(self):
+        await save_job('project', 'job-1')
+        now = round(time.time())
+
+        assert [job async for job in session_job_export(start_timestamp=now + 60)] == []
+        assert [job async for job in session_job_export(end_timestamp=now - 60)] == []
+        assert len([job async for job in session_job_export(start_timestamp=now - 60, end_timestamp=now + 60)]) == 1
+
+    async def test_restores_offloaded_payload_when_requested(self, fake):
+        targets = [fake.uuid4() for _ in range(ConfigClass.TASK_PAYLOAD_BLOB_THRESHOLD // 10)]
+        await save_job('project', 'job-1', targets=targets)
+
+        exported = [job async for job in session_job_export()]
+        restored = [job async for job in session_job_export(include_payload=True)]
+
+        assert 'targets' not in exported[0]['payload']
+        assert restored[0]['payload']['targets'] == targets
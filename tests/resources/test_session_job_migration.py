@@ -0,0 +1,67 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import json
+import time
+
+import pytest
+
+from resources.redis import SrvAioRedisSingleton
+from resources.redis_project_session_job import session_job_get_status
+from resources.session_job_migration import migrate_legacy_session_jobs
+
+
+pytestmark = pytest.mark.usefixtures('shared_redis')
+
+
+def create_legacy_record(job_id, source):
+    return {
+        'session_id': 'session',
+        'label': 'Container',
+        'task_id': 'default_task',
+        'job_id': job_id,
+        'source': source,
+        'action': 'data_transfer',
+        'status': 'RUNNING',
+        'code': 'project',
+        'operator': 'admin',
+        'progress': 0,
+        'payload': {},
+        'update_timestamp': str(round(time.time())),
+    }
+
+
+async def test_legacy_jobs_are_moved_to_hash_tagged_keys(redis):
+    record = create_legacy_record('job', 'gr-project/admin/file.txt')
+    legacy_key = 'dataaction:session:Container:job:data_transfer:project:admin:gr-project/admin/file.txt'
+    await redis.set(legacy_key, json.dumps(record))
+
+    assert await migrate_legacy_session_jobs() == 1
+
+    assert await redis.exists(legacy_key) == 0
+    assert await session_job_get_status('session', job_id='job') == [record]
+    assert await SrvAioRedisSingleton().file_get_status('gr-project/admin/file.txt') == 'data_transfer'
+
+
+async def test_current_keys_are_left_alone(redis):
+    record = create_legacy_record('job', 'file.txt')
+    await redis.set('dataaction:{session}:Container:job:data_transfer:project:admin:file.txt', json.dumps(record))
+
+    assert await migrate_legacy_session_jobs() == 0